@@ -0,0 +1,356 @@
+# backtest_server.py - Servidor local de backtests con datasets precargados
+
+import sys
+import json
+import threading
+import multiprocessing
+import http.client
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cfd_backtest_engine import CFDBacktestEngine
+from dataset import PreparedDataset, load_prepared_dataset, apply_date_range, dataset_cache_key
+from events import SilentSink, json_default
+from optimize import CFDOptimizer
+from portfolio_engine import instrument_data_config
+from threshold_index import ThresholdIndex
+from reports import results_summary
+from config import *
+
+# Datasets abiertos por cada proceso worker (ruta de cache -> PreparedDataset mapeado)
+_worker_datasets = {}
+
+def _load_worker_dataset(path):
+    dataset = _worker_datasets.get(path)
+    if dataset is None:
+        dataset = _worker_datasets[path] = PreparedDataset.load(path, mmap_mode='r')
+    return dataset
+
+def _run_server_job(job):
+    """
+    Ejecuta un backtest dentro de un worker.
+
+    Args:
+        job: Dict con dataset_path, config (snapshot completo), instrument,
+            params (parámetros de optimización) e include_trades
+    """
+    apply_config_overrides(job["config"])
+    params = job.get("params") or {}
+    CFDOptimizer._update_config_temporarily(params)
+
+    engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False,
+                               instrument=job["instrument"])
+    # El worker mapea el historial completo y aplica el rango de fechas del job
+    results = engine.run_backtest(apply_date_range(_load_worker_dataset(job["dataset_path"])))
+    summary = results_summary(results, include_trades=job.get("include_trades", False))
+    summary.update(params)
+    return summary
+
+class BacktestServer:
+    """
+    Mantiene los datasets preparados en memoria (y en la cache binaria que
+    mapean los workers) y ejecuta los jobs en un pool de procesos persistente.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or SERVER_CONFIG["max_workers"]
+        # El pool arranca sus workers en el primer submit, desde los hilos del
+        # ThreadingHTTPServer: con fork heredarían locks tomados por otros hilos
+        start_method = SERVER_CONFIG["start_method"]
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                            mp_context=multiprocessing.get_context(start_method))
+        self.datasets = {}              # huella del dataset -> PreparedDataset completo (sin rango de fechas)
+        self.jobs_completed = 0
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+
+    def job_config(self, overrides=None):
+        """Snapshot de la configuración del servidor con los overrides del job"""
+        # Bajo el lock: otro hilo puede tener aplicados temporalmente los overrides de su job
+        with self._lock:
+            config = snapshot_config()
+        for section, values in (overrides or {}).items():
+            if section not in config:
+                raise KeyError(f"Sección de configuración desconocida: {section}")
+            config[section].update(values)
+        return config
+
+    def prepare_dataset(self, instrument, config):
+        """
+        Devuelve el dataset preparado para la configuración del job, cargándolo
+        solo la primera vez (o si cambian los CSV o los indicadores).
+
+        Returns:
+            (clave del dataset, PreparedDataset con el rango de fechas del job)
+        """
+        with self._lock:
+            previous = apply_config_overrides(config)
+            try:
+                engine = CFDBacktestEngine(SilentSink(), instrument=instrument)
+                key = dataset_cache_key(engine.data_sources())
+                dataset = self.datasets.get(key)
+                if dataset is None:
+                    dataset = load_prepared_dataset(engine, use_cache=True)
+                    # Se guarda el historial completo: cada job aplica su propio rango
+                    dataset = self.datasets[key] = dataset.base if dataset.base is not None else dataset
+                return key, apply_date_range(dataset)
+            finally:
+                apply_config_overrides(previous)
+
+    def _build_job(self, request):
+        instrument = request.get("instrument") or ACTIVE_INSTRUMENT
+        if instrument not in INSTRUMENTS:
+            raise KeyError(f"Instrumento desconocido: {instrument}")
+
+        overrides = dict(request.get("overrides") or {})
+        data_config = {**overrides.get("DATA_CONFIG", {}), **(request.get("data") or {})}
+        # Los CSV de DATA_CONFIG son los del instrumento activo: sin rutas en el
+        # request, otro instrumento carga los suyos (PORTFOLIO_CONFIG["data_file_pattern"])
+        if (instrument != ACTIVE_INSTRUMENT and not data_config.get("use_catalog", DATA_CONFIG.get("use_catalog"))
+                and not {"csv_file_path_15m", "csv_file_path_4h"} & set(data_config)):
+            data_config.update(instrument_data_config(instrument))
+        if data_config:
+            overrides["DATA_CONFIG"] = data_config
+        config = self.job_config(overrides)
+        dataset_key, dataset = self.prepare_dataset(instrument, config)
+        return {
+            "dataset_key": dataset_key,
+            "dataset_path": dataset.cache_path,
+            "config": config,
+            "instrument": instrument,
+            "include_trades": bool(request.get("include_trades"))
+        }
+
+    def run_backtest(self, request):
+        """Un backtest con los overrides del request"""
+        job = self._build_job(request)
+        summary = self.executor.submit(_run_server_job, job).result()
+        # Cada conexión se atiende en su hilo: el contador se comparte entre hilos
+        with self._lock:
+            self.jobs_completed += 1
+        return summary
+
+    def run_optimization(self, request):
+        """
+        Barrido de parámetros en el pool. Igual que el optimizador, descarta sin
+        simular las combinaciones que no alcanzan min_trades y simula una sola
+        vez cada conjunto distinto de entradas. Genera un resultado por
+        combinación según van terminando y al final un resumen con la mejor.
+        """
+        job = self._build_job(request)
+        config = job["config"]
+        metric = request.get("metric") or config["OPTIMIZATION_CONFIG"]["optimization_metric"]
+        min_trades = request.get("min_trades", config["OPTIMIZATION_CONFIG"]["min_trades_for_valid_result"])
+        parameter_ranges = request.get("parameter_ranges") or config["OPTIMIZATION_CONFIG"]["parameter_ranges"]
+        combinations = [{key: value.item() if hasattr(value, 'item') else value for key, value in params.items()}
+                        for params in CFDOptimizer._generate_parameter_combinations(parameter_ranges)]
+        start_time = datetime.now()
+
+        fingerprints, max_entries = self._plan_optimization(job, combinations, min_trades)
+
+        # Una simulación por huella distinta; las combinaciones que la comparten reciben el mismo resultado
+        futures = {}
+        by_fingerprint = {}
+        for combination_id, (params, fingerprint) in enumerate(zip(combinations, fingerprints), 1):
+            if fingerprint is None:
+                yield {"event": "skipped", "combination_id": combination_id, **params,
+                       "max_entries": max_entries[combination_id - 1]}
+                continue
+            if fingerprint not in by_fingerprint:
+                by_fingerprint[fingerprint] = []
+                futures[self.executor.submit(_run_server_job, {**job, "params": params})] = fingerprint
+            by_fingerprint[fingerprint].append(combination_id)
+
+        best = None
+        for future in as_completed(futures):
+            combination_ids = by_fingerprint[futures[future]]
+            try:
+                summary = future.result()
+            except Exception as e:
+                yield {"event": "error", "combination_ids": combination_ids, "error": str(e)}
+                continue
+            with self._lock:
+                self.jobs_completed += 1
+            for combination_id in combination_ids:
+                result = {**summary, **combinations[combination_id - 1], "combination_id": combination_id,
+                          "valid": summary["total_trades"] >= min_trades}
+                if result["valid"] and metric in result and (
+                        best is None or (result[metric], -combination_id) > (best[metric], -best["combination_id"])):
+                    best = result
+                yield {"event": "result", **result}
+
+        yield {
+            "event": "done",
+            "combinations": len(combinations),
+            "simulated": len(futures),
+            "metric": metric,
+            "best": best,
+            "elapsed_seconds": (datetime.now() - start_time).total_seconds()
+        }
+
+    def _plan_optimization(self, job, combinations, min_trades):
+        """Huellas de las combinaciones sobre el dataset en memoria (ver CFDOptimizer._plan_combinations)"""
+        with self._lock:
+            previous = apply_config_overrides(job["config"])
+            try:
+                dataset = apply_date_range(self.datasets[job["dataset_key"]])
+                engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False,
+                                           instrument=job["instrument"])
+                static_mask = engine.compute_static_entry_mask(dataset)
+                threshold_index = ThresholdIndex(dataset.features, static_mask)
+                return CFDOptimizer._plan_combinations(engine, dataset, static_mask, threshold_index,
+                                                       combinations, min_trades)
+            finally:
+                apply_config_overrides(previous)
+
+    def status(self):
+        return {
+            "started": self.started.isoformat(),
+            "max_workers": self.max_workers,
+            "jobs_completed": self.jobs_completed,
+            "datasets": {key: {"path": dataset.cache_path, "bars_15m": len(dataset)}
+                         for key, dataset in self.datasets.items()}
+        }
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Rutas: GET /status, POST /datasets, POST /backtest, POST /optimize (respuesta NDJSON)"""
+
+    server_version = "CFDBacktestServer/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, default=json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._send_json(self.server.backtest_server.status())
+        else:
+            self._send_json({"error": f"Ruta desconocida: {self.path}"}, 404)
+
+    def do_POST(self):
+        backtest_server = self.server.backtest_server
+        try:
+            request = self._read_request()
+            if self.path == "/backtest":
+                self._send_json(backtest_server.run_backtest(request))
+            elif self.path == "/datasets":
+                job = backtest_server._build_job(request)
+                self._send_json({"instrument": job["instrument"], "path": job["dataset_path"]})
+            elif self.path == "/optimize":
+                self._stream(backtest_server.run_optimization(request))
+            else:
+                self._send_json({"error": f"Ruta desconocida: {self.path}"}, 404)
+        except (KeyError, ValueError) as e:
+            self._send_json({"error": str(e)}, 400)
+        except Exception as e:
+            self._send_json({"error": str(e)}, 500)
+
+    def _stream(self, events):
+        """Envía cada evento como una línea JSON en cuanto está disponible"""
+        events = iter(events)
+        first = next(events)        # Errores de validación antes de enviar cabeceras
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        self._write_line(first)
+        for event in events:
+            self._write_line(event)
+
+    def _write_line(self, event):
+        self.wfile.write(json.dumps(event, default=json_default).encode() + b"\n")
+        self.wfile.flush()
+
+class BacktestClient:
+    """Cliente del servidor para scripts o sesiones interactivas"""
+
+    def __init__(self, host=None, port=None, timeout=None):
+        self.host = host or SERVER_CONFIG["host"]
+        self.port = port or SERVER_CONFIG["port"]
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps(payload).encode() if payload is not None else None
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise RuntimeError(json.loads(response.read()).get("error", response.reason))
+        return response
+
+    def status(self):
+        return json.loads(self._request("GET", "/status").read())
+
+    def load_dataset(self, instrument=None, data=None, overrides=None):
+        """Precarga el dataset de un instrumento"""
+        return json.loads(self._request("POST", "/datasets", {
+            "instrument": instrument, "data": data, "overrides": overrides}).read())
+
+    def backtest(self, instrument=None, overrides=None, data=None, include_trades=False):
+        """
+        Ejecuta un backtest en el servidor.
+
+        Args:
+            overrides: Dict {"FILTERS_CONFIG": {"volume_threshold": 1.5}, ...}
+            data: Rutas de los CSV (claves de DATA_CONFIG)
+        """
+        return json.loads(self._request("POST", "/backtest", {
+            "instrument": instrument, "overrides": overrides, "data": data,
+            "include_trades": include_trades}).read())
+
+    def optimize(self, parameter_ranges=None, metric=None, instrument=None, overrides=None, data=None):
+        """Lanza una optimización y devuelve los eventos según llegan"""
+        payload = {"parameter_ranges": parameter_ranges, "instrument": instrument,
+                   "overrides": overrides, "data": data}
+        if metric:
+            payload["metric"] = metric
+        response = self._request("POST", "/optimize", payload)
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+def serve(host=None, port=None, max_workers=None, warm_instruments=()):
+    """Arranca el servidor hasta Ctrl+C"""
+    host = host or SERVER_CONFIG["host"]
+    port = port or SERVER_CONFIG["port"]
+    backtest_server = BacktestServer(max_workers)
+
+    for instrument in warm_instruments:
+        print(f"🔥 Precargando dataset de {instrument}...")
+        backtest_server._build_job({"instrument": instrument})
+
+    httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+    httpd.backtest_server = backtest_server
+    print(f"🚀 Servidor de backtest en http://{host}:{port} ({backtest_server.max_workers} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Deteniendo servidor...")
+    finally:
+        httpd.server_close()
+        backtest_server.shutdown()
+
+if __name__ == "__main__":
+    # Uso: python backtest_server.py [puerto] [workers] [instrumento a precargar ...]
+    args = sys.argv[1:]
+    serve(
+        port=int(args[0]) if len(args) > 0 else None,
+        max_workers=int(args[1]) if len(args) > 1 else None,
+        warm_instruments=args[2:]
+    )
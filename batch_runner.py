@@ -0,0 +1,158 @@
+# batch_runner.py - Ejecución desatendida de backtests y optimizaciones desde un fichero de jobs
+
+"""
+Formato del fichero de jobs (JSON):
+
+{
+    "output_directory": "results/batch/",
+    "max_workers": 4,
+    "defaults": {"overrides": {"CAPITAL_CONFIG": {"initial_capital": 1000}}},
+    "jobs": [
+        {"name": "uk100", "type": "backtest", "instrument": "UK100",
+         "overrides": {"FILTERS_CONFIG": {"volume_threshold": 1.5}}},
+        {"name": "sweep", "type": "optimize", "instrument": "*",
+         "data": {"csv_file_path_15m": "data/{instrument}_15M_2021.csv",
+                  "csv_file_path_4h": "data/{instrument}_4H_2021.csv"},
+         "parameter_ranges": {"volume_threshold": [1.0, 2.0, 0.2]},
+         "metric": "profit_factor"}
+    ]
+}
+
+"instrument": "*" genera un job por cada instrumento de INSTRUMENTS; las rutas
+de "data" admiten {instrument}. Sin "data", el servidor carga para cada
+instrumento distinto de ACTIVE_INSTRUMENT los CSV de
+PORTFOLIO_CONFIG["data_file_pattern"]. Cada job escribe <name>.json en output_directory
+y al final se escriben summary.json y summary.csv con una fila por job.
+"""
+
+import os
+import sys
+import json
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from backtest_server import BacktestServer
+from events import json_default
+from config import *
+
+JOB_TYPES = ("backtest", "optimize")
+
+def load_jobs(filename):
+    """Lee el fichero de jobs y expande defaults e instrument="*" """
+    with open(filename, encoding='utf-8') as f:
+        spec = json.load(f)
+
+    defaults = spec.get("defaults", {})
+    jobs = []
+    for index, job in enumerate(spec.get("jobs", []), 1):
+        job = {**copy.deepcopy(defaults), **job}
+        overrides = copy.deepcopy(defaults.get("overrides", {}))
+        for section, values in job.get("overrides", {}).items():
+            overrides.setdefault(section, {}).update(values)
+        job["overrides"] = overrides
+        job.setdefault("type", "backtest")
+        if job["type"] not in JOB_TYPES:
+            raise ValueError(f"Tipo de job desconocido en el job {index}: {job['type']}")
+
+        instruments = list(INSTRUMENTS) if job.get("instrument") == "*" else [job.get("instrument") or ACTIVE_INSTRUMENT]
+        for instrument in instruments:
+            expanded = {**job, "instrument": instrument}
+            expanded["name"] = f"{job.get('name', f'job{index}')}_{instrument}" if len(instruments) > 1 else job.get("name", f"job{index}")
+            if job.get("data"):
+                expanded["data"] = {key: value.format(instrument=instrument) for key, value in job["data"].items()}
+            jobs.append(expanded)
+
+    names = [job["name"] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Los nombres de los jobs deben ser únicos")
+    return spec, jobs
+
+def run_job(server, job):
+    """Ejecuta un job y devuelve su registro de resultados"""
+    start_time = datetime.now()
+    record = {"name": job["name"], "type": job["type"], "instrument": job["instrument"],
+              "started": start_time.isoformat(), "request": job}
+    try:
+        if job["type"] == "backtest":
+            record["results"] = server.run_backtest(job)
+        else:
+            events = list(server.run_optimization(job))
+            done = events[-1]
+            record["results"] = [event for event in events if event["event"] == "result"]
+            record["skipped"] = sum(event["event"] == "skipped" for event in events)
+            record["errors"] = [event for event in events if event["event"] == "error"]
+            record["best"] = done["best"]
+            record["metric"] = done["metric"]
+            record["simulated"] = done["simulated"]
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_seconds"] = (datetime.now() - start_time).total_seconds()
+    return record
+
+def summary_row(record):
+    """Fila del resumen agregado de un job"""
+    row = {key: record[key] for key in ("name", "type", "instrument", "status", "elapsed_seconds")}
+    row["error"] = record.get("error")
+    results = record.get("best") if record["type"] == "optimize" else record.get("results")
+    if record["type"] == "optimize":
+        row["metric"] = record.get("metric")
+        row["combinations_simulated"] = record.get("simulated")
+    for key in ("total_trades", "win_rate", "profit_factor", "total_profit", "max_drawdown",
+                "sharpe_ratio", "final_capital", "volume_threshold", "atr_threshold", "trailing_stop"):
+        row[key] = results.get(key) if results else None
+    return row
+
+def run_batch(filename, max_workers=None):
+    """
+    Ejecuta todos los jobs de un fichero.
+
+    Los jobs se lanzan en paralelo (hasta max_workers a la vez) y comparten un
+    único pool de procesos con los datasets precargados.
+
+    Returns:
+        Lista con el registro de cada job
+    """
+    spec, jobs = load_jobs(filename)
+    max_workers = max_workers or spec.get("max_workers") or OPTIMIZATION_CONFIG.get("max_workers") or 1
+    output_directory = spec.get("output_directory", os.path.join(LOGGING_CONFIG["output_directory"], "batch/"))
+    os.makedirs(output_directory, exist_ok=True)
+
+    print(f"📋 {len(jobs)} jobs - {max_workers} workers - resultados en {output_directory}")
+    start_time = datetime.now()
+    server = BacktestServer(max_workers)
+    records = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_job, server, job) for job in jobs]
+            for future in futures:
+                record = future.result()
+                records.append(record)
+                with open(os.path.join(output_directory, f"{record['name']}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(record, f, indent=2, default=json_default)
+                status = "✅" if record["status"] == "ok" else f"❌ {record['error']}"
+                print(f"   {record['name']}: {status} ({record['elapsed_seconds']:.1f}s)")
+    finally:
+        server.shutdown()
+
+    summary = [summary_row(record) for record in records]
+    with open(os.path.join(output_directory, "summary.json"), 'w', encoding='utf-8') as f:
+        json.dump({"job_file": filename, "started": start_time.isoformat(),
+                   "elapsed_seconds": (datetime.now() - start_time).total_seconds(),
+                   "jobs": summary}, f, indent=2, default=json_default)
+    pd.DataFrame(summary).to_csv(os.path.join(output_directory, "summary.csv"), index=False)
+
+    failed = sum(record["status"] != "ok" for record in records)
+    print(f"🏁 Batch completado: {len(records) - failed} ok, {failed} con error")
+    return records
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python batch_runner.py jobs.json [workers]")
+        sys.exit(2)
+    records = run_batch(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    sys.exit(1 if any(record["status"] != "ok" for record in records) else 0)
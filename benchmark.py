@@ -0,0 +1,230 @@
+# benchmark.py - Benchmark del motor por etapas sobre datos sintéticos y comparación con un baseline
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cfd_backtest_engine import CFDBacktestEngine
+from data_catalog import parse_price_frame
+from data_validation import validate_price_frame
+from dataset import PreparedDataset, load_prepared_dataset
+from events import SilentSink, json_default
+from profiling import StageTimer
+from synthetic_data import write_synthetic_dataset
+from config import *
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count()
+    }
+
+def benchmark_engine(path_entry, path_4h, repeat=None):
+    """
+    Mide las etapas de un backtest: lectura del CSV, conversión de fechas,
+    validación, calculate_indicators, matriz de features, bucle de barras y generate_results.
+
+    Las etapas de preparación de datos se repiten `repeat` veces y se queda el
+    mejor tiempo (son cortas y ruidosas); el bucle de barras se mide una vez.
+    """
+    repeat = repeat or BENCHMARK_CONFIG["repeat"]
+    engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False)
+    best = {}
+    for _ in range(repeat):
+        timer = StageTimer()
+        with timer.stage("csv_load"):
+            raw_entry, raw_4h = pd.read_csv(path_entry), pd.read_csv(path_4h)
+        with timer.stage("timestamp_parse"):
+            df_entry = parse_price_frame(raw_entry, path_entry, sort=False)
+            df_4h = parse_price_frame(raw_4h, path_4h, sort=False)
+        with timer.stage("validation"):
+            df_entry, _ = validate_price_frame(df_entry, TIMEFRAME_CONFIG["entry_timeframe"], engine.instrument_config)
+            df_4h, _ = validate_price_frame(df_4h, TIMEFRAME_CONFIG["trend_timeframe"], engine.instrument_config)
+        with timer.stage("calculate_indicators"):
+            df_entry, df_4h = engine.calculate_indicators(df_entry), engine.calculate_indicators(df_4h)
+        with timer.stage("features"):
+            dataset = PreparedDataset(df_entry, df_4h)
+            dataset.features
+        for name, timing in timer.stages.items():
+            if name not in best or timing["wall"] < best[name]["wall"]:
+                best[name] = timing
+    timer.stages = best
+
+    engine.attach_dataset(dataset)
+    start_index = engine.get_start_index()
+    with timer.stage("bar_loop"):
+        for i in range(start_index, len(dataset)):
+            engine.process_bar(df_entry, df_4h, i)
+    with timer.stage("generate_results"):
+        results = engine.generate_results()
+
+    bar_loop = timer.stages["bar_loop"]["wall"]
+    return {
+        "bars_entry": len(df_entry),
+        "bars_4h": len(df_4h),
+        "total_trades": results["total_trades"],
+        "bars_per_second": (len(dataset) - start_index) / bar_loop if bar_loop > 0 else None,
+        "stages": timer.stages,
+        "total_seconds": sum(timing["wall"] for timing in timer.stages.values())
+    }
+
+def benchmark_optimizer(path_entry, path_4h, parameter_ranges=None):
+    """Barrido del optimizador sobre un dataset ya preparado: combinaciones por segundo"""
+    from optimize import CFDOptimizer
+
+    parameter_ranges = parameter_ranges or BENCHMARK_CONFIG["optimizer_ranges"]
+    with tempfile.TemporaryDirectory() as directory:
+        previous = apply_config_overrides({
+            "DATA_CONFIG": {"csv_file_path_15m": path_entry, "csv_file_path_4h": path_4h,
+                            "use_catalog": False, "use_cache": True,
+                            "cache_directory": os.path.join(directory, "cache/")},
+            "LOGGING_CONFIG": {"log_level": "SILENT", "output_directory": directory + "/"},
+            "REPORT_CONFIG": {"optimizer_top_n": 0}
+        })
+        try:
+            # El dataset se prepara antes de cronometrar: se mide solo el barrido
+            load_prepared_dataset(CFDBacktestEngine(SilentSink(), render_reports=False))
+            optimizer = CFDOptimizer()
+            combinations = len(optimizer._generate_parameter_combinations(parameter_ranges))
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                optimizer.run_optimization(parameter_ranges, confirm=False)
+                elapsed = time.perf_counter() - start
+        finally:
+            apply_config_overrides(previous)
+
+    skipped, reused = optimizer.skipped_runs, optimizer.reused_runs
+    return {
+        "combinations": combinations,
+        "simulated": combinations - skipped - reused,
+        "skipped": skipped,
+        "reused": reused,
+        "seconds": elapsed,
+        "combinations_per_second": combinations / elapsed if elapsed > 0 else None
+    }
+
+def run_benchmarks(scales=None, formats=None, optimizer=True):
+    """
+    Ejecuta el benchmark en cada escala y formato de CSV
+
+    Returns:
+        Dict serializable con la máquina, la configuración y los resultados
+    """
+    scales = scales or BENCHMARK_CONFIG["default_scales"]
+    formats = formats or BENCHMARK_CONFIG["formats"]
+    seed = BENCHMARK_CONFIG["seed"]
+    report = {"created": datetime.now().isoformat(), "machine": machine_info(), "seed": seed, "results": {}}
+
+    for scale in scales:
+        if scale not in BENCHMARK_CONFIG["scales"]:
+            raise KeyError(f"Escala desconocida: {scale} (disponibles: {list(BENCHMARK_CONFIG['scales'])})")
+        spec = BENCHMARK_CONFIG["scales"][scale]
+        for csv_format in formats:
+            start = time.perf_counter()
+            paths = write_synthetic_dataset(BENCHMARK_CONFIG["data_directory"], scale, spec["years"],
+                                            spec["minutes"], seed, csv_format)
+            print(f"📦 {scale}/{csv_format}: datos listos ({time.perf_counter() - start:.1f}s)")
+
+            result = benchmark_engine(*paths)
+            report["results"][f"{scale}/{csv_format}"] = result
+            stages = ", ".join(f"{name} {timing['wall']:.2f}s" for name, timing in result["stages"].items())
+            print(f"⏱️  {scale}/{csv_format}: {result['bars_entry']} barras - {stages} "
+                  f"- {result['bars_per_second']:.0f} barras/s")
+
+        if optimizer and spec.get("optimizer", True):
+            result = benchmark_optimizer(*paths)
+            report["results"][f"{scale}/optimizer"] = result
+            print(f"⏱️  {scale}/optimizer: {result['combinations']} combinaciones "
+                  f"({result['simulated']} simuladas) en {result['seconds']:.2f}s "
+                  f"- {result['combinations_per_second']:.2f} comb/s")
+
+    return report
+
+def compare_with_baseline(report, baseline, tolerance=None, min_seconds=None):
+    """
+    Compara un benchmark con el baseline etapa a etapa
+
+    Returns:
+        Lista de regresiones (etapas más lentas que el baseline más la tolerancia)
+    """
+    tolerance = BENCHMARK_CONFIG["regression_tolerance"] if tolerance is None else tolerance
+    min_seconds = BENCHMARK_CONFIG["min_stage_seconds"] if min_seconds is None else min_seconds
+    regressions = []
+
+    for key, result in report["results"].items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None:
+            continue
+        if "combinations_per_second" in result:
+            pairs = [("combinations_per_second", reference["seconds"], result["seconds"])]
+        else:
+            pairs = [(stage, reference["stages"][stage]["wall"], timing["wall"])
+                     for stage, timing in result["stages"].items() if stage in reference["stages"]]
+
+        for stage, before, after in pairs:
+            ratio = after / before if before > 0 else float('inf')
+            flag = ""
+            # Las etapas muy cortas son ruido: no se consideran regresión
+            if ratio > 1 + tolerance and max(before, after) >= min_seconds:
+                regressions.append({"benchmark": key, "stage": stage, "baseline": before,
+                                    "current": after, "ratio": ratio})
+                flag = " ❌"
+            print(f"   {key:<22} {stage:<24} {before:8.3f}s -> {after:8.3f}s ({ratio:5.2f}x){flag}")
+
+    return regressions
+
+def save_report(report, filename):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=json_default)
+    return filename
+
+def main(args):
+    options = [arg for arg in args if arg.startswith("--")]
+    scales = [arg for arg in args if not arg.startswith("--")] or None
+    formats = None
+    for option in options:
+        if option.startswith("--formats="):
+            formats = option.split("=", 1)[1].split(",")
+
+    report = run_benchmarks(scales, formats, optimizer="--no-optimizer" not in options)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = save_report(report, os.path.join(BENCHMARK_CONFIG["output_directory"], f"benchmark_{timestamp}.json"))
+    print(f"\n💾 Benchmark guardado en: {filename}")
+
+    baseline_file = BENCHMARK_CONFIG["baseline_file"]
+    if "--save-baseline" in options:
+        save_report(report, baseline_file)
+        print(f"💾 Baseline actualizado: {baseline_file}")
+        return 0
+
+    if "--compare" in options:
+        if not os.path.exists(baseline_file):
+            print(f"❌ No existe el baseline {baseline_file} (usa --save-baseline)")
+            return 2
+        with open(baseline_file, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n📊 Comparación con {baseline_file} ({baseline['created']})")
+        regressions = compare_with_baseline(report, baseline)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresiones de rendimiento")
+            return 1
+        print("\n✅ Sin regresiones de rendimiento")
+    return 0
+
+if __name__ == "__main__":
+    # Uso: python benchmark.py [1y 10y 1m_10y] [--formats=timestamp,dukascopy]
+    #                          [--no-optimizer] [--save-baseline | --compare]
+    sys.exit(main(sys.argv[1:]))
@@ -1,20 +1,54 @@
 # cfd_backtest_engine.py - Motor de Backtesting para CFDs con filtros avanzados
 
+import contextlib
 import pandas as pd
 import numpy as np
-import ta.trend
-import ta.volatility
-import ta.momentum
-import matplotlib.pyplot as plt
-import seaborn as sns
-import datetime
-import os
 from config import *
+from events import create_event_sink, format_rejection_funnel, REJECTION_REASONS, REJECTION_CODES, ENTRY_CODE
+from trade_ledger import TradeLedger, POSITION_TYPES
+from metrics import build_equity_curve, compute_risk_metrics
+from reports import ReportJob, build_trades_frame, get_report_renderer
+from data_catalog import DataCatalog, parse_price_frame, data_sources
+from profiling import RunProfiler, format_timings, timings_report
+from data_validation import validate_price_frame, format_validation_report
+from data_coverage import analyze_coverage, format_coverage_report
+from dataset import (load_prepared_dataset, VOLUME_RATIO, ATR_RATIO, ATR_MULTIPLIER,
+                     RSI, STOP_DISTANCE_LONG, STOP_DISTANCE_SHORT)
 
 class CFDBacktestEngine:
-    def __init__(self):
-        """Inicializa el motor de backtesting"""
-        self.instrument_config = get_active_instrument_config()
+    # Estado que determina la continuación del backtest (ver get_state/restore_state)
+    STATE_FIELDS = (
+        'in_position', 'entry_price', 'stop_loss', 'position_type', 'position_size',
+        'entry_time', 'entry_bar', 'bar_index', 'position_margin', 'capital', 'max_capital',
+        'consecutive_losses', 'trades_today', 'last_trade_time', 'last_trade_direction',
+        'bars_outside_hours', 'bars_in_position'
+    )
+
+    def __init__(self, event_sink=None, trade_frame=True, render_reports=True, instrument=None):
+        """
+        Inicializa el motor de backtesting
+
+        Args:
+            event_sink: Destino de los eventos (trades, filtros, progreso).
+                Por defecto se crea según LOGGING_CONFIG["log_level"].
+            trade_frame: Si es False, los resultados no incluyen el DataFrame
+                de trades (solo el TradeLedger compacto en 'trade_ledger').
+            render_reports: Si es False no se generan reportes aunque
+                REPORT_CONFIG los pida (p.ej. backtests del optimizador).
+            instrument: Clave de INSTRUMENTS; por defecto ACTIVE_INSTRUMENT
+        """
+        self.instrument = instrument or ACTIVE_INSTRUMENT
+        self.instrument_config = INSTRUMENTS[self.instrument] if instrument else get_active_instrument_config()
+        self.events = event_sink if event_sink is not None else create_event_sink()
+        self.trade_frame = trade_frame
+        self.render_reports = render_reports
+        self.features = None
+        self.dataset = None
+        self.h4_alignment = None        # Índice de alineación 15M -> 4H del dataset (ver attach_dataset)
+        self.h4_trend = None            # close, senkou_span_a, senkou_span_b de 4H como matriz float
+        self.data_coverage = None       # Informe de cobertura 15M/4H del último run_backtest
+        self.profiler = None            # RunProfiler mientras se ejecuta run_backtest
+        self.data_validation = None     # Informe de validación de los datos cargados (por timeframe)
         self.reset_backtest_state()
         
     def reset_backtest_state(self):
@@ -25,17 +59,40 @@ class CFDBacktestEngine:
         self.position_type = None
         self.position_size = 0
         self.entry_time = None
-        self.trades = []
+        self.entry_bar = -1
+        self.bar_index = -1
+        self.position_margin = 0
+        self.reserved_margin = 0       # Margen de otras posiciones que comparten el capital (cartera)
+        self.trades = TradeLedger(instrument=self.instrument)
         self.capital = CAPITAL_CONFIG["initial_capital"]
         self.max_capital = CAPITAL_CONFIG["initial_capital"]
         self.consecutive_losses = 0
         self.trades_today = 0
         self.last_trade_time = None
         self.last_trade_direction = None
+        # Embudo de entradas: barras descartadas por cada motivo de REJECTION_REASONS
+        self.bars_outside_hours = 0
+        self.bars_in_position = 0
+        self.rejection_counts = [0] * len(REJECTION_REASONS)
+        self.rejection_codes = None    # Código uint8 por barra (solo con LOGGING_CONFIG["log_signals"])
+
+    def get_state(self):
+        """Estado actual del backtest (posición, trailing stop, contadores, capital y trades)"""
+        state = {field: getattr(self, field) for field in self.STATE_FIELDS}
+        state['trades'] = self.trades
+        state['rejection_counts'] = list(self.rejection_counts)
+        return state
+
+    def restore_state(self, state):
+        """Restaura un estado obtenido con get_state() para continuar el backtest"""
+        for field in self.STATE_FIELDS:
+            setattr(self, field, state[field])
+        self.trades = state['trades']
+        self.rejection_counts = list(state['rejection_counts'])
 
     def calculate_indicators(self, df):
         """Calcula todos los indicadores técnicos necesarios"""
-        print("Calculando indicadores técnicos...")
+        self.events.message("Calculando indicadores técnicos...")
         
         # Verificar datos suficientes
         min_periods = max(
@@ -50,6 +107,11 @@ class CFDBacktestEngine:
         # Limpiar datos
         df['volume'] = df['volume'].fillna(0).clip(lower=0)
         
+        # ta se importa solo al calcular (con la cache de dataset no se llega a cargar)
+        import ta.trend
+        import ta.volatility
+        import ta.momentum
+        
         # Indicadores Ichimoku
         ichimoku = ta.trend.IchimokuIndicator(
             high=df['high'], 
@@ -106,12 +168,19 @@ class CFDBacktestEngine:
         else:  # Caso normal: 08:00 a 16:30
             return start_time <= current_time <= end_time
 
-    def validate_stop_distance(self, entry_price, stop_loss_price):
-        """Valida que la distancia del stop loss esté en rango permitido"""
+    def validate_stop_distance(self, entry_price, stop_loss_price, distance=None):
+        """
+        Valida que la distancia del stop loss esté en rango permitido
+
+        Args:
+            distance: Distancia ya precalculada (matriz de features); si no se
+                indica se calcula a partir de los precios.
+        """
         if not FILTERS_CONFIG["use_stop_distance_filter"]:
             return True, "Stop distance filter disabled"
             
-        distance = abs(entry_price - stop_loss_price)
+        if distance is None:
+            distance = abs(entry_price - stop_loss_price)
         min_distance = self.instrument_config["stop_limits"]["min_stop_distance"]
         max_distance = self.instrument_config["stop_limits"]["max_stop_distance"]
         
@@ -128,44 +197,32 @@ class CFDBacktestEngine:
         if not FILTERS_CONFIG["use_spread_filter"]:
             return True
             
-        # Simular spread variable basado en volatilidad
-        base_spread = self.instrument_config["spread"]
-        atr = df['atr'].iloc[i]
-        atr_avg = df['atr'].iloc[max(0, i-20):i].mean()
-        
-        # Spread aumenta con volatilidad
-        volatility_multiplier = max(1.0, atr / atr_avg) if atr_avg > 0 else 1.0
-        current_spread = base_spread * volatility_multiplier
-        max_allowed_spread = base_spread * FILTERS_CONFIG["max_spread_multiplier"]
-        
-        return current_spread <= max_allowed_spread
+        # Spread simulado: crece con el ATR respecto a su media de las 20 barras previas
+        # (multiplicador precalculado en la matriz de features)
+        return self.features[i, ATR_MULTIPLIER] <= FILTERS_CONFIG["max_spread_multiplier"]
 
     def analyze_market_conditions(self, df, i):
         """Analiza las condiciones del mercado"""
         try:
             conditions = {}
             
-            # Condiciones de volumen
+            features = self.features
+            
+            # Condiciones de volumen (volume / volume_sma)
             if FILTERS_CONFIG["use_volume_filter"]:
-                volume = df['volume'].iloc[i]
-                volume_sma = df['volume_sma'].iloc[i]
-                volume_ratio = volume / volume_sma if volume_sma > 0 else 1.0
-                conditions['volume_surge'] = volume_ratio > FILTERS_CONFIG["volume_threshold"]
+                conditions['volume_surge'] = features[i, VOLUME_RATIO] > FILTERS_CONFIG["volume_threshold"]
             else:
                 conditions['volume_surge'] = True
             
-            # Condiciones de ATR
+            # Condiciones de ATR (atr / atr anterior)
             if FILTERS_CONFIG["use_atr_filter"]:
-                atr_current = df['atr'].iloc[i]
-                atr_previous = df['atr'].iloc[i-1] if i > 0 else atr_current
-                atr_ratio = atr_current / atr_previous if atr_previous > 0 else 1.0
-                conditions['atr_increasing'] = atr_ratio > FILTERS_CONFIG["atr_threshold"]
+                conditions['atr_increasing'] = features[i, ATR_RATIO] > FILTERS_CONFIG["atr_threshold"]
             else:
                 conditions['atr_increasing'] = True
             
             # Condiciones de RSI
             if FILTERS_CONFIG["use_rsi_filter"]:
-                rsi = df['rsi'].iloc[i]
+                rsi = features[i, RSI]
                 conditions['rsi_not_overbought'] = rsi < FILTERS_CONFIG["rsi_overbought"]
                 conditions['rsi_not_oversold'] = rsi > FILTERS_CONFIG["rsi_oversold"]
             else:
@@ -175,7 +232,7 @@ class CFDBacktestEngine:
             return conditions
             
         except Exception as e:
-            print(f"Error en analyze_market_conditions: {e}")
+            self.events.message(f"Error en analyze_market_conditions: {e}", level="ERROR")
             return {'volume_surge': False, 'atr_increasing': False, 
                    'rsi_not_overbought': False, 'rsi_not_oversold': False}
 
@@ -230,7 +287,7 @@ class CFDBacktestEngine:
         
         # Verificar margen disponible
         required_margin = nominal_value * self.instrument_config["margin_requirement"]
-        if required_margin > self.capital * 0.8:  # Usar máximo 80% del capital como margen
+        if required_margin > self.capital * 0.8 - self.reserved_margin:  # Usar máximo 80% del capital como margen
             return 0, 0
         
         return position_size, nominal_value
@@ -246,20 +303,33 @@ class CFDBacktestEngine:
             # Short: vendemos al bid (precio - spread/2)
             return entry_price - (spread / 2)
 
-    def get_4h_trend_bias(self, df_4h, current_time):
-        """Obtiene la tendencia del timeframe de 4H"""
+    def get_4h_trend_bias(self, df_4h, current_time, i=None):
+        """
+        Obtiene la tendencia del timeframe de 4H
+
+        Con un dataset asociado (attach_dataset) la barra 4H sale del índice de
+        alineación precalculado; si no (ventanas de trading en vivo), de la
+        búsqueda por fecha.
+        """
         try:
-            # Encontrar la barra de 4H más reciente
-            df_4h_relevant = df_4h[df_4h.index <= current_time]
-            if df_4h_relevant.empty:
-                return None
-            
-            latest_4h = df_4h_relevant.iloc[-1]
-            current_price = latest_4h['close']
+            if i is not None and self.h4_alignment is not None and df_4h is self.dataset.df_4h:
+                position = self.h4_alignment[i]
+                if position < 0:
+                    return None
+                current_price, span_a, span_b = self.h4_trend[position]
+            else:
+                # Encontrar la barra de 4H más reciente
+                df_4h_relevant = df_4h[df_4h.index <= current_time]
+                if df_4h_relevant.empty:
+                    return None
+                
+                latest_4h = df_4h_relevant.iloc[-1]
+                current_price = latest_4h['close']
+                span_a, span_b = latest_4h['senkou_span_a'], latest_4h['senkou_span_b']
             
             # Determinar posición respecto a la nube
-            cloud_top = max(latest_4h['senkou_span_a'], latest_4h['senkou_span_b'])
-            cloud_bottom = min(latest_4h['senkou_span_a'], latest_4h['senkou_span_b'])
+            cloud_top = max(span_a, span_b)
+            cloud_bottom = min(span_a, span_b)
             
             if current_price > cloud_top:
                 return 'bullish'
@@ -269,7 +339,7 @@ class CFDBacktestEngine:
                 return 'neutral'
                 
         except Exception as e:
-            print(f"Error en get_4h_trend_bias: {e}")
+            self.events.message(f"Error en get_4h_trend_bias: {e}", level="ERROR")
             return None
 
     def check_ichimoku_signal(self, df, i, signal_type):
@@ -291,29 +361,51 @@ class CFDBacktestEngine:
                        tenkan_previous >= kijun_previous)
                        
         except Exception as e:
-            print(f"Error en check_ichimoku_signal: {e}")
+            self.events.message(f"Error en check_ichimoku_signal: {e}", level="ERROR")
             return False
 
+    def rejection_funnel(self):
+        """Embudo de entradas del backtest: barras evaluadas, descartadas por cada filtro y entradas"""
+        rejected = dict(zip(REJECTION_REASONS, self.rejection_counts))
+        entries = len(self.trades) + int(self.in_position)
+        return {
+            "outside_hours": self.bars_outside_hours,
+            "in_position": self.bars_in_position,
+            "evaluated": sum(self.rejection_counts) + entries,
+            "rejected": rejected,
+            "entries": entries
+        }
+
+    def _reject(self, current_time, reason):
+        """Cuenta (y notifica) el motivo por el que se descarta una entrada y devuelve False"""
+        code = REJECTION_CODES[reason]
+        self.rejection_counts[code - 1] += 1
+        if self.rejection_codes is not None:
+            self.rejection_codes[self.bar_index] = code
+        if self.events.wants_rejections:
+            self.events.filter_rejected(current_time, reason)
+        return False
+
     def execute_trade_entry(self, df, i, df_4h, current_time, current_price):
         """Ejecuta la entrada de un trade"""
         # Verificar tendencia de 4H
-        trend_bias = self.get_4h_trend_bias(df_4h, current_time)
+        trend_bias = self.get_4h_trend_bias(df_4h, current_time, i)
         if trend_bias is None:
-            return False
+            return self._reject(current_time, "no_4h_bias")
         
         # Verificar condiciones de mercado
         market_conditions = self.analyze_market_conditions(df, i)
         if not all(market_conditions.values()):
-            return False
+            return self._reject(current_time, "market_conditions")
         
         # Verificar condiciones de spread
         if not self.check_spread_conditions(df, i):
-            return False
+            return self._reject(current_time, "spread")
         
         # Verificar reglas de gestión de riesgo
         risk_ok, risk_message = self.check_risk_management_rules(current_time)
         if not risk_ok:
-            return False
+            return self._reject(current_time, "risk_rules")
         
         # Buscar señales según la tendencia
         signal_found = False
@@ -329,18 +421,20 @@ class CFDBacktestEngine:
                 position_type = 'short'
         
         if not signal_found:
-            return False
+            return self._reject(current_time, "no_signal")
         
         # Calcular stop loss
         if position_type == 'long':
             stop_loss_level = min(df['senkou_span_a'].iloc[i], df['senkou_span_b'].iloc[i])
+            stop_distance = self.features[i, STOP_DISTANCE_LONG]
         else:
             stop_loss_level = max(df['senkou_span_a'].iloc[i], df['senkou_span_b'].iloc[i])
+            stop_distance = self.features[i, STOP_DISTANCE_SHORT]
         
         # Validar distancia del stop
-        stop_valid, stop_message = self.validate_stop_distance(current_price, stop_loss_level)
+        stop_valid, stop_message = self.validate_stop_distance(current_price, stop_loss_level, stop_distance)
         if not stop_valid:
-            return False
+            return self._reject(current_time, "stop_distance")
         
         # Aplicar spread al precio de entrada
         entry_price_with_spread = self.apply_spread_cost(current_price, position_type)
@@ -351,7 +445,7 @@ class CFDBacktestEngine:
         )
         
         if position_size == 0:
-            return False
+            return self._reject(current_time, "position_size")
         
         # Ejecutar entrada
         self.in_position = True
@@ -360,6 +454,9 @@ class CFDBacktestEngine:
         self.position_type = position_type
         self.position_size = position_size
         self.entry_time = current_time
+        self.entry_bar = self.bar_index
+        if self.rejection_codes is not None:
+            self.rejection_codes[self.bar_index] = ENTRY_CODE
         
         # Actualizar contadores
         self.trades_today += 1
@@ -369,13 +466,21 @@ class CFDBacktestEngine:
         # Log de entrada
         required_margin = nominal_value * self.instrument_config["margin_requirement"]
         spread_cost = abs(entry_price_with_spread - current_price)
-        
-        print(f"\n{position_type.upper() if position_type else 'UNKNOWN'} ENTRY - {current_time.strftime('%Y-%m-%d %H:%M')}")
-        print(f"Price: {current_price:.1f} → Entry: {entry_price_with_spread:.1f} (Spread: {spread_cost:.1f})")
-        print(f"Size: {position_size} units (${nominal_value:.2f} exposure)")
-        print(f"Stop Loss: {stop_loss_level:.1f}")
-        print(f"Margin Required: ${required_margin:.2f}")
-        print(f"Trend Bias: {trend_bias}")
+        self.position_margin = required_margin
+        
+        self.events.trade_opened({
+            'instrument': self.instrument,
+            'time': current_time,
+            'type': position_type,
+            'price': current_price,
+            'entry_price': entry_price_with_spread,
+            'spread_cost': spread_cost,
+            'position_size': position_size,
+            'nominal_value': nominal_value,
+            'stop_loss': stop_loss_level,
+            'required_margin': required_margin,
+            'trend_bias': trend_bias
+        })
         
         return True
 
@@ -441,21 +546,11 @@ class CFDBacktestEngine:
         risk_multiple = profit_loss / CAPITAL_CONFIG["risk_per_trade"]
         
         # Registrar trade
-        trade_data = {
-            'entry_time': self.entry_time,
-            'exit_time': exit_time,
-            'type': self.position_type,
-            'entry_price': self.entry_price,
-            'exit_price': exit_price,
-            'position_size': self.position_size,
-            'profit_loss': profit_loss,
-            'risk_multiple': risk_multiple,
-            'exit_reason': exit_reason,
-            'hold_time_hours': hold_time,
-            'instrument': ACTIVE_INSTRUMENT
-        }
-        
-        self.trades.append(trade_data)
+        self.trades.append(
+            self.entry_time, exit_time, self.position_type, self.entry_price, exit_price,
+            self.position_size, profit_loss, risk_multiple, exit_reason,
+            self.entry_bar, self.bar_index
+        )
         
         # Actualizar capital
         self.capital += profit_loss
@@ -467,12 +562,17 @@ class CFDBacktestEngine:
             self.consecutive_losses = 0
         
         # Log de salida
-        print(f"{self.position_type.upper() if self.position_type else 'UNKNOWN'} EXIT - {exit_time.strftime('%Y-%m-%d %H:%M')}")
-        print(f"Exit Price: {exit_price:.1f}")
-        print(f"P&L: ${profit_loss:.2f} ({risk_multiple:.1f}R)")
-        print(f"Reason: {exit_reason}")
-        print(f"Duration: {hold_time:.1f}h")
-        print(f"Capital: ${self.capital:.2f}")
+        self.events.trade_closed({
+            'instrument': self.instrument,
+            'time': exit_time,
+            'type': self.position_type,
+            'exit_price': exit_price,
+            'profit_loss': profit_loss,
+            'risk_multiple': risk_multiple,
+            'exit_reason': exit_reason,
+            'hold_time_hours': hold_time,
+            'capital': self.capital
+        })
         
         # Reset position state
         self.in_position = False
@@ -481,148 +581,436 @@ class CFDBacktestEngine:
         self.position_type = None
         self.position_size = 0
         self.entry_time = None
+        self.entry_bar = -1
+        self.position_margin = 0
 
-    def run_backtest(self):
-        """Ejecuta el backtest completo"""
-        try:
-            print("\n" + "="*60)
-            print("INICIANDO CFD BACKTEST")
-            print("="*60)
-            print(f"Instrumento: {self.instrument_config['name']}")
-            print(f"Capital inicial: ${CAPITAL_CONFIG['initial_capital']}")
-            print(f"Riesgo por trade: ${CAPITAL_CONFIG['risk_per_trade']}")
-            
-            # Cargar datos
-            print("\nCargando datos...")
-            df_15m = pd.read_csv(DATA_CONFIG["csv_file_path_15m"])
-            df_4h = pd.read_csv(DATA_CONFIG["csv_file_path_4h"])
-            
-            # Procesar timestamps
-            for df, timeframe in [(df_15m, "15M"), (df_4h, "4H")]:
-                print(f"Procesando datos {timeframe}: {len(df)} filas")
-                
-                # Detectar formato de fecha
-                if 'timestamp' in df.columns:
-                    df['datetime'] = pd.to_datetime(df['timestamp'])
-                elif 'date' in df.columns:
-                    df['datetime'] = pd.to_datetime(df['date'])
-                elif 'Local time' in df.columns:
-                    df['datetime'] = pd.to_datetime(df['Local time'], format='%d.%m.%Y %H:%M:%S.%f GMT%z')
-                else:
-                    raise ValueError(f"Formato de fecha no reconocido en {timeframe}")
-                
-                df.set_index('datetime', inplace=True)
-                df.sort_index(inplace=True)
-                
-                # Normalizar nombres de columnas
-                df.rename(columns={
-                    'Open': 'open', 'High': 'high', 'Low': 'low', 
-                    'Close': 'close', 'Volume': 'volume'
-                }, inplace=True)
-            
-            # Calcular indicadores
+    def data_sources(self):
+        """Ficheros de origen (15M, 4H) del instrumento del motor"""
+        return data_sources(self.instrument)
+
+    def load_data(self):
+        """Carga los CSV de 15M y 4H (o todos los años del catálogo) y calcula sus indicadores"""
+        self.events.message("\nCargando datos...")
+        if DATA_CONFIG.get("use_catalog"):
+            with self.timed_stage("catalog_load"):
+                catalog = DataCatalog()
+                # Sin ordenar ni deduplicar: la validación cuenta el solape entre años y el desorden
+                df_15m, df_4h = catalog.load(self.instrument, years=DATA_CONFIG.get("years"), sort=False)
+        else:
+            path_15m, path_4h = DATA_CONFIG["csv_file_path_15m"], DATA_CONFIG["csv_file_path_4h"]
+            with self.timed_stage("csv_load"):
+                raw_15m, raw_4h = pd.read_csv(path_15m), pd.read_csv(path_4h)
+            with self.timed_stage("timestamp_parse"):
+                # Sin ordenar: la validación detecta los timestamps fuera de orden y ordena
+                df_15m = parse_price_frame(raw_15m, path_15m, sort=False)
+                df_4h = parse_price_frame(raw_4h, path_4h, sort=False)
+
+        with self.timed_stage("validation"):
+            df_15m, report_15m = validate_price_frame(df_15m, TIMEFRAME_CONFIG["entry_timeframe"], self.instrument_config,
+                                                      min_bars=VALIDATION_CONFIG["min_data_points"])
+            df_4h, report_4h = validate_price_frame(df_4h, TIMEFRAME_CONFIG["trend_timeframe"], self.instrument_config)
+        self.data_validation = {"15M": report_15m, "4H": report_4h} if report_15m is not None else None
+        self.report_data_validation()
+
+        for df, timeframe in [(df_15m, "15M"), (df_4h, "4H")]:
+            self.events.message(f"Procesando datos {timeframe}: {len(df)} filas")
+        
+        # Calcular indicadores
+        with self.timed_stage("calculate_indicators"):
             df_15m = self.calculate_indicators(df_15m)
             df_4h = self.calculate_indicators(df_4h)
+        
+        return df_15m, df_4h
+
+    def report_data_validation(self):
+        """Muestra el informe de validación de los datos y falla si hay errores"""
+        if self.data_validation is None:
+            return
+        errors = []
+        for report in self.data_validation.values():
+            level = "WARNING" if report["warnings"] or report["errors"] else "INFO"
+            for line in format_validation_report(report):
+                self.events.message(line, level=level)
+            errors.extend(f"{report['timeframe']}: {error}" for error in report["errors"])
+        if errors:
+            raise ValueError(f"Datos no válidos - {'; '.join(errors)}")
+
+    def report_data_coverage(self):
+        """Muestra el diagnóstico de cobertura y alineación 15M/4H"""
+        report = self.data_coverage
+        level = "WARNING" if report["warnings"] else "INFO"
+        for line in format_coverage_report(report):
+            self.events.message(line, level=level)
+
+    def timed_stage(self, name):
+        """Context manager que mide una etapa si hay un run_backtest en curso"""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(name)
+
+    def attach_dataset(self, dataset):
+        """Asocia un PreparedDataset: matriz de features e índice de alineación 15M -> 4H"""
+        self.dataset = dataset
+        self.features = dataset.features
+        self.h4_alignment = dataset.alignment
+        self.h4_trend = dataset.df_4h[['close', 'senkou_span_a', 'senkou_span_b']].to_numpy(dtype=float)
+
+    def get_start_index(self, dataset=None):
+        """
+        Primer índice de barra con indicadores suficientes
+
+        En una vista de un rango de fechas (PreparedDataset.view) los
+        indicadores vienen calentados del historial completo: se empieza en la
+        primera barra del rango.
+        """
+        warmup = max(
+            ICHIMOKU_CONFIG["senkou_periods"],
+            FILTERS_CONFIG["volume_sma_periods"],
+            FILTERS_CONFIG["atr_periods"]
+        )
+        dataset = dataset if dataset is not None else self.dataset
+        if dataset is None:
+            return warmup
+        return max(warmup - dataset.offset, dataset.first_bar)
+
+    def compute_static_entry_mask(self, dataset):
+        """
+        Máscara vectorizada de las condiciones de entrada que no dependen de
+        los umbrales optimizables: horario, sesgo 4H + cruce Tenkan/Kijun,
+        spread y distancia del stop.
+
+        Replica la semántica de execute_trade_entry barra a barra (incluido el
+        tratamiento de NaN de min()/max() de Python), de modo que una barra
+        fuera de la máscara nunca puede abrir un trade.
+        """
+        conditions = self.compute_entry_conditions(dataset)
+        return (conditions["evaluable"] & conditions["in_hours"] & conditions["signal"]
+                & conditions["spread"] & conditions["stop_distance"])
+
+    def compute_entry_conditions(self, dataset):
+        """
+        Condiciones estáticas de entrada por barra (arrays booleanos):
+        evaluable (barra >= get_start_index), in_hours, has_4h, signal,
+        spread y stop_distance
+        """
+        df_15m, df_4h, features = dataset.df_15m, dataset.df_4h, dataset.features
+        n = len(df_15m)
+        evaluable = np.zeros(n, dtype=bool)
+        evaluable[min(self.get_start_index(dataset), n):] = True
+        if not evaluable.any():
+            return dict.fromkeys(("evaluable", "in_hours", "has_4h", "signal", "spread", "stop_distance"), evaluable)
+        
+        # Horario de trading
+        if FILTERS_CONFIG["use_trading_hours_filter"]:
+            hours_config = self.instrument_config["trading_hours"]
+            start_time = hours_config["start_hour"] * 60 + hours_config["start_minute"]
+            end_time = hours_config["end_hour"] * 60 + hours_config["end_minute"]
+            current_time = np.asarray(df_15m.index.hour * 60 + df_15m.index.minute)
+            if start_time > end_time:
+                in_hours = (current_time >= start_time) | (current_time <= end_time)
+            else:
+                in_hours = (start_time <= current_time) & (current_time <= end_time)
+        else:
+            in_hours = np.ones(n, dtype=bool)
+        
+        # Sesgo 4H: última barra 4H con timestamp <= barra 15M
+        h4_pos = dataset.alignment
+        has_h4 = h4_pos >= 0
+        h4_pos = np.where(has_h4, h4_pos, 0)
+        span_a_4h = df_4h['senkou_span_a'].to_numpy(dtype=float)[h4_pos]
+        span_b_4h = df_4h['senkou_span_b'].to_numpy(dtype=float)[h4_pos]
+        close_4h = df_4h['close'].to_numpy(dtype=float)[h4_pos]
+        cloud_top = np.where(span_b_4h > span_a_4h, span_b_4h, span_a_4h)
+        cloud_bottom = np.where(span_b_4h < span_a_4h, span_b_4h, span_a_4h)
+        bullish = has_h4 & (close_4h > cloud_top)
+        bearish = has_h4 & ~bullish & (close_4h < cloud_bottom)
+        
+        # Cruces Tenkan/Kijun
+        tenkan = df_15m['tenkan_sen'].to_numpy(dtype=float)
+        kijun = df_15m['kijun_sen'].to_numpy(dtype=float)
+        tenkan_prev = np.r_[np.nan, tenkan[:-1]]
+        kijun_prev = np.r_[np.nan, kijun[:-1]]
+        cross_up = (tenkan > kijun) & (tenkan_prev <= kijun_prev)
+        cross_down = (tenkan < kijun) & (tenkan_prev >= kijun_prev)
+        go_long = bullish & cross_up
+        go_short = bearish & cross_down
+        
+        # Spread simulado según volatilidad
+        if FILTERS_CONFIG["use_spread_filter"]:
+            spread_ok = features[:, ATR_MULTIPLIER] <= FILTERS_CONFIG["max_spread_multiplier"]
+        else:
+            spread_ok = np.ones(n, dtype=bool)
+        
+        # Distancia del stop al borde de la nube (NaN se considera válida, como en validate_stop_distance)
+        if FILTERS_CONFIG["use_stop_distance_filter"]:
+            distance = np.where(go_long, features[:, STOP_DISTANCE_LONG], features[:, STOP_DISTANCE_SHORT])
+            limits = self.instrument_config["stop_limits"]
+            stop_ok = ~(distance < limits["min_stop_distance"]) & ~(distance > limits["max_stop_distance"])
+        else:
+            stop_ok = np.ones(n, dtype=bool)
+        
+        return {"evaluable": evaluable, "in_hours": in_hours, "has_4h": has_h4,
+                "signal": go_long | go_short, "spread": spread_ok, "stop_distance": stop_ok}
+
+    def compute_market_conditions_mask(self, features):
+        """Versión vectorizada de analyze_market_conditions para todas las barras"""
+        passed = np.ones(len(features), dtype=bool)
+        
+        if FILTERS_CONFIG["use_volume_filter"]:
+            passed &= features[:, VOLUME_RATIO] > FILTERS_CONFIG["volume_threshold"]
+        
+        if FILTERS_CONFIG["use_atr_filter"]:
+            passed &= features[:, ATR_RATIO] > FILTERS_CONFIG["atr_threshold"]
+        
+        if FILTERS_CONFIG["use_rsi_filter"]:
+            rsi = features[:, RSI]
+            passed &= (rsi < FILTERS_CONFIG["rsi_overbought"]) & (rsi > FILTERS_CONFIG["rsi_oversold"])
+        
+        return passed
+
+    def compute_entry_candidate_mask(self, dataset, static_mask=None):
+        """Barras en las que execute_trade_entry podría abrir un trade con la configuración actual"""
+        if static_mask is None:
+            static_mask = self.compute_static_entry_mask(dataset)
+        return static_mask & self.compute_market_conditions_mask(dataset.features)
+
+    def compute_entry_rejection_codes(self, dataset):
+        """
+        Código por barra (uint8, como results['rejection_codes']) del primer
+        filtro estático que descarta una entrada en execute_trade_entry: 0 si
+        la barra está fuera de horario (o antes de get_start_index) y
+        ENTRY_CODE si es candidata a entrada (compute_entry_candidate_mask).
+
+        risk_rules depende del estado del backtest y no entra en los códigos;
+        ver record_skipped_bar.
+        """
+        conditions = self.compute_entry_conditions(dataset)
+        market = self.compute_market_conditions_mask(dataset.features)
+        checks = [(~conditions["has_4h"], "no_4h_bias"), (~market, "market_conditions"),
+                  (~conditions["spread"], "spread"), (~conditions["signal"], "no_signal"),
+                  (~conditions["stop_distance"], "stop_distance")]
+        codes = np.select([failed for failed, _ in checks], [REJECTION_CODES[reason] for _, reason in checks],
+                          ENTRY_CODE).astype(np.uint8)
+        codes[~(conditions["evaluable"] & conditions["in_hours"])] = 0
+        return codes
+
+    def record_skipped_bar(self, current_time, i, code):
+        """
+        Cuenta en el embudo una barra sin posición que no se procesa porque su
+        código de compute_entry_rejection_codes ya la descarta, igual que la
+        contaría process_bar (incluida la comprobación de risk_rules, que
+        execute_trade_entry evalúa antes de la señal)
+        """
+        self.bar_index = i
+        if code == 0:
+            self.bars_outside_hours += 1
+        elif code > REJECTION_CODES["risk_rules"] and not self.check_risk_management_rules(current_time)[0]:
+            self._reject(current_time, "risk_rules")
+        else:
+            self._reject(current_time, REJECTION_REASONS[code - 1])
+
+    def run_backtest(self, dataset=None, start_index=None):
+        """
+        Ejecuta el backtest completo
+
+        Args:
+            dataset: PreparedDataset ya cargado (datos, indicadores y features).
+                Si no se indica se carga desde DATA_CONFIG (usando la cache).
+            start_index: Primera barra a procesar. Por defecto get_start_index();
+                se indica al continuar un estado restaurado con restore_state().
+        """
+        profiler = self.profiler = RunProfiler(self)
+        try:
+            self.events.message("\n" + "="*60)
+            self.events.message("INICIANDO CFD BACKTEST")
+            self.events.message("="*60)
+            self.events.message(f"Instrumento: {self.instrument_config['name']}")
+            self.events.message(f"Capital inicial: ${CAPITAL_CONFIG['initial_capital']}")
+            self.events.message(f"Riesgo por trade: ${CAPITAL_CONFIG['risk_per_trade']}")
+            
+            # Cargar datos (si no se recibieron ya preparados)
+            if dataset is None:
+                dataset = load_prepared_dataset(self)
+            df_15m, df_4h = dataset.df_15m, dataset.df_4h
+            self.rejection_codes = np.zeros(len(dataset), dtype=np.uint8) if LOGGING_CONFIG["log_signals"] else None
+            with profiler.stage("features"):
+                self.attach_dataset(dataset)
+            if VALIDATION_CONFIG["check_coverage"]:
+                with profiler.stage("coverage"):
+                    self.data_coverage = analyze_coverage(df_15m, df_4h, dataset.alignment)
+                self.report_data_coverage()
             
             # Ejecutar backtest
-            print("\nEjecutando backtest...")
-            start_idx = max(
-                ICHIMOKU_CONFIG["senkou_periods"],
-                FILTERS_CONFIG["volume_sma_periods"],
-                FILTERS_CONFIG["atr_periods"]
-            )
+            self.events.message("\nEjecutando backtest...")
+            start_idx = self.get_start_index() if start_index is None else start_index
             
             total_bars = len(df_15m)
             progress_interval = max(1, total_bars // 20)
             
-            for i in range(start_idx, total_bars):
-                if i % progress_interval == 0:
-                    progress = (i / total_bars) * 100
-                    print(f"Progreso: {progress:.1f}% - Trades: {len(self.trades)} - Capital: ${self.capital:.2f}")
-                
-                current_time = df_15m.index[i]
-                current_price = df_15m['close'].iloc[i]
-                
-                # Verificar horarios de trading
-                if not self.is_trading_hours(current_time):
-                    continue
-                
-                if self.in_position:
-                    # Gestionar posición abierta
-                    self.manage_open_position(current_price, current_time)
-                else:
-                    # Buscar nuevas oportunidades
-                    self.execute_trade_entry(df_15m, i, df_4h, current_time, current_price)
+            with profiler.stage("bar_loop"):
+                for i in range(start_idx, total_bars):
+                    if i % progress_interval == 0:
+                        self.events.progress(i, total_bars, len(self.trades), self.capital)
+                    
+                    self.process_bar(df_15m, df_4h, i)
             
-            print("\n" + "="*60)
-            print("BACKTEST COMPLETADO")
-            print("="*60)
+            self.events.message("\n" + "="*60)
+            self.events.message("BACKTEST COMPLETADO")
+            self.events.message("="*60)
             
-            return self.generate_results()
+            with profiler.stage("generate_results"):
+                results = self.generate_results()
+            results['timings'] = timings = profiler.finish()
+            self.events.message(f"⏱️  Etapas: {format_timings(timings)}")
+            for line in timings_report(timings):
+                self.events.message(line)
+            return results
             
         except Exception as e:
-            print(f"Error durante el backtest: {str(e)}")
+            self.events.message(f"Error durante el backtest: {str(e)}", level="ERROR")
             import traceback
-            print(traceback.format_exc())
+            self.events.message(traceback.format_exc(), level="ERROR")
             raise
+        
+        finally:
+            profiler.close()
+            self.profiler = None
+            self.events.flush()
+
+    def process_bar(self, df_15m, df_4h, i, bar_index=None):
+        """
+        Procesa una barra de 15M: gestiona la posición abierta o busca una entrada
+
+        Args:
+            bar_index: Índice de la barra en la sesión cuando df_15m es solo una
+                ventana de las últimas barras (trading en vivo); por defecto i
+        """
+        self.bar_index = i if bar_index is None else bar_index
+        current_time = df_15m.index[i]
+        current_price = df_15m['close'].iloc[i]
+        
+        # Verificar horarios de trading
+        if not self.is_trading_hours(current_time):
+            self.bars_outside_hours += 1
+            return
+        
+        if self.in_position:
+            # Gestionar posición abierta
+            self.bars_in_position += 1
+            self.manage_open_position(current_price, current_time)
+        else:
+            # Buscar nuevas oportunidades
+            self.execute_trade_entry(df_15m, i, df_4h, current_time, current_price)
+
+    def open_position_span(self):
+        """
+        Posición abierta al terminar como (dirección, tamaño, precio de entrada,
+        entry_bar) para build_equity_curve; None si no hay posición
+        """
+        if not self.in_position:
+            return None
+        return (POSITION_TYPES[self.position_type], self.position_size, self.entry_price, self.entry_bar)
+
+    def mark_to_market(self, max_drawdown_closed):
+        """
+        Equity barra a barra (trades del ledger + posición abierta al final) y
+        métricas de riesgo; sin dataset asociado, drawdown de trades cerrados
+
+        Returns:
+            (pd.Series de equity o None, dict de métricas de riesgo)
+        """
+        if self.dataset is None:
+            return None, {'sharpe_ratio': 0, 'sortino_ratio': 0, 'calmar_ratio': 0,
+                          'max_drawdown': max_drawdown_closed}
+        start = self.get_start_index()
+        df_15m = self.dataset.df_15m
+        equity = build_equity_curve(
+            df_15m['close'].to_numpy(dtype=float), self.trades,
+            CAPITAL_CONFIG["initial_capital"], self.instrument_config["spread"],
+            self.open_position_span()
+        )[start:]
+        return (pd.Series(equity, index=df_15m.index[start:], name='equity'),
+                compute_risk_metrics(equity, df_15m.index[start:]))
 
     def generate_results(self):
         """Genera y muestra los resultados del backtest"""
+        funnel = self.rejection_funnel()
         if not self.trades:
-            print("No se ejecutaron trades durante el período")
+            self.events.message("No se ejecutaron trades durante el período")
+            # Una posición abierta al final sigue contando en la equity mark-to-market
+            equity_series, risk_metrics = self.mark_to_market(0)
+            if self.in_position:
+                self.events.message(f"Posición abierta al final - Máximo Drawdown: {risk_metrics['max_drawdown']:.1f}%")
+            self._print_rejection_funnel(funnel)
             return {
                 'total_trades': 0,
                 'win_rate': 0,
                 'total_profit': 0,
                 'profit_factor': 0,
-                'max_drawdown': 0,
+                'max_drawdown': risk_metrics['max_drawdown'],
+                'max_drawdown_closed': 0,
+                'sharpe_ratio': risk_metrics['sharpe_ratio'],
+                'sortino_ratio': risk_metrics['sortino_ratio'],
+                'calmar_ratio': risk_metrics['calmar_ratio'],
                 'final_capital': self.capital,
-                'df_trades': pd.DataFrame()
+                'trade_ledger': self.trades,
+                'open_position': self.open_position_span(),
+                'equity_curve': equity_series if self.trade_frame else None,
+                'df_trades': pd.DataFrame() if self.trade_frame else None,
+                'rejections': funnel,
+                'rejection_codes': self.rejection_codes
             }
         
-        # Crear DataFrame de trades
-        df_trades = pd.DataFrame(self.trades)
-        
-        # Calcular métricas
-        total_trades = len(df_trades)
-        winners = df_trades[df_trades['profit_loss'] > 0]
-        losers = df_trades[df_trades['profit_loss'] <= 0]
+        # Calcular métricas directamente sobre las columnas del ledger
+        profit_loss = self.trades.column('profit_loss')
+        total_trades = len(profit_loss)
+        winners = profit_loss[profit_loss > 0]
+        losers = profit_loss[profit_loss <= 0]
         win_rate = len(winners) / total_trades * 100
         
-        total_profit = df_trades['profit_loss'].sum()
-        avg_winner = winners['profit_loss'].mean() if not winners.empty else 0
-        avg_loser = losers['profit_loss'].mean() if not losers.empty else 0
+        total_profit = profit_loss.sum()
+        avg_winner = winners.mean() if len(winners) else 0
+        avg_loser = losers.mean() if len(losers) else 0
         
-        gross_profits = winners['profit_loss'].sum() if not winners.empty else 0
-        gross_losses = abs(losers['profit_loss'].sum()) if not losers.empty else 0
+        gross_profits = winners.sum() if len(winners) else 0
+        gross_losses = abs(losers.sum()) if len(losers) else 0
         profit_factor = gross_profits / gross_losses if gross_losses > 0 else float('inf')
         
-        # Calcular drawdown
-        df_trades['cumulative_profit'] = df_trades['profit_loss'].cumsum()
-        df_trades['capital_curve'] = CAPITAL_CONFIG["initial_capital"] + df_trades['cumulative_profit']
-        df_trades['peak'] = df_trades['capital_curve'].cummax()
-        df_trades['drawdown'] = (df_trades['peak'] - df_trades['capital_curve']) / df_trades['peak'] * 100
-        max_drawdown = df_trades['drawdown'].max()
+        # Drawdown sobre trades cerrados
+        cumulative_profit = np.cumsum(profit_loss)
+        capital_curve = CAPITAL_CONFIG["initial_capital"] + cumulative_profit
+        peak = np.maximum.accumulate(capital_curve)
+        drawdown = (peak - capital_curve) / peak * 100
+        max_drawdown_closed = drawdown.max()
+        
+        # Equity barra a barra (mark-to-market) y métricas de riesgo
+        equity_series, risk_metrics = self.mark_to_market(max_drawdown_closed)
+        max_drawdown = risk_metrics['max_drawdown']
+        
+        # DataFrame de trades solo si se pide
+        df_trades = build_trades_frame(self.trades, CAPITAL_CONFIG["initial_capital"]) if self.trade_frame else None
         
         # Mostrar resultados
-        print(f"\n📊 RESULTADOS DEL BACKTEST")
-        print(f"{'='*40}")
-        print(f"Total de trades: {total_trades}")
-        print(f"Trades ganadores: {len(winners)} ({win_rate:.1f}%)")
-        print(f"Trades perdedores: {len(losers)}")
-        print(f"\n💰 RENTABILIDAD")
-        print(f"Beneficio total: ${total_profit:.2f}")
-        print(f"Capital final: ${self.capital:.2f}")
-        print(f"ROI: {((self.capital / CAPITAL_CONFIG['initial_capital']) - 1) * 100:.1f}%")
-        print(f"\n📈 MÉTRICAS")
-        print(f"Profit Factor: {profit_factor:.2f}")
-        print(f"Avg Winner: ${avg_winner:.2f}")
-        print(f"Avg Loser: ${avg_loser:.2f}")
-        print(f"Máximo Drawdown: {max_drawdown:.1f}%")
-        
-        # Guardar resultados
-        if LOGGING_CONFIG["save_detailed_report"]:
-            self.save_results(df_trades)
+        self.events.message(f"\n📊 RESULTADOS DEL BACKTEST")
+        self.events.message(f"{'='*40}")
+        self.events.message(f"Total de trades: {total_trades}")
+        self.events.message(f"Trades ganadores: {len(winners)} ({win_rate:.1f}%)")
+        self.events.message(f"Trades perdedores: {len(losers)}")
+        self.events.message(f"\n💰 RENTABILIDAD")
+        self.events.message(f"Beneficio total: ${total_profit:.2f}")
+        self.events.message(f"Capital final: ${self.capital:.2f}")
+        self.events.message(f"ROI: {((self.capital / CAPITAL_CONFIG['initial_capital']) - 1) * 100:.1f}%")
+        self.events.message(f"\n📈 MÉTRICAS")
+        self.events.message(f"Profit Factor: {profit_factor:.2f}")
+        self.events.message(f"Avg Winner: ${avg_winner:.2f}")
+        self.events.message(f"Avg Loser: ${avg_loser:.2f}")
+        self.events.message(f"Máximo Drawdown: {max_drawdown:.1f}% (trades cerrados: {max_drawdown_closed:.1f}%)")
+        self.events.message(f"Sharpe: {risk_metrics['sharpe_ratio']:.2f} - Sortino: {risk_metrics['sortino_ratio']:.2f} - Calmar: {risk_metrics['calmar_ratio']:.2f}")
+        self._print_rejection_funnel(funnel)
+        
+        # Reportes en segundo plano (no bloquean la devolución de resultados)
+        if self.render_reports and (REPORT_CONFIG["save_detailed_report"] or REPORT_CONFIG["save_equity_curve"]):
+            self.save_results(equity_series)
         
         return {
             'total_trades': total_trades,
@@ -630,53 +1018,27 @@ class CFDBacktestEngine:
             'total_profit': total_profit,
             'profit_factor': profit_factor,
             'max_drawdown': max_drawdown,
+            'max_drawdown_closed': max_drawdown_closed,
+            'sharpe_ratio': risk_metrics['sharpe_ratio'],
+            'sortino_ratio': risk_metrics['sortino_ratio'],
+            'calmar_ratio': risk_metrics['calmar_ratio'],
             'final_capital': self.capital,
-            'df_trades': df_trades
+            'trade_ledger': self.trades,
+            'open_position': self.open_position_span(),
+            'equity_curve': equity_series if self.trade_frame else None,
+            'df_trades': df_trades,
+            'rejections': funnel,
+            'rejection_codes': self.rejection_codes
         }
 
-    def save_results(self, df_trades):
-        """Guarda los resultados en archivos"""
-        # Crear directorio si no existe
-        os.makedirs(LOGGING_CONFIG["output_directory"], exist_ok=True)
-        
-        # Guardar trades detallados
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{LOGGING_CONFIG['output_directory']}{LOGGING_CONFIG['file_prefix']}_{ACTIVE_INSTRUMENT}_{timestamp}.csv"
-        df_trades.to_csv(filename, index=False)
-        print(f"\n💾 Resultados guardados en: {filename}")
-        
-        # Generar gráfica de equity
-        if LOGGING_CONFIG["save_equity_curve"]:
-            self.plot_equity_curve(df_trades, timestamp)
-
-    def plot_equity_curve(self, df_trades, timestamp):
-        """Genera gráfica de curva de equity"""
-        plt.figure(figsize=(15, 10))
-        
-        # Equity curve
-        plt.subplot(2, 1, 1)
-        plt.plot(df_trades['exit_time'], df_trades['capital_curve'], 'b-', linewidth=2)
-        plt.title(f'Curva de Equity - {self.instrument_config["name"]}')
-        plt.ylabel('Capital ($)')
-        plt.grid(True, alpha=0.3)
-        
-        # Drawdown
-        plt.subplot(2, 1, 2)
-        plt.fill_between(df_trades['exit_time'], df_trades['drawdown'], 0, color='red', alpha=0.3)
-        plt.plot(df_trades['exit_time'], df_trades['drawdown'], 'r-')
-        plt.title('Drawdown')
-        plt.ylabel('Drawdown (%)')
-        plt.xlabel('Fecha')
-        plt.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        
-        # Guardar gráfica
-        chart_filename = f"{LOGGING_CONFIG['output_directory']}equity_curve_{ACTIVE_INSTRUMENT}_{timestamp}.png"
-        plt.savefig(chart_filename, dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        print(f"📈 Gráfica guardada en: {chart_filename}")
+    def _print_rejection_funnel(self, funnel):
+        self.events.message(f"\n🔎 EMBUDO DE ENTRADAS")
+        for line in format_rejection_funnel(funnel):
+            self.events.message(line)
+
+    def save_results(self, equity_curve=None):
+        """Encola el reporte (CSV de trades y gráfica de equity) en el renderer en segundo plano"""
+        get_report_renderer().submit(ReportJob(self.trades, equity_curve, instrument=self.instrument))
 
 # Función principal para ejecutar desde script externo
 def run_cfd_backtest():
@@ -687,6 +1049,16 @@ def run_cfd_backtest():
         return None
     
     engine = CFDBacktestEngine()
-    results = engine.run_backtest()
+    if INCREMENTAL_CONFIG["enabled"]:
+        from incremental import run_incremental_backtest
+        results = run_incremental_backtest(engine)
+    else:
+        results = engine.run_backtest()
+    
+    if MONTE_CARLO_CONFIG["enabled"] and results['total_trades']:
+        from monte_carlo import run_monte_carlo, format_monte_carlo_report
+        results['monte_carlo'] = run_monte_carlo(results['trade_ledger'])
+        for line in format_monte_carlo_report(results['monte_carlo']):
+            engine.events.message(line)
     
     return results
@@ -55,8 +55,7 @@ def main():
         ("pandas", "pandas"),
         ("numpy", "numpy"), 
         ("ta", "ta"),
-        ("matplotlib", "matplotlib"),
-        ("seaborn", "seaborn")
+        ("matplotlib", "matplotlib")
     ]
     
     # Verificar paquetes
@@ -1,12 +1,22 @@
 # config.py - Configuración para CFD Backtesting System
 
+import copy
+
 # =============================================================================
 # CONFIGURACIÓN DE ARCHIVOS DE DATOS
 # =============================================================================
 
 DATA_CONFIG = {
     "csv_file_path_15m": "data/UK100_15M_2021.csv",
-    "csv_file_path_4h": "data/UK100_4H_2021.csv"
+    "csv_file_path_4h": "data/UK100_4H_2021.csv",
+    "use_cache": True,                        # Cache binaria de datos + indicadores + features
+    "cache_directory": "data/cache/",         # Directorio de la cache binaria
+    "use_catalog": False,                     # Cargar todos los años de data_directory (ver data_catalog.py)
+    "data_directory": "data/",                # Ficheros {INSTRUMENTO}_{TIMEFRAME}_{AÑO}.csv
+    "years": None,                            # Años del catálogo a cargar (None = todos)
+    "start_date": None,                       # Rango del backtest ("2021-01", "2021-03-15"...; None = desde el inicio)
+    "end_date": None,                         # Fin del rango, incluido (None = hasta el final)
+    "load_workers": 4                         # Procesos para parsear los CSV del catálogo
 }
 
 # =============================================================================
@@ -161,7 +171,18 @@ OPTIMIZATION_CONFIG = {
         "trailing_stop": (0.01, 0.05, 0.005)
     },
     "min_trades_for_valid_result": 10,        # Mínimo trades para considerar válido
-    "cross_validation_splits": 3              # Splits para validación cruzada
+    "cross_validation_splits": 3,             # Splits para validación cruzada
+    "max_workers": 1                          # Procesos en paralelo (1 = secuencial)
+}
+
+STABILITY_CONFIG = {
+    "neighborhood": "moore",                  # moore (incluye diagonales) o axes (solo a lo largo de un eje)
+    "radius": 1,                              # Pasos del grid hasta los vecinos
+    "std_penalty": 1.0,                       # Puntuación = media de la vecindad - std_penalty * desviación
+    "spike_threshold": 1.0,                   # Desviaciones de la vecindad sobre el mejor vecino para marcar un pico aislado
+    "projection": "max",                      # Agregado de las filas de una misma celda (grid sobre parte de los parámetros): max o mean
+    "max_grid_cells": 20000000,               # Celdas del índice denso (si el grid es mayor: búsqueda binaria)
+    "top_n": 5                                # Mesetas mostradas
 }
 
 # =============================================================================
@@ -169,26 +190,168 @@ OPTIMIZATION_CONFIG = {
 # =============================================================================
 
 LOGGING_CONFIG = {
-    "log_level": "INFO",                      # DEBUG, INFO, WARNING, ERROR
+    "log_level": "INFO",                      # DEBUG, INFO, WARNING, ERROR, SILENT
     "log_trades": True,                       # Registrar cada trade
-    "log_signals": False,                     # Registrar señales no ejecutadas
-    "save_detailed_report": True,             # Guardar reporte detallado
-    "save_equity_curve": True,                # Guardar gráfica de equity
+    "log_signals": False,                     # Registrar señales no ejecutadas y su código por barra (results["rejection_codes"])
+    "log_file": None,                         # Fichero JSONL de eventos (None = consola)
+    "event_buffer_size": 1000,                # Eventos acumulados antes de escribir al fichero
+    "optimizer_log_level": "SILENT",          # Nivel de los backtests lanzados por el optimizador
     "output_directory": "results/",           # Directorio de resultados
     "file_prefix": "cfd_backtest"             # Prefijo para archivos de salida
 }
 
+REPORT_CONFIG = {
+    "save_detailed_report": True,             # Guardar CSV de trades
+    "save_equity_curve": True,                # Guardar gráfica de equity
+    "background": True,                       # Renderizar en procesos en segundo plano
+    "max_workers": 1,                         # Procesos de renderizado
+    "chart_dpi": 300,                         # Resolución de las gráficas
+    "optimizer_top_n": 3                      # Optimizador: reportes solo de los N mejores (0 = ninguno)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE CARTERA (VARIOS INSTRUMENTOS)
+# =============================================================================
+
+PORTFOLIO_CONFIG = {
+    "instruments": ["UK100", "WallStreet30", "Germany40"],
+    "data_file_pattern": "data/{instrument}_{timeframe}_2021.csv",   # {timeframe}: 15M / 4H
+    "max_workers": 3                          # Procesos para preparar los instrumentos
+}
+
+# =============================================================================
+# CONFIGURACIÓN DEL SERVIDOR DE BACKTEST
+# =============================================================================
+
+SERVER_CONFIG = {
+    "host": "127.0.0.1",                      # Solo conexiones locales
+    "port": 8765,
+    "max_workers": 2,                         # Procesos que ejecutan los jobs
+    "start_method": "forkserver"              # Arranque de los workers (forkserver o spawn; sin fork desde los hilos)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE BACKTEST INCREMENTAL
+# =============================================================================
+
+INCREMENTAL_CONFIG = {
+    "enabled": False,                         # main.py continúa el último backtest si los CSV solo han crecido
+    "checkpoint_directory": "data/checkpoints/",
+    "warmup_bars": 1000                       # Barras previas con las que se recalculan los indicadores
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE PAPER TRADING
+# =============================================================================
+
+LIVE_CONFIG = {
+    "source": "file",                         # "file" (sigue los CSV de DATA_CONFIG) o "socket" (JSON por línea)
+    "host": "127.0.0.1",                      # Feed por socket
+    "port": 9100,
+    "poll_interval": 0.5,                     # Segundos entre lecturas de los CSV
+    "history_bars": 1000,                     # Barras previas con las que se inicializan los indicadores
+    "latency_report_every": 100               # Informe de latencia cada N barras de 15M (0 = solo al final)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE BENCHMARKS
+# =============================================================================
+
+BENCHMARK_CONFIG = {
+    "scales": {                               # Datos sintéticos: años y minutos por barra de entrada
+        "1y": {"years": 1, "minutes": 15},
+        "10y": {"years": 10, "minutes": 15},
+        "1m_10y": {"years": 10, "minutes": 1, "optimizer": False}
+    },
+    "default_scales": ["1y"],
+    "formats": ["timestamp", "dukascopy"],    # Formatos de CSV a medir
+    "seed": 42,
+    "repeat": 3,                              # Repeticiones de las etapas de carga (se queda el mejor tiempo)
+    "optimizer_ranges": {
+        "volume_threshold": (1.0, 1.5, 0.5),
+        "atr_threshold": (0.8, 1.0, 0.2),
+        "trailing_stop": (0.01, 0.02, 0.01)
+    },
+    "data_directory": "data/benchmark/",      # CSV sintéticos generados (se reutilizan)
+    "output_directory": "results/benchmarks/",
+    "baseline_file": "results/benchmarks/baseline.json",
+    "regression_tolerance": 0.25,             # Más de un 25% más lento que el baseline = regresión
+    "min_stage_seconds": 0.1                  # Etapas más cortas no cuentan como regresión (ruido)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE MONTE CARLO (ver monte_carlo.py)
+# =============================================================================
+
+MONTE_CARLO_CONFIG = {
+    "enabled": False,                         # Ejecutar tras cada backtest de main.py
+    "paths": 10000,                           # Secuencias de trades simuladas
+    "method": "bootstrap",                    # bootstrap (con reemplazo) o shuffle (permutaciones)
+    "seed": 42,
+    "percentiles": [5, 25, 50, 75, 95],
+    "chunk_cells": 1000000                    # Caminos x trades por bloque (acota la memoria)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DEL STRESS TEST (ver stress_test.py)
+# =============================================================================
+
+STRESS_TEST_CONFIG = {
+    "paths": 200,                             # Historias alternativas a simular
+    "block_bars": 96,                         # Barras por bloque del bootstrap (96 = un día de 15M)
+    "seed": 7,                                # Semilla del primer camino (cada camino usa seed + k)
+    "max_workers": None,                      # Procesos (None = todos los núcleos)
+    "percentiles": [5, 25, 50, 75, 95],
+    "output_directory": "results/stress/"
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE EQUIVALENCIA ENTRE MOTORES
+# =============================================================================
+
+EQUIVALENCE_CONFIG = {
+    "candidate_engine": "cfd_backtest_engine:CFDBacktestEngine",  # Motor a comparar (módulo:clase)
+    "datasets": ["real", "synthetic"],        # CSV de DATA_CONFIG y/o datos sintéticos
+    "synthetic_years": 1,
+    "synthetic_seeds": [7, 11],               # Un dataset sintético por semilla
+    "parameter_sets": 5,                      # Combinaciones aleatorias por dataset
+    "seed": 2024,                             # Semilla del muestreo de parámetros
+    "parameter_space": {                      # (mín, máx) uniforme o lista de valores
+        "FILTERS_CONFIG.volume_threshold": (0.8, 2.0),
+        "FILTERS_CONFIG.atr_threshold": (0.7, 1.6),
+        "RISK_CONFIG.trailing_stop_percent": (0.003, 0.04),
+        "RISK_CONFIG.use_trailing_stop": [True, False],
+        "FILTERS_CONFIG.use_rsi_filter": [False, True],
+        "FILTERS_CONFIG.rsi_oversold": (20, 40),
+        "FILTERS_CONFIG.rsi_overbought": (60, 80),
+        "FILTERS_CONFIG.max_spread_multiplier": (1.2, 3.0),
+        "FILTERS_CONFIG.use_stop_distance_filter": [True, False],
+        "RISK_CONFIG.max_trades_per_day": [1, 2, 3, 5],
+        "RISK_CONFIG.cooldown_minutes": [0, 30, 60, 240],
+        "RISK_CONFIG.max_consecutive_losses": [2, 5, 1000]
+    },
+    "float_tolerance": 1e-9,                  # Tolerancia relativa en precios, tamaños y P&L
+    "data_directory": "data/benchmark/",      # CSV sintéticos (compartidos con el benchmark)
+    "output_directory": "results/equivalence/"
+}
+
 # =============================================================================
 # CONFIGURACIÓN DE VALIDACIÓN
 # =============================================================================
 
 VALIDATION_CONFIG = {
     "validate_data_integrity": True,          # Validar integridad de datos
-    "remove_outliers": True,                  # Remover outliers de precio
+    "remove_outliers": True,                  # Remover picos de precio (salto que se deshace en la barra siguiente)
     "outlier_std_threshold": 5,               # Threshold para outliers (desv. std)
     "validate_trading_hours": True,           # Validar horarios en datos
-    "min_data_points": 1000,                 # Mínimo de puntos de datos
-    "check_data_gaps": True                   # Verificar gaps en datos
+    "min_data_points": 1000,                 # Mínimo de puntos de datos (timeframe de entrada)
+    "check_data_gaps": True,                  # Verificar gaps en datos
+    "outlier_window": 96,                     # Barras de la ventana de mediana/MAD de los retornos
+    "spike_std_threshold": 10,                # z-score mínimo del salto y de su vuelta para eliminar un pico
+    "spike_max_residual": 0.25,               # Un pico se deshace en la barra siguiente salvo este % del salto
+    "max_reported_gaps": 10,                  # Huecos y picos listados en el informe
+    "check_coverage": True,                   # Diagnóstico de cobertura 15M/4H antes de cada backtest
+    "max_4h_staleness_hours": 8               # Antigüedad máxima de la barra 4H alineada antes de avisar
 }
 
 # =============================================================================
@@ -201,7 +364,15 @@ DEBUG_CONFIG = {
     "save_intermediate_results": False,       # Guardar resultados intermedios
     "plot_signals": False,                    # Plotear señales en gráficos
     "max_trades_to_log": 100,                # Máximo trades a loggear en detalle
-    "progress_update_frequency": 0.1          # Frecuencia de updates (0.1 = 10%)
+    "progress_update_frequency": 0.1,         # Frecuencia de updates (0.1 = 10%)
+    "profile_hot_path": False,                # Llamadas y tiempo acumulado de las funciones por barra
+    "sampling_profiler": False,               # Perfilador por muestreo durante el backtest
+    "sampling_interval": 0.005,               # Segundos entre muestras del perfilador
+    "profile_top_n": 15,                      # Funciones mostradas del perfilador
+    "profile_output": None,                   # Fichero de pilas colapsadas (flamegraph) o None
+    "memory_profile": False,                  # Memoria por etapa con tracemalloc (lento, solo diagnóstico)
+    "memory_top_n": 10,                       # Líneas con más memoria reservada por etapa
+    "memory_traceback_frames": 1              # Profundidad de las trazas de tracemalloc
 }
 
 # =============================================================================
@@ -246,6 +417,39 @@ def validate_config():
     print("✅ Configuración validada correctamente")
     return True
 
+# Secciones de configuración que se copian a los procesos worker
+CONFIG_SECTIONS = (
+    "DATA_CONFIG", "CAPITAL_CONFIG", "RISK_CONFIG", "FILTERS_CONFIG",
+    "ICHIMOKU_CONFIG", "TIMEFRAME_CONFIG", "OPTIMIZATION_CONFIG", "STABILITY_CONFIG",
+    "LOGGING_CONFIG", "REPORT_CONFIG", "PORTFOLIO_CONFIG", "SERVER_CONFIG",
+    "INCREMENTAL_CONFIG", "LIVE_CONFIG", "BENCHMARK_CONFIG", "MONTE_CARLO_CONFIG",
+    "STRESS_TEST_CONFIG", "EQUIVALENCE_CONFIG", "VALIDATION_CONFIG", "DEBUG_CONFIG"
+)
+
+def snapshot_config():
+    """Copia de todas las secciones de configuración (para enviar a otros procesos)"""
+    return {name: copy.deepcopy(globals()[name]) for name in CONFIG_SECTIONS}
+
+def apply_config_overrides(overrides):
+    """
+    Aplica valores sobre las secciones de configuración, modificando los
+    diccionarios in-place para que los módulos que los importaron vean el cambio.
+
+    Args:
+        overrides: Dict {"FILTERS_CONFIG": {"volume_threshold": 1.5}, ...}
+
+    Returns:
+        Dict con los valores anteriores, apto para restaurar con esta misma función
+    """
+    previous = {}
+    for section, values in overrides.items():
+        if section not in CONFIG_SECTIONS:
+            raise KeyError(f"Sección de configuración desconocida: {section}")
+        target = globals()[section]
+        previous[section] = {key: copy.deepcopy(target[key]) for key in values if key in target}
+        target.update(values)
+    return previous
+
 def get_active_instrument_config():
     """Retorna la configuración del instrumento activo"""
     return INSTRUMENTS[ACTIVE_INSTRUMENT]
@@ -283,10 +487,7 @@ def print_current_config():
     
     print("=" * 60)
 
-# Ejecutar validación al importar
+# La validación es explícita (validate_config()): importar config no tiene efectos secundarios
 if __name__ == "__main__":
     print_current_config()
     validate_config()
-else:
-    # Validar silenciosamente al importar
-    validate_config()
\ No newline at end of file
@@ -0,0 +1,201 @@
+# data_catalog.py - Catálogo de CSV por instrumento/timeframe/año y carga concurrente
+
+import os
+import re
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from config import *
+
+# {INSTRUMENTO}_{TIMEFRAME}_{AÑO}.csv, p.ej. UK100_15M_2021.csv (el año es opcional)
+CATALOG_FILE_PATTERN = re.compile(r"^(?P<instrument>.+?)_(?P<timeframe>\d+[MHDW])(?:_(?P<year>\d{4}))?\.csv$",
+                                  re.IGNORECASE)
+
+def read_price_csv(path, sort=True):
+    """
+    Lee un CSV de precios: detecta el formato de fecha, indexa por fecha,
+    ordena (salvo sort=False) y normaliza los nombres de columnas OHLCV.
+    """
+    return parse_price_frame(pd.read_csv(path), path, sort=sort)
+
+def parse_price_frame(df, source=None, sort=True):
+    """
+    Convierte las fechas de un CSV ya leído en índice y normaliza las columnas
+
+    Args:
+        sort: Ordenar por fecha; sin ordenar la validación puede ver el orden del fichero
+    """
+    # Detectar formato de fecha
+    if 'timestamp' in df.columns:
+        df['datetime'] = pd.to_datetime(df['timestamp'])
+    elif 'date' in df.columns:
+        df['datetime'] = pd.to_datetime(df['date'])
+    elif 'Local time' in df.columns:
+        df['datetime'] = pd.to_datetime(df['Local time'], format='%d.%m.%Y %H:%M:%S.%f GMT%z')
+    else:
+        raise ValueError(f"Formato de fecha no reconocido en {source}")
+
+    df.set_index('datetime', inplace=True)
+    if sort:
+        df.sort_index(inplace=True)
+
+    # Normalizar nombres de columnas
+    df.rename(columns={
+        'Open': 'open', 'High': 'high', 'Low': 'low',
+        'Close': 'close', 'Volume': 'volume'
+    }, inplace=True)
+    return df
+
+def merge_price_frames(frames, sort=True):
+    """
+    Concatena varios tramos (p.ej. años), ordena y elimina el solape (se queda el último)
+
+    Args:
+        sort: Con False solo se concatenan, en el orden de los ficheros: la
+            validación cuenta duplicados y desorden antes de limpiarlos
+    """
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames)
+    if not sort:
+        return df
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index(kind='stable')
+
+def read_price_files(groups, max_workers=None, sort=True):
+    """
+    Lee y fusiona varios grupos de CSV. Todos los ficheros de todos los
+    grupos se parsean a la vez en un pool de procesos.
+
+    Args:
+        groups: Lista de listas de rutas (un grupo por serie a fusionar)
+        max_workers: Procesos (por defecto DATA_CONFIG["load_workers"]; 1 = secuencial)
+        sort: Ordenar y eliminar duplicados (ver merge_price_frames)
+
+    Returns:
+        Lista de DataFrames, uno por grupo
+    """
+    paths = [path for group in groups for path in group]
+    max_workers = min(max_workers or DATA_CONFIG.get("load_workers", 1), len(paths))
+
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            loaded = dict(zip(paths, executor.map(read_price_csv, paths, [sort] * len(paths))))
+    else:
+        loaded = {path: read_price_csv(path, sort) for path in paths}
+
+    return [merge_price_frames([loaded[path] for path in group], sort) for group in groups]
+
+class DataCatalog:
+    """Ficheros de datos disponibles bajo un directorio, por instrumento, timeframe y año"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or DATA_CONFIG.get("data_directory", "data/")
+        self.files = self.discover()
+
+    def discover(self):
+        """Dict {(instrumento, timeframe): [(año, ruta), ...]} ordenado por año"""
+        files = {}
+        if not os.path.isdir(self.directory):
+            return files
+        for entry in os.scandir(self.directory):
+            match = CATALOG_FILE_PATTERN.match(entry.name)
+            if not entry.is_file() or not match:
+                continue
+            key = (match['instrument'], match['timeframe'].upper())
+            year = int(match['year']) if match['year'] else None
+            files.setdefault(key, []).append((year, entry.path))
+        for entries in files.values():
+            entries.sort(key=lambda item: (item[0] is not None, item[0] or 0))
+        return files
+
+    def instruments(self):
+        return sorted({instrument for instrument, _ in self.files})
+
+    def files_for(self, instrument, timeframe, years=None):
+        """
+        Rutas de un instrumento/timeframe en orden cronológico
+
+        Args:
+            years: Años a incluir (None = todos)
+        """
+        entries = self.files.get((instrument, timeframe.upper()), [])
+        paths = [path for year, path in entries if years is None or year in years]
+        if not paths:
+            raise FileNotFoundError(f"No hay datos {instrument} {timeframe} en {self.directory}"
+                                    + (f" para los años {list(years)}" if years else ""))
+        return paths
+
+    def load(self, instrument, timeframes=("15M", "4H"), years=None, max_workers=None, sort=True):
+        """
+        Carga y fusiona todos los años de cada timeframe de un instrumento.
+        Con DATA_CONFIG["use_cache"] las series fusionadas se guardan en la
+        cache binaria y solo se releen los CSV si alguno cambia.
+
+        Args:
+            sort: Con False las series quedan en el orden de los ficheros, con
+                sus duplicados, para que validate_price_frame los cuente
+
+        Returns:
+            Tupla de DataFrames en el orden de timeframes
+        """
+        groups = [self.files_for(instrument, timeframe, years) for timeframe in timeframes]
+        use_cache = DATA_CONFIG.get("use_cache", True)
+        cache_directory = os.path.join(DATA_CONFIG.get("cache_directory", "data/cache/"), "catalog")
+
+        frames = [None] * len(groups)
+        suffix = "" if sort else "_unsorted"
+        cache_paths = [os.path.join(cache_directory, f"{source_files_key(group)}{suffix}.pkl") for group in groups]
+        if use_cache:
+            for position, cache_path in enumerate(cache_paths):
+                if os.path.exists(cache_path):
+                    frames[position] = pd.read_pickle(cache_path)
+
+        missing = [position for position, frame in enumerate(frames) if frame is None]
+        if missing:
+            loaded = read_price_files([groups[position] for position in missing], max_workers, sort)
+            for position, frame in zip(missing, loaded):
+                frames[position] = frame
+                if use_cache:
+                    os.makedirs(cache_directory, exist_ok=True)
+                    frame.to_pickle(cache_paths[position])
+
+        return tuple(frames)
+
+    def summary(self):
+        """DataFrame con los años y ficheros disponibles por instrumento y timeframe"""
+        rows = [{
+            'instrument': instrument,
+            'timeframe': timeframe,
+            'years': [year for year, _ in entries],
+            'files': len(entries)
+        } for (instrument, timeframe), entries in sorted(self.files.items())]
+        return pd.DataFrame(rows, columns=['instrument', 'timeframe', 'years', 'files'])
+
+def source_files_key(paths):
+    """Huella de una lista de ficheros (ruta, tamaño y fecha de modificación)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+def data_sources(instrument=None):
+    """
+    Ficheros de los que sale el dataset de un instrumento: todos los años del
+    catálogo si DATA_CONFIG["use_catalog"], o las dos rutas de DATA_CONFIG.
+
+    Returns:
+        (rutas 15M, rutas 4H)
+    """
+    if DATA_CONFIG.get("use_catalog"):
+        catalog = DataCatalog()
+        years = DATA_CONFIG.get("years")
+        instrument = instrument or ACTIVE_INSTRUMENT
+        return catalog.files_for(instrument, "15M", years), catalog.files_for(instrument, "4H", years)
+    return [DATA_CONFIG["csv_file_path_15m"]], [DATA_CONFIG["csv_file_path_4h"]]
+
+if __name__ == "__main__":
+    catalog = DataCatalog()
+    print(f"📁 Catálogo de {catalog.directory}")
+    print(catalog.summary().to_string(index=False))
@@ -0,0 +1,114 @@
+# data_coverage.py - Diagnóstico de cobertura y alineación 15M/4H
+
+import numpy as np
+import pandas as pd
+from config import *
+from data_validation import timeframe_minutes
+from dataset import build_alignment_index
+
+HOUR_NS = 3600 * 10**9
+
+def _iso(value):
+    return pd.Timestamp(value).isoformat()
+
+def _ns(index):
+    return index.values.astype('datetime64[ns]').view(np.int64)
+
+def _runs(flags):
+    """(inicio, fin) de cada tramo de True consecutivos; fin exclusivo"""
+    edges = np.diff(np.r_[0, flags.view(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def analyze_coverage(df_15m, df_4h, alignment=None, max_staleness_hours=None):
+    """
+    Cobertura de las dos series y alineación de cada barra de 15M con su barra 4H
+
+    Usa el mismo índice de alineación que el motor (PreparedDataset.alignment),
+    de modo que cada barra de 15M se evalúa con exactamente la barra 4H que
+    usará get_4h_trend_bias. Todo el cálculo es vectorizado.
+
+    Args:
+        df_15m, df_4h: Series con índice datetime ordenado
+        alignment: Índice de alineación ya calculado (se calcula si no se indica)
+        max_staleness_hours: Antigüedad a partir de la cual el sesgo 4H se
+            considera obsoleto; por defecto VALIDATION_CONFIG["max_4h_staleness_hours"]
+
+    Returns:
+        Dict con ventana común, barras sin 4H, antigüedad del sesgo y recuento mensual
+    """
+    if alignment is None:
+        alignment = build_alignment_index(df_15m.index, df_4h.index)
+    if max_staleness_hours is None:
+        max_staleness_hours = VALIDATION_CONFIG["max_4h_staleness_hours"]
+    max_reported = VALIDATION_CONFIG["max_reported_gaps"]
+
+    report = {"bars_15m": len(df_15m), "bars_4h": len(df_4h), "warnings": []}
+    if not len(df_15m) or not len(df_4h):
+        report["warnings"].append("sin datos 15M o 4H")
+        return report
+
+    times_15m, times_4h = _ns(df_15m.index), _ns(df_4h.index)
+    step_4h = timeframe_minutes(TIMEFRAME_CONFIG["trend_timeframe"]) * 60 * 10**9
+    report["range_15m"] = [_iso(df_15m.index[0]), _iso(df_15m.index[-1])]
+    report["range_4h"] = [_iso(df_4h.index[0]), _iso(df_4h.index[-1])]
+    overlap_start, overlap_end = max(times_15m[0], times_4h[0]), min(times_15m[-1], times_4h[-1] + step_4h)
+    report["overlap"] = [_iso(overlap_start), _iso(overlap_end)] if overlap_start <= overlap_end else None
+
+    # Barras de 15M sin barra 4H previa y posteriores al cierre de la última barra 4H
+    has_4h = alignment >= 0
+    report["without_4h"] = int(len(alignment) - np.count_nonzero(has_4h))
+    report["after_4h"] = int(np.count_nonzero(times_15m >= times_4h[-1] + step_4h))
+
+    # Antigüedad de la barra 4H alineada con cada barra de 15M
+    age = np.where(has_4h, times_15m - times_4h[np.where(has_4h, alignment, 0)], 0)
+    stale = has_4h & (age > max_staleness_hours * HOUR_NS)
+    starts, ends = _runs(stale)
+    longest = np.argsort(times_15m[ends - 1] - times_15m[starts])[::-1][:max_reported]
+    report["staleness"] = {
+        "max_hours": float(age.max()) / HOUR_NS,
+        "threshold_hours": max_staleness_hours,
+        "stale_bars": int(np.count_nonzero(stale)),
+        "runs": len(starts),
+        "longest": [{"start": _iso(times_15m[starts[k]]), "end": _iso(times_15m[ends[k] - 1]),
+                     "bars": int(ends[k] - starts[k]),
+                     "max_age_hours": float(age[ends[k] - 1]) / HOUR_NS} for k in longest]
+    }
+
+    # Barras por mes de cada serie y barras de 15M con sesgo obsoleto
+    months_15m = times_15m.astype('datetime64[ns]').astype('datetime64[M]').view(np.int64)
+    months_4h = times_4h.astype('datetime64[ns]').astype('datetime64[M]').view(np.int64)
+    first = min(months_15m[0], months_4h[0])
+    size = max(months_15m[-1], months_4h[-1]) - first + 1
+    counts_15m = np.bincount(months_15m - first, minlength=size)
+    counts_4h = np.bincount(months_4h - first, minlength=size)
+    counts_stale = np.bincount(months_15m - first, weights=stale | ~has_4h, minlength=size).astype(np.int64)
+    labels = np.datetime_as_string(np.arange(first, first + size).astype('datetime64[M]'))
+    report["monthly"] = [{"month": str(labels[k]), "bars_15m": int(counts_15m[k]), "bars_4h": int(counts_4h[k]),
+                          "unaligned_15m": int(counts_stale[k])} for k in range(size)]
+    uncovered = [month["month"] for month in report["monthly"] if month["bars_15m"] and not month["bars_4h"]]
+    report["months_without_4h"] = uncovered
+
+    if report["without_4h"]:
+        report["warnings"].append(f"{report['without_4h']} barras 15M anteriores a la primera barra 4H")
+    if report["after_4h"]:
+        report["warnings"].append(f"{report['after_4h']} barras 15M posteriores a la última barra 4H "
+                                  f"({report['range_4h'][1]})")
+    if report["staleness"]["stale_bars"]:
+        report["warnings"].append(f"{report['staleness']['stale_bars']} barras 15M con sesgo 4H de más de "
+                                  f"{max_staleness_hours}h ({report['staleness']['runs']} tramos)")
+    if uncovered:
+        report["warnings"].append(f"{len(uncovered)} meses con datos 15M y sin datos 4H ({uncovered[0]} ...)")
+    return report
+
+def format_coverage_report(report):
+    """Líneas de texto del diagnóstico de cobertura"""
+    lines = [f"🧭 Cobertura: {report['bars_15m']} barras 15M, {report['bars_4h']} barras 4H"]
+    if report.get("overlap"):
+        lines[0] += f" - ventana común {report['overlap'][0]} -> {report['overlap'][1]}"
+    if "staleness" in report:
+        lines[0] += f" - sesgo 4H con antigüedad máxima {report['staleness']['max_hours']:.1f}h"
+    lines.extend(f"   ⚠️  {warning}" for warning in report["warnings"])
+    for run in report.get("staleness", {}).get("longest", [])[:3]:
+        lines.append(f"      sesgo obsoleto {run['start']} -> {run['end']} "
+                     f"({run['bars']} barras, hasta {run['max_age_hours']:.1f}h)")
+    return lines
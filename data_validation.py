@@ -0,0 +1,162 @@
+# data_validation.py - Validación vectorizada de series OHLCV (VALIDATION_CONFIG)
+
+import numpy as np
+import pandas as pd
+from config import *
+
+# Minutos por unidad de los nombres de timeframe ("15M", "4H", "1D")
+TIMEFRAME_UNITS = {"M": 1, "H": 60, "D": 1440}
+
+# Factor que convierte la MAD en desviación típica equivalente (distribución normal)
+MAD_SCALE = 0.6745
+
+def timeframe_minutes(timeframe):
+    """Minutos de una barra a partir del nombre del timeframe"""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1].upper()]
+
+def _iso(value):
+    return pd.Timestamp(value).isoformat()
+
+def robust_zscores(returns, window):
+    """
+    z-score robusto de cada retorno frente a la mediana y la MAD de las
+    `window` barras anteriores (la propia barra no entra en su ventana)
+    """
+    series = pd.Series(returns)
+    min_periods = max(2, window // 4)
+    median = series.rolling(window, min_periods=min_periods).median().shift(1)
+    mad = (series - median).abs().rolling(window, min_periods=min_periods).median().shift(1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = MAD_SCALE * (series - median).to_numpy() / mad.to_numpy()
+    z[~np.isfinite(z)] = 0.0
+    return z
+
+def validate_price_frame(df, timeframe, instrument_config=None, min_bars=None):
+    """
+    Valida una serie OHLCV en una pasada vectorizada y devuelve la serie limpia
+
+    Comprueba timestamps duplicados y fuera de orden (en el orden del fichero),
+    huecos según el timeframe (separando los fines de semana), coherencia OHLC,
+    precios no válidos, outliers por z-score robusto de los retornos y barras
+    fuera del horario del instrumento.
+
+    Args:
+        df: DataFrame con índice datetime en el orden del fichero
+        timeframe: Nombre del timeframe ("15M", "4H")
+        instrument_config: Configuración del instrumento (horario de trading)
+        min_bars: Mínimo de barras exigido (error si hay menos)
+
+    Returns:
+        (DataFrame ordenado, sin duplicados ni picos si remove_outliers, informe)
+    """
+    if not VALIDATION_CONFIG["validate_data_integrity"]:
+        return df[~df.index.duplicated(keep='last')].sort_index(kind='stable'), None
+
+    report = {"timeframe": timeframe, "bars": len(df), "errors": [], "warnings": []}
+
+    # Duplicados y orden en los datos tal como vienen (ns, sea cual sea la resolución del índice)
+    times = df.index.values.astype('datetime64[ns]').view(np.int64)
+    report["duplicates"] = int(df.index.duplicated().sum())
+    report["non_monotonic"] = int(np.count_nonzero(np.diff(times) < 0))
+
+    # Orden estable y duplicados: se queda la última fila (como merge_price_frames)
+    df = df[~df.index.duplicated(keep='last')].sort_index(kind='stable')
+    times = df.index.values.astype('datetime64[ns]').view(np.int64)
+    if len(df):
+        report["first"], report["last"] = _iso(df.index[0]), _iso(df.index[-1])
+
+    # Huecos: separaciones mayores que el timeframe; los de fin de semana aparte
+    if VALIDATION_CONFIG["check_data_gaps"] and len(df) > 1:
+        step = timeframe_minutes(timeframe) * 60 * 10**9
+        spacing = np.diff(times)
+        gap = spacing > step
+        weekday = df.index.dayofweek.to_numpy()
+        weekend = (gap & np.isin(weekday[:-1], (4, 5, 6)) & np.isin(weekday[1:], (5, 6, 0))
+                   & (spacing < 4 * 86400 * 10**9))
+        other = np.flatnonzero(gap & ~weekend)
+        largest = other[np.argsort(spacing[other])[::-1][:VALIDATION_CONFIG["max_reported_gaps"]]]
+        report["gaps"] = {
+            "count": len(other),
+            "weekend": int(np.count_nonzero(weekend)),
+            "missing_bars": int((spacing[other] // step - 1).sum()),
+            "largest": [{"start": _iso(df.index[i]), "end": _iso(df.index[i + 1]),
+                         "hours": spacing[i] / 3.6e12} for i in largest]
+        }
+        if other.size:
+            report["warnings"].append(f"{other.size} huecos ({report['gaps']['missing_bars']} barras sin datos)")
+
+    # Coherencia OHLC y precios no válidos
+    open_, high, low, close = (df[column].to_numpy(dtype=float) for column in ('open', 'high', 'low', 'close'))
+    with np.errstate(invalid='ignore'):
+        prices = np.column_stack((open_, high, low, close))
+        invalid = ~np.isfinite(prices).all(axis=1) | (prices <= 0).any(axis=1)
+        inconsistent = (high < np.maximum(open_, close)) | (low > np.minimum(open_, close)) | (high < low)
+    report["invalid_prices"] = int(np.count_nonzero(invalid))
+    report["ohlc_inconsistent"] = int(np.count_nonzero(inconsistent & ~invalid))
+    report["negative_volume"] = int(np.count_nonzero(df['volume'].to_numpy(dtype=float) < 0)) if 'volume' in df else 0
+
+    # Outliers: retornos con z-score robusto extremo. Un pico es un salto extremo
+    # y aislado que la barra siguiente deshace casi por completo (un tick
+    # erróneo); los saltos que se mantienen, se corrigen solo en parte o llegan
+    # en mitad de un tramo volátil son mercado
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(close))
+    z = robust_zscores(returns, VALIDATION_CONFIG["outlier_window"])
+    extreme = np.abs(z) > VALIDATION_CONFIG["outlier_std_threshold"]
+    jump = np.abs(z) > VALIDATION_CONFIG["spike_std_threshold"]
+    with np.errstate(invalid='ignore'):
+        reverted = np.abs(returns[:-1] + returns[1:]) <= VALIDATION_CONFIG["spike_max_residual"] * np.abs(returns[:-1])
+    isolated = ~np.r_[False, extreme[:-2]] & ~np.r_[extreme[2:], False]
+    spikes = np.flatnonzero(jump[:-1] & jump[1:] & reverted & isolated) + 1
+    report["outlier_returns"] = int(np.count_nonzero(extreme))
+    report["spikes"] = [_iso(df.index[i]) for i in spikes[:VALIDATION_CONFIG["max_reported_gaps"]]]
+    report["spikes_removed"] = 0
+
+    # Horario: barras en fin de semana y fuera del horario del instrumento
+    if VALIDATION_CONFIG["validate_trading_hours"] and len(df):
+        report["weekend_bars"] = int(np.count_nonzero(df.index.dayofweek >= 5))
+        if instrument_config is not None:
+            hours = instrument_config["trading_hours"]
+            start = hours["start_hour"] * 60 + hours["start_minute"]
+            end = hours["end_hour"] * 60 + hours["end_minute"]
+            minute = df.index.hour.to_numpy() * 60 + df.index.minute.to_numpy()
+            inside = (minute >= start) | (minute <= end) if start > end else (minute >= start) & (minute <= end)
+            report["outside_trading_hours"] = int(np.count_nonzero(~inside))
+
+    for key, label in (("duplicates", "timestamps duplicados"), ("non_monotonic", "timestamps fuera de orden"),
+                       ("invalid_prices", "barras con precios no válidos"),
+                       ("ohlc_inconsistent", "barras con OHLC incoherente"),
+                       ("negative_volume", "barras con volumen negativo")):
+        if report[key]:
+            report["warnings"].append(f"{report[key]} {label}")
+    if len(spikes):
+        report["warnings"].append(f"{len(spikes)} picos de precio (z-score > {VALIDATION_CONFIG['spike_std_threshold']} ida y vuelta)")
+
+    if VALIDATION_CONFIG["remove_outliers"] and len(spikes):
+        keep = np.ones(len(df), dtype=bool)
+        keep[spikes] = False
+        df = df[keep]
+        report["spikes_removed"] = len(spikes)
+
+    if min_bars is not None and len(df) < min_bars:
+        report["errors"].append(f"{len(df)} barras, se necesitan al menos {min_bars} (min_data_points)")
+
+    return df, report
+
+def format_validation_report(report):
+    """Líneas de texto del informe de validación de una serie"""
+    gaps = report.get("gaps")
+    line = f"🧪 {report['timeframe']}: {report['bars']} barras"
+    if gaps is not None:
+        line += f" - {gaps['count']} huecos ({gaps['weekend']} de fin de semana)"
+    line += f" - {report['outlier_returns']} retornos extremos"
+    if "outside_trading_hours" in report:
+        line += f" - {report['outside_trading_hours']} barras fuera de horario"
+    lines = [line]
+    lines.extend(f"   ⚠️  {warning}" for warning in report["warnings"])
+    if gaps is not None:
+        lines.extend(f"      hueco {gap['start']} -> {gap['end']} ({gap['hours']:.1f}h)" for gap in gaps["largest"][:3])
+    if report["spikes_removed"]:
+        lines.append(f"   🧹 {report['spikes_removed']} picos eliminados (remove_outliers)")
+    lines.extend(f"   ❌ {error}" for error in report["errors"])
+    return lines
@@ -0,0 +1,236 @@
+# dataset.py - Dataset preparado: OHLCV + indicadores + matriz de features
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from config import *
+from data_catalog import source_files_key
+
+# Columnas de la matriz de features (float32, una fila por barra de 15M)
+FEATURE_COLUMNS = (
+    "volume_ratio",          # volume / volume_sma
+    "atr_ratio",             # atr / atr de la barra anterior
+    "atr_multiplier",        # max(1, atr / media de ATR de las 20 barras previas)
+    "rsi",
+    "stop_distance_long",    # close - borde inferior de la nube
+    "stop_distance_short"    # borde superior de la nube - close
+)
+
+VOLUME_RATIO = 0
+ATR_RATIO = 1
+ATR_MULTIPLIER = 2
+RSI = 3
+STOP_DISTANCE_LONG = 4
+STOP_DISTANCE_SHORT = 5
+
+# Ventana del ATR medio usado para simular el spread variable
+SPREAD_ATR_WINDOW = 20
+
+def build_feature_matrix(df):
+    """
+    Precalcula los ratios que usan los filtros por barra.
+
+    Replica la semántica de los cálculos originales barra a barra (divisiones
+    protegidas, min()/max() de Python con NaN), de modo que cada filtro pasa a
+    ser una única comparación contra su umbral.
+    """
+    n = len(df)
+    features = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+
+    close = df['close'].to_numpy(dtype=float)
+    volume = df['volume'].to_numpy(dtype=float)
+    volume_sma = df['volume_sma'].to_numpy(dtype=float)
+    atr = df['atr'].to_numpy(dtype=float)
+    span_a = df['senkou_span_a'].to_numpy(dtype=float)
+    span_b = df['senkou_span_b'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features[:, VOLUME_RATIO] = np.where(volume_sma > 0, volume / volume_sma, 1.0)
+
+        atr_previous = np.r_[atr[:1], atr[:-1]]
+        features[:, ATR_RATIO] = np.where(atr_previous > 0, atr / atr_previous, 1.0)
+
+        atr_avg = pd.Series(atr).shift(1).rolling(SPREAD_ATR_WINDOW, min_periods=1).mean().to_numpy()
+        ratio = atr / atr_avg
+        features[:, ATR_MULTIPLIER] = np.where(atr_avg > 0, np.where(ratio > 1.0, ratio, 1.0), 1.0)
+
+    features[:, RSI] = df['rsi'].to_numpy(dtype=float)
+
+    # Stop en el borde de la nube (min/max de Python: devuelve span_a salvo comparación estricta)
+    stop_long = np.where(span_b < span_a, span_b, span_a)
+    stop_short = np.where(span_b > span_a, span_b, span_a)
+    features[:, STOP_DISTANCE_LONG] = np.abs(close - stop_long)
+    features[:, STOP_DISTANCE_SHORT] = np.abs(close - stop_short)
+
+    return features
+
+def build_alignment_index(index_15m, index_4h):
+    """
+    Posición de la última barra 4H con timestamp <= cada barra de 15M (-1 si
+    aún no hay ninguna): la misma barra que elige la búsqueda por fecha de
+    get_4h_trend_bias, resuelta de una vez con searchsorted
+    """
+    return index_4h.searchsorted(index_15m, side='right') - 1
+
+class PreparedDataset:
+    """Datos 15M/4H con indicadores calculados y su matriz de features"""
+
+    def __init__(self, df_15m, df_4h, features=None, cache_path=None, validation=None):
+        self.df_15m = df_15m
+        self.df_4h = df_4h
+        self._features = features
+        self._alignment = None
+        self.cache_path = cache_path
+        self.validation = validation        # Informe de data_validation por timeframe (o None)
+        self.base = None                    # Dataset completo del que esta es una vista (ver view)
+        self.offset = 0                     # Posición de la primera barra en el dataset completo
+        self.first_bar = 0                  # Primera barra del rango (las anteriores son solo contexto)
+        self.date_range = None
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = build_feature_matrix(self.df_15m)
+        return self._features
+
+    @property
+    def alignment(self):
+        """Índice de alineación 15M -> 4H (int64, una posición por barra de 15M)"""
+        if self._alignment is None:
+            self._alignment = build_alignment_index(self.df_15m.index, self.df_4h.index)
+        return self._alignment
+
+    def view(self, start=None, end=None):
+        """
+        Vista del dataset entre dos fechas (incluidas; admite fechas parciales
+        como "2021-03") sin copiar datos
+
+        Las series, la matriz de features y el índice de alineación son slices
+        de los del historial completo, así que los indicadores llegan ya
+        calentados al inicio del rango. La vista incluye una barra previa de
+        contexto (cruce Tenkan/Kijun de la primera barra) y conserva la serie
+        4H completa.
+        """
+        base = self.base if self.base is not None else self
+        bars = base.df_15m.index.slice_indexer(start, end)
+        first, stop = bars.start or 0, len(base) if bars.stop is None else bars.stop
+        low = max(0, first - 1)
+
+        view = PreparedDataset(base.df_15m.iloc[low:stop], base.df_4h, base.features[low:stop],
+                               cache_path=base.cache_path, validation=base.validation)
+        view._alignment = base.alignment[low:stop]
+        view.base = base
+        view.offset = low
+        view.first_bar = first - low
+        view.date_range = (start, end)
+        return view
+
+    def windows(self, freq="M"):
+        """Vistas consecutivas por periodo de pandas ("M" mensual, "Q" trimestral, "Y" anual)"""
+        base = self.base if self.base is not None else self
+        index = self.df_15m.index[self.first_bar:]
+        for period in index.to_period(freq).unique():
+            yield str(period), base.view(period.start_time, period.end_time)
+
+    def __len__(self):
+        return len(self.df_15m)
+
+    def save(self, directory):
+        """Guarda el dataset; la matriz de features queda en .npy para poder mapearla en memoria"""
+        os.makedirs(directory, exist_ok=True)
+        self.df_15m.to_pickle(os.path.join(directory, "df_15m.pkl"))
+        self.df_4h.to_pickle(os.path.join(directory, "df_4h.pkl"))
+        np.save(os.path.join(directory, "features.npy"), np.ascontiguousarray(self.features))
+        if self.validation is not None:
+            with open(os.path.join(directory, "validation.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.validation, f, indent=2)
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"feature_columns": list(FEATURE_COLUMNS), "bars_15m": len(self.df_15m),
+                       "bars_4h": len(self.df_4h)}, f)
+        self.cache_path = directory
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Carga un dataset guardado. Con mmap_mode='r' la matriz de features se
+        comparte entre todos los procesos que la abren (páginas del SO).
+        """
+        with open(os.path.join(directory, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        if tuple(meta["feature_columns"]) != FEATURE_COLUMNS:
+            raise ValueError(f"Cache de dataset incompatible en {directory}")
+
+        df_15m = pd.read_pickle(os.path.join(directory, "df_15m.pkl"))
+        df_4h = pd.read_pickle(os.path.join(directory, "df_4h.pkl"))
+        features = np.load(os.path.join(directory, "features.npy"), mmap_mode=mmap_mode)
+        validation = None
+        if os.path.exists(os.path.join(directory, "validation.json")):
+            with open(os.path.join(directory, "validation.json"), encoding='utf-8') as f:
+                validation = json.load(f)
+        return cls(df_15m, df_4h, features, cache_path=directory, validation=validation)
+
+def dataset_cache_key(sources=None):
+    """
+    Huella de los CSV de origen y de la configuración de indicadores
+
+    Args:
+        sources: (rutas 15M, rutas 4H); por defecto los dos CSV de DATA_CONFIG
+    """
+    paths_15m, paths_4h = sources or ([DATA_CONFIG["csv_file_path_15m"]], [DATA_CONFIG["csv_file_path_4h"]])
+    digest = hashlib.sha1()
+    # Separador entre timeframes para que la partición de los ficheros forme parte de la huella
+    digest.update(f"{source_files_key(paths_15m)}|{source_files_key(paths_4h)}".encode())
+    indicator_config = {
+        "ichimoku": ICHIMOKU_CONFIG,
+        "volume_sma_periods": FILTERS_CONFIG["volume_sma_periods"],
+        "atr_periods": FILTERS_CONFIG["atr_periods"],
+        "rsi_periods": FILTERS_CONFIG["rsi_periods"],
+        "validation": VALIDATION_CONFIG,
+        "features": FEATURE_COLUMNS
+    }
+    digest.update(json.dumps(indicator_config, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def load_prepared_dataset(engine, use_cache=None):
+    """
+    Devuelve el PreparedDataset del motor (CSV de DATA_CONFIG o años del
+    catálogo), reutilizando la cache binaria si los ficheros de origen y la
+    configuración de indicadores y de validación no han cambiado.
+    """
+    if use_cache is None:
+        use_cache = DATA_CONFIG.get("use_cache", True)
+
+    cache_path = None
+    if use_cache:
+        cache_path = os.path.join(DATA_CONFIG.get("cache_directory", "data/cache/"), dataset_cache_key(engine.data_sources()))
+        if os.path.exists(os.path.join(cache_path, "meta.json")):
+            try:
+                with engine.timed_stage("dataset_cache_load"):
+                    dataset = PreparedDataset.load(cache_path)
+            except Exception as e:
+                engine.events.message(f"⚠️  Cache de dataset no válida ({e}), recalculando...", level="WARNING")
+            else:
+                # El informe de validación se guardó con la cache: no se vuelve a calcular
+                engine.data_validation = dataset.validation
+                engine.report_data_validation()
+                return apply_date_range(dataset)
+
+    df_15m, df_4h = engine.load_data()
+    with engine.timed_stage("features"):
+        dataset = PreparedDataset(df_15m, df_4h, validation=engine.data_validation)
+        dataset.features
+
+    if cache_path:
+        with engine.timed_stage("dataset_cache_save"):
+            dataset.save(cache_path)
+
+    return apply_date_range(dataset)
+
+def apply_date_range(dataset):
+    """Vista del rango DATA_CONFIG["start_date"]/["end_date"] (el dataset tal cual si no hay rango)"""
+    start, end = DATA_CONFIG.get("start_date"), DATA_CONFIG.get("end_date")
+    if start is None and end is None:
+        return dataset
+    return dataset.view(start, end)
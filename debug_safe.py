@@ -1,8 +1,9 @@
 # debug_safe.py - Versión SEGURA sin loops infinitos
 
-import pandas as pd
-from config import DATA_CONFIG
 from cfd_backtest_engine import CFDBacktestEngine
+from data_coverage import analyze_coverage, format_coverage_report
+from dataset import load_prepared_dataset
+from events import SilentSink
 
 def analyze_50_percent_issue():
     """Analiza por qué no hay trades después del 50%"""
@@ -12,29 +13,19 @@ def analyze_50_percent_issue():
     print("="*70)
     
     try:
-        # 1. Verificar cobertura de datos
+        # 1. Verificar cobertura de datos (dataset preparado e índice de alineación del motor)
         print("\n1. VERIFICANDO COBERTURA DE DATOS...")
-        df_15m = pd.read_csv(DATA_CONFIG["csv_file_path_15m"])
-        df_4h = pd.read_csv(DATA_CONFIG["csv_file_path_4h"])
+        engine = CFDBacktestEngine(SilentSink(), render_reports=False)
+        dataset = load_prepared_dataset(engine)
+        coverage = analyze_coverage(dataset.df_15m, dataset.df_4h, dataset.alignment)
+        for line in format_coverage_report(coverage):
+            print(line)
         
-        # Convertir fechas
-        if 'Local time' in df_15m.columns:
-            df_15m['datetime'] = pd.to_datetime(df_15m['Local time'], format='%d.%m.%Y %H:%M:%S.%f GMT%z')
-            df_4h['datetime'] = pd.to_datetime(df_4h['Local time'], format='%d.%m.%Y %H:%M:%S.%f GMT%z')
-        else:
-            df_15m['datetime'] = pd.to_datetime(df_15m['timestamp'])
-            df_4h['datetime'] = pd.to_datetime(df_4h['timestamp'])
-        
-        # Rangos de fecha
-        start_15m, end_15m = df_15m['datetime'].min(), df_15m['datetime'].max()
-        start_4h, end_4h = df_4h['datetime'].min(), df_4h['datetime'].max()
-        
-        print(f"Datos 15M: {len(df_15m)} filas, {start_15m} a {end_15m}")
-        print(f"Datos 4H:  {len(df_4h)} filas, {start_4h} a {end_4h}")
+        end_15m, end_4h = dataset.df_15m.index[-1], dataset.df_4h.index[-1]
         
         # Punto del 50%
-        mid_idx = len(df_15m) // 2
-        date_at_50 = df_15m['datetime'].iloc[mid_idx]
+        mid_idx = len(dataset) // 2
+        date_at_50 = dataset.df_15m.index[mid_idx]
         print(f"\nFecha al 50%: {date_at_50}")
         
         # 2. DIAGNÓSTICO
@@ -43,7 +34,7 @@ def analyze_50_percent_issue():
         problem_found = False
         
         # Verificar si 4H termina antes
-        if end_4h < end_15m:
+        if coverage["after_4h"]:
             missing_days = (end_15m - end_4h).days
             print(f"❌ Datos 4H terminan {missing_days} días antes que 15M")
             
@@ -52,10 +43,9 @@ def analyze_50_percent_issue():
                 print("   ¡ESE ES EL PROBLEMA!")
                 problem_found = True
         
-        # Verificar último trade vs datos
-        last_trade = pd.Timestamp('2021-12-15 15:00')
-        if last_trade > end_4h:
-            print(f"❌ Último trade ({last_trade}) después del fin de datos 4H")
+        # Tramos en los que el sesgo 4H se queda congelado
+        for run in coverage["staleness"]["longest"][:3]:
+            print(f"❌ Sesgo 4H obsoleto de {run['start']} a {run['end']} ({run['bars']} barras)")
             problem_found = True
         
         if not problem_found:
@@ -65,7 +55,7 @@ def analyze_50_percent_issue():
         # 3. SOLUCIONES
         print("\n3. SOLUCIONES RECOMENDADAS:")
         
-        if end_4h < end_15m:
+        if coverage["after_4h"]:
             print("\nOpción A - Recortar datos 15M:")
             print(f"  1. Usar solo datos 15M hasta {end_4h}")
             print("  2. En config.py, puedes filtrar por fecha")
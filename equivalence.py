@@ -0,0 +1,266 @@
+# equivalence.py - Comparación del motor de referencia con un motor alternativo (más rápido)
+
+import os
+import sys
+import json
+import argparse
+import time
+import importlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cfd_backtest_engine import CFDBacktestEngine
+from dataset import load_prepared_dataset, FEATURE_COLUMNS
+from events import SilentSink, json_default
+from synthetic_data import write_synthetic_dataset
+from trade_ledger import TRADE_DTYPE
+from config import *
+
+# Campos del ledger que fijan la entrada: si difieren, la divergencia está en la barra de entrada
+ENTRY_FIELDS = ('entry_time', 'type', 'entry_price', 'position_size', 'entry_bar')
+
+def load_engine_class(spec):
+    """Clase de motor a partir de 'módulo:Clase'"""
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name or "CFDBacktestEngine")
+
+def sample_parameter_sets(count, seed=None, space=None):
+    """
+    Combinaciones aleatorias de configuración en formato de apply_config_overrides
+
+    Args:
+        space: {"SECCION.clave": (mín, máx) o [valores]}; por defecto EQUIVALENCE_CONFIG["parameter_space"]
+    """
+    rng = np.random.default_rng(EQUIVALENCE_CONFIG["seed"] if seed is None else seed)
+    space = space or EQUIVALENCE_CONFIG["parameter_space"]
+    parameter_sets = []
+    for _ in range(count):
+        overrides = {}
+        for name, values in space.items():
+            section, key = name.split(".", 1)
+            if isinstance(values, tuple):
+                value = round(float(rng.uniform(*values)), 4)
+            else:
+                value = values[rng.integers(len(values))]
+            overrides.setdefault(section, {})[key] = value
+        parameter_sets.append(overrides)
+    return parameter_sets
+
+def load_datasets(names=None):
+    """
+    PreparedDataset de cada dataset a comparar
+
+    Returns:
+        Dict {nombre: PreparedDataset}; 'real' son los CSV de DATA_CONFIG y
+        'synthetic' un dataset por cada semilla de EQUIVALENCE_CONFIG
+    """
+    names = names or EQUIVALENCE_CONFIG["datasets"]
+    datasets = {}
+    engine = CFDBacktestEngine(SilentSink(), render_reports=False)
+    if "real" in names:
+        datasets["real"] = load_prepared_dataset(engine)
+    if "synthetic" in names:
+        for seed in EQUIVALENCE_CONFIG["synthetic_seeds"]:
+            path_entry, path_4h = write_synthetic_dataset(EQUIVALENCE_CONFIG["data_directory"], "equivalence",
+                                                          EQUIVALENCE_CONFIG["synthetic_years"], seed=seed)
+            previous = apply_config_overrides({"DATA_CONFIG": {"csv_file_path_15m": path_entry,
+                                                               "csv_file_path_4h": path_4h, "use_catalog": False}})
+            try:
+                datasets[f"synthetic_seed{seed}"] = load_prepared_dataset(engine)
+            finally:
+                apply_config_overrides(previous)
+    return datasets
+
+def run_engine(engine_class, dataset):
+    """Backtest silencioso de un motor sobre un dataset: (resultados, segundos)"""
+    engine = engine_class(SilentSink(), trade_frame=False, render_reports=False)
+    start = time.perf_counter()
+    results = engine.run_backtest(dataset)
+    return results, time.perf_counter() - start
+
+def diff_ledgers(reference, candidate, tolerance=None):
+    """
+    Compara dos TradeLedger campo a campo
+
+    Returns:
+        None si son equivalentes, o dict con el índice del primer trade
+        distinto, los campos que difieren y la barra donde empieza la divergencia
+    """
+    tolerance = EQUIVALENCE_CONFIG["float_tolerance"] if tolerance is None else tolerance
+    ref, cand = reference.records, candidate.records
+    common = min(len(ref), len(cand))
+
+    mismatch = np.zeros(common, dtype=bool)
+    for field in TRADE_DTYPE.names:
+        a, b = ref[field][:common], cand[field][:common]
+        if a.dtype.kind == 'f':
+            mismatch |= ~np.isclose(a, b, rtol=tolerance, atol=0.0, equal_nan=True)
+        else:
+            mismatch |= a != b
+    differing = np.flatnonzero(mismatch)
+    if len(differing) == 0 and len(ref) == len(cand):
+        return None
+
+    index = int(differing[0]) if len(differing) else common
+    trade_ref = ref[index] if index < len(ref) else None
+    trade_cand = cand[index] if index < len(cand) else None
+    fields = {}
+    for field in TRADE_DTYPE.names:
+        a = trade_ref[field].item() if trade_ref is not None else None
+        b = trade_cand[field].item() if trade_cand is not None else None
+        if a is None or b is None or (not np.isclose(a, b, rtol=tolerance, atol=0.0, equal_nan=True)
+                                      if isinstance(a, float) else a != b):
+            if field.endswith("_time"):
+                a, b = (pd.Timestamp(value).isoformat() if value is not None else None for value in (a, b))
+            fields[field] = {"reference": a, "candidate": b}
+
+    # Primera barra observable: la entrada si la entrada difiere (o falta un trade), si no la salida
+    trades = [trade for trade in (trade_ref, trade_cand) if trade is not None]
+    if set(fields) & set(ENTRY_FIELDS) or len(trades) < 2:
+        bar = min(int(trade['entry_bar']) for trade in trades)
+    else:
+        bar = min(int(trade['exit_bar']) for trade in trades)
+    return {"trade_index": index, "reference_trades": len(ref), "candidate_trades": len(cand),
+            "fields": fields, "bar": bar}
+
+def _readable_state(state):
+    """Estado del motor con escalares de Python (el ledger se resume en su número de trades)"""
+    readable = {key: value.item() if hasattr(value, 'item') else value for key, value in state.items()}
+    readable['trades'] = len(state['trades'])
+    return readable
+
+def bar_state(engine_class, dataset, bar):
+    """
+    Estado de un motor justo antes y después de procesar una barra,
+    reproduciendo el backtest barra a barra hasta ella. Requiere que el motor
+    exponga attach_dataset(), process_bar() y get_state(); si no, devuelve None.
+    """
+    engine = engine_class(SilentSink(), trade_frame=False, render_reports=False)
+    if not all(hasattr(engine, method) for method in ("attach_dataset", "process_bar", "get_state")):
+        return None
+    engine.attach_dataset(dataset)
+    df_15m, df_4h = dataset.df_15m, dataset.df_4h
+    for i in range(engine.get_start_index(), bar):
+        engine.process_bar(df_15m, df_4h, i)
+    before = _readable_state(engine.get_state())
+    engine.process_bar(df_15m, df_4h, bar)
+    return {"before": before, "after": _readable_state(engine.get_state())}
+
+def bar_snapshot(dataset, bar):
+    """Datos de la barra: OHLCV, indicadores y fila de la matriz de features"""
+    row = dataset.df_15m.iloc[bar]
+    return {"time": dataset.df_15m.index[bar], **{column: row[column] for column in dataset.df_15m.columns},
+            "features": dict(zip(FEATURE_COLUMNS, dataset.features[bar].tolist()))}
+
+def compare_engines(candidate_class, datasets, parameter_sets, reference_class=CFDBacktestEngine):
+    """
+    Ejecuta los dos motores sobre cada dataset y combinación de parámetros
+
+    Returns:
+        Lista de casos con tiempos, trades y la divergencia (si la hay) con
+        el estado de ambos motores en la primera barra distinta
+    """
+    cases = []
+    for dataset_name, dataset in datasets.items():
+        for set_index, overrides in enumerate(parameter_sets):
+            previous = apply_config_overrides(overrides)
+            try:
+                reference, reference_seconds = run_engine(reference_class, dataset)
+                candidate, candidate_seconds = run_engine(candidate_class, dataset)
+                divergence = diff_ledgers(reference['trade_ledger'], candidate['trade_ledger'])
+                if divergence is None and not np.isclose(reference['final_capital'], candidate['final_capital'],
+                                                         rtol=EQUIVALENCE_CONFIG["float_tolerance"], atol=0.0):
+                    # Mismos trades cerrados pero distinto capital: posición abierta al final de los datos
+                    divergence = {"fields": {"final_capital": {"reference": reference['final_capital'],
+                                                               "candidate": candidate['final_capital']}},
+                                  "bar": len(dataset) - 1}
+                if divergence is not None:
+                    bar = divergence["bar"]
+                    divergence["bar_data"] = bar_snapshot(dataset, bar)
+                    divergence["reference_state"] = bar_state(reference_class, dataset, bar)
+                    divergence["candidate_state"] = bar_state(candidate_class, dataset, bar)
+            finally:
+                apply_config_overrides(previous)
+
+            case = {"dataset": dataset_name, "parameter_set": set_index, "overrides": overrides,
+                    "bars": len(dataset), "reference_trades": reference['total_trades'],
+                    "candidate_trades": candidate['total_trades'], "reference_seconds": reference_seconds,
+                    "candidate_seconds": candidate_seconds,
+                    "speedup": reference_seconds / candidate_seconds if candidate_seconds > 0 else None,
+                    "divergence": divergence}
+            cases.append(case)
+            status = "✅" if divergence is None else f"❌ diverge en la barra {divergence['bar']}"
+            print(f"{status} {dataset_name} #{set_index}: {case['reference_trades']}/{case['candidate_trades']} trades "
+                  f"- referencia {reference_seconds:.2f}s, candidato {candidate_seconds:.2f}s "
+                  f"({case['speedup']:.2f}x)")
+    return cases
+
+def print_divergence(case):
+    divergence = case["divergence"]
+    print(f"\n❌ {case['dataset']} #{case['parameter_set']} - parámetros: {case['overrides']}")
+    if "trade_index" in divergence:
+        print(f"   Primer trade distinto: #{divergence['trade_index']} "
+              f"({divergence['reference_trades']} trades referencia / {divergence['candidate_trades']} candidato)")
+    for field, values in divergence["fields"].items():
+        print(f"   {field:<16} referencia={values['reference']}  candidato={values['candidate']}")
+    print(f"   Barra {divergence['bar']} ({divergence['bar_data']['time']}): "
+          f"close={divergence['bar_data']['close']}")
+    for name in ("reference_state", "candidate_state"):
+        state = divergence[name]
+        if state is None:
+            print(f"   {name}: el motor no expone process_bar/get_state")
+            continue
+        changed = {key: (state['before'][key], state['after'][key])
+                   for key in state['after'] if state['before'].get(key) != state['after'][key]}
+        print(f"   {name} antes: {state['before']}")
+        print(f"   {name} cambios en la barra: {changed}")
+
+def save_report(cases, candidate_spec, filename):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({"created": datetime.now().isoformat(), "candidate_engine": candidate_spec, "cases": cases},
+                  f, indent=2, default=json_default)
+    return filename
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="equivalence.py", description="Equivalencia entre motores de backtest")
+    parser.add_argument("candidate", nargs="?", default=EQUIVALENCE_CONFIG["candidate_engine"],
+                        help="Motor candidato como módulo:Clase")
+    parser.add_argument("--sets", type=int, default=EQUIVALENCE_CONFIG["parameter_sets"],
+                        help="Número de juegos de parámetros")
+    parser.add_argument("--seed", type=int, help="Semilla del muestreo de parámetros")
+    parser.add_argument("--datasets", help="Datasets separados por comas (real,synthetic)")
+    options = parser.parse_args(args)
+    candidate_spec = options.candidate
+    datasets = options.datasets.split(",") if options.datasets else None
+    parameter_sets = sample_parameter_sets(options.sets, options.seed)
+
+    print(f"🔬 Referencia: CFDBacktestEngine - candidato: {candidate_spec}")
+    candidate_class = load_engine_class(candidate_spec)
+    cases = compare_engines(candidate_class, load_datasets(datasets), parameter_sets)
+
+    failed = [case for case in cases if case["divergence"] is not None]
+    for case in failed:
+        print_divergence(case)
+
+    reference_total = sum(case["reference_seconds"] for case in cases)
+    candidate_total = sum(case["candidate_seconds"] for case in cases)
+    if candidate_total > 0:
+        print(f"\n⏱️  Referencia {reference_total:.2f}s - candidato {candidate_total:.2f}s "
+              f"({reference_total / candidate_total:.2f}x)")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = save_report(cases, candidate_spec,
+                           os.path.join(EQUIVALENCE_CONFIG["output_directory"], f"equivalence_{timestamp}.json"))
+    print(f"💾 Informe guardado en: {filename}")
+
+    if failed:
+        print(f"\n❌ {len(failed)}/{len(cases)} casos con divergencias")
+        return 1
+    print(f"\n✅ {len(cases)} casos equivalentes")
+    return 0
+
+if __name__ == "__main__":
+    # Uso: python equivalence.py [módulo:Clase] [--sets=5] [--seed=2024] [--datasets=real,synthetic]
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,187 @@
+# events.py - Sinks de eventos del backtest (trades, filtros, progreso)
+
+import json
+import datetime
+from config import *
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "SILENT": 100}
+
+# Motivos por los que execute_trade_entry descarta una barra (en orden de evaluación)
+REJECTION_REASONS = (
+    "no_4h_bias",            # Sin datos/tendencia de 4H
+    "market_conditions",     # Volumen, ATR o RSI
+    "spread",                # Spread simulado demasiado alto
+    "risk_rules",            # Pérdidas consecutivas, trades/día, cooldown, capital
+    "no_signal",             # Sin cruce Tenkan/Kijun a favor de la tendencia
+    "stop_distance",         # Stop fuera del rango permitido
+    "position_size"          # Tamaño de posición nulo o margen insuficiente
+)
+
+# Códigos por barra (uint8) de results['rejection_codes']: 0 = barra no evaluada
+# (fuera de horario o con posición abierta), 1.. = REJECTION_REASONS, ENTRY_CODE = entrada
+REJECTION_CODES = {reason: code for code, reason in enumerate(REJECTION_REASONS, 1)}
+ENTRY_CODE = len(REJECTION_REASONS) + 1
+
+def merge_rejection_funnels(funnels):
+    """Suma los embudos de varios backtests (combinaciones del optimizador, instrumentos)"""
+    total = {"outside_hours": 0, "in_position": 0, "evaluated": 0,
+             "rejected": dict.fromkeys(REJECTION_REASONS, 0), "entries": 0}
+    for funnel in funnels:
+        for key in ("outside_hours", "in_position", "evaluated", "entries"):
+            total[key] += funnel[key]
+        for reason, count in funnel["rejected"].items():
+            total["rejected"][reason] += count
+    return total
+
+def format_rejection_funnel(funnel):
+    """Líneas de texto del embudo: barras que descarta cada filtro y las que siguen en juego"""
+    lines = [f"Barras fuera de horario: {funnel['outside_hours']} - con posición abierta: {funnel['in_position']}",
+             f"Barras evaluadas: {funnel['evaluated']}"]
+    remaining = funnel["evaluated"]
+    for reason in REJECTION_REASONS:
+        count = funnel["rejected"][reason]
+        remaining -= count
+        share = count / funnel["evaluated"] * 100 if funnel["evaluated"] else 0.0
+        lines.append(f"   {reason:<18} -{count:>8} ({share:5.1f}%)  quedan {remaining}")
+    lines.append(f"Entradas: {funnel['entries']}")
+    return lines
+
+class EventSink:
+    """
+    Interfaz de eventos del motor. Las implementaciones solo sobrescriben lo
+    que consumen; el resto de eventos se descartan sin coste.
+    """
+
+    # El motor solo construye eventos de rechazo si algún sink los consume
+    wants_rejections = False
+
+    def trade_opened(self, event):
+        pass
+
+    def trade_closed(self, event):
+        pass
+
+    def filter_rejected(self, time, reason):
+        pass
+
+    def progress(self, done, total, trades, capital):
+        pass
+
+    def message(self, text, level="INFO"):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+class SilentSink(EventSink):
+    """No emite nada (workers de optimización)"""
+
+class ConsoleSink(EventSink):
+    """Imprime los eventos por consola con el formato clásico del motor"""
+
+    def __init__(self, log_level="INFO", log_trades=True, log_signals=False):
+        self.level = LOG_LEVELS.get(log_level, LOG_LEVELS["INFO"])
+        self.log_trades = log_trades and self.level <= LOG_LEVELS["INFO"]
+        self.wants_rejections = log_signals or self.level <= LOG_LEVELS["DEBUG"]
+
+    def trade_opened(self, event):
+        if not self.log_trades:
+            return
+        print(f"\n{event['type'].upper()} ENTRY - {event['time'].strftime('%Y-%m-%d %H:%M')}")
+        print(f"Price: {event['price']:.1f} → Entry: {event['entry_price']:.1f} (Spread: {event['spread_cost']:.1f})")
+        print(f"Size: {event['position_size']} units (${event['nominal_value']:.2f} exposure)")
+        print(f"Stop Loss: {event['stop_loss']:.1f}")
+        print(f"Margin Required: ${event['required_margin']:.2f}")
+        print(f"Trend Bias: {event['trend_bias']}")
+
+    def trade_closed(self, event):
+        if not self.log_trades:
+            return
+        print(f"{event['type'].upper()} EXIT - {event['time'].strftime('%Y-%m-%d %H:%M')}")
+        print(f"Exit Price: {event['exit_price']:.1f}")
+        print(f"P&L: ${event['profit_loss']:.2f} ({event['risk_multiple']:.1f}R)")
+        print(f"Reason: {event['exit_reason']}")
+        print(f"Duration: {event['hold_time_hours']:.1f}h")
+        print(f"Capital: ${event['capital']:.2f}")
+
+    def filter_rejected(self, time, reason):
+        print(f"   · {time.strftime('%Y-%m-%d %H:%M')} descartada: {reason}")
+
+    def progress(self, done, total, trades, capital):
+        if self.level <= LOG_LEVELS["INFO"]:
+            print(f"Progreso: {(done / total) * 100:.1f}% - Trades: {trades} - Capital: ${capital:.2f}")
+
+    def message(self, text, level="INFO"):
+        if LOG_LEVELS.get(level, LOG_LEVELS["INFO"]) >= self.level:
+            print(text)
+
+class BufferedFileSink(EventSink):
+    """
+    Escribe los eventos como JSON lines en un fichero, acumulándolos en memoria
+    y volcándolos en bloques para no pagar una escritura por evento.
+    """
+
+    def __init__(self, filename, log_level="INFO", log_signals=False, buffer_size=1000):
+        self.filename = filename
+        self.level = LOG_LEVELS.get(log_level, LOG_LEVELS["INFO"])
+        self.wants_rejections = log_signals or self.level <= LOG_LEVELS["DEBUG"]
+        self.buffer_size = buffer_size
+        self._buffer = []
+
+    def _emit(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def trade_opened(self, event):
+        self._emit({"event": "trade_opened", **event})
+
+    def trade_closed(self, event):
+        self._emit({"event": "trade_closed", **event})
+
+    def filter_rejected(self, time, reason):
+        self._emit({"event": "filter_rejected", "time": time, "reason": reason})
+
+    def progress(self, done, total, trades, capital):
+        self._emit({"event": "progress", "done": done, "total": total, "trades": trades, "capital": capital})
+
+    def message(self, text, level="INFO"):
+        if LOG_LEVELS.get(level, LOG_LEVELS["INFO"]) >= self.level:
+            self._emit({"event": "message", "level": level, "text": text})
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write("\n".join(json.dumps(record, default=json_default) for record in self._buffer))
+            f.write("\n")
+        self._buffer = []
+
+def json_default(value):
+    """Serializa timestamps y escalares de numpy en los eventos"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def create_event_sink(log_level=None, log_file=None):
+    """
+    Crea el sink según LOGGING_CONFIG
+
+    Args:
+        log_level: Nivel (DEBUG, INFO, WARNING, ERROR, SILENT); por defecto LOGGING_CONFIG["log_level"]
+        log_file: Fichero JSONL; por defecto LOGGING_CONFIG["log_file"] (None = consola)
+    """
+    log_level = log_level or LOGGING_CONFIG["log_level"]
+    log_file = log_file or LOGGING_CONFIG.get("log_file")
+
+    if log_level == "SILENT":
+        return SilentSink()
+    if log_file:
+        return BufferedFileSink(log_file, log_level, LOGGING_CONFIG["log_signals"],
+                                LOGGING_CONFIG.get("event_buffer_size", 1000))
+    return ConsoleSink(log_level, LOGGING_CONFIG["log_trades"], LOGGING_CONFIG["log_signals"])
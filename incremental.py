@@ -0,0 +1,252 @@
+# incremental.py - Continuación incremental de un backtest cuando se añaden barras a los CSV
+
+import io
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+from cfd_backtest_engine import CFDBacktestEngine
+from data_catalog import read_price_csv, merge_price_frames
+from dataset import PreparedDataset, build_feature_matrix, dataset_cache_key
+from config import *
+
+CHECKPOINT_VERSION = 2
+TIMEFRAMES = ("15M", "4H")
+
+def strategy_fingerprint(instrument):
+    """Huella de la configuración que afecta a las decisiones del backtest"""
+    config = {
+        "instrument": INSTRUMENTS[instrument],
+        "capital": CAPITAL_CONFIG,
+        "risk": RISK_CONFIG,
+        "filters": FILTERS_CONFIG,
+        "ichimoku": ICHIMOKU_CONFIG
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _file_digest(path, size):
+    """sha1 de los primeros size bytes de un fichero"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+def fingerprint_files(paths):
+    """Huella de contenido de los ficheros de origen (para detectar extensiones estrictas)"""
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            f.seek(max(0, stat.st_size - 1))
+            ends_with_newline = f.read(1) == b"\n"
+        fingerprint.append({
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": _file_digest(path, stat.st_size),
+            "ends_with_newline": ends_with_newline
+        })
+    return fingerprint
+
+def appended_parts(fingerprint, paths):
+    """
+    Compara los ficheros actuales con su huella.
+
+    Returns:
+        Lista de (ruta, offset) con el contenido nuevo si los ficheros son una
+        extensión estricta de los anteriores (solo crecen por el final, o se
+        añaden ficheros detrás), o None si algo anterior ha cambiado.
+    """
+    if len(paths) < len(fingerprint):
+        return None
+
+    parts = []
+    for old, path in zip(fingerprint, paths):
+        if os.path.abspath(path) != old["path"]:
+            return None
+        stat = os.stat(path)
+        if stat.st_size == old["size"] and stat.st_mtime_ns == old["mtime_ns"]:
+            continue
+        if stat.st_size < old["size"] or _file_digest(path, old["size"]) != old["sha1"]:
+            return None
+        if stat.st_size > old["size"]:
+            # Sin salto de línea final la primera fila nueva continuaría la última antigua
+            if not old["ends_with_newline"]:
+                return None
+            parts.append((path, old["size"]))
+
+    parts.extend((path, 0) for path in paths[len(fingerprint):])
+    return parts
+
+def read_appended_csv(path, offset):
+    """Lee solo las filas de un CSV a partir de un offset en bytes (más la cabecera)"""
+    if offset == 0:
+        return read_price_csv(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        body = f.read()
+    return read_price_csv(io.BytesIO(header + body))
+
+def extend_indicator_frame(engine, df, new_rows, warmup_bars):
+    """
+    Añade barras nuevas a un DataFrame con indicadores.
+
+    Los indicadores de las barras nuevas se calculan sobre las últimas
+    warmup_bars barras más las nuevas: las ventanas de Ichimoku y de las medias
+    caben en el tramo, y en ATR y RSI (recursivos) el efecto del punto de
+    partida queda por debajo de la precisión de float64.
+
+    Returns:
+        (DataFrame extendido, DataFrame del tramo recalculado)
+    """
+    tail = df[new_rows.columns].iloc[-warmup_bars:]
+    recalculated = engine.calculate_indicators(pd.concat([tail, new_rows]))
+    extended = pd.concat([df, recalculated.iloc[len(tail):]])
+
+    # chikou_span mira hacia delante: las últimas barras antiguas ya tienen valor
+    lookahead = min(ICHIMOKU_CONFIG["kijun_periods"], len(tail))
+    column = extended.columns.get_loc('chikou_span')
+    extended.iloc[len(df) - lookahead:len(df), column] = \
+        recalculated['chikou_span'].iloc[len(tail) - lookahead:len(tail)].to_numpy()
+    return extended, recalculated
+
+class BacktestCheckpoint:
+    """
+    Estado final de un backtest junto a la huella de sus datos: permite
+    continuarlo procesando solo las barras añadidas después.
+    """
+
+    def __init__(self, instrument, strategy, sources, dataset_path, bars, state):
+        self.version = CHECKPOINT_VERSION
+        self.instrument = instrument
+        self.strategy = strategy            # strategy_fingerprint()
+        self.sources = sources              # {timeframe: fingerprint_files()}
+        self.dataset_path = dataset_path    # PreparedDataset con todas las barras procesadas
+        self.bars = bars                    # Barras de 15M procesadas
+        self.state = state                  # engine.get_state()
+
+    @classmethod
+    def from_engine(cls, engine, sources):
+        """Checkpoint del estado de un motor que acaba de terminar su backtest"""
+        dataset = engine.dataset
+        if dataset.cache_path is None:
+            cache_path = os.path.join(DATA_CONFIG.get("cache_directory", "data/cache/"), dataset_cache_key(sources))
+            dataset.save(cache_path)
+        return cls(engine.instrument, strategy_fingerprint(engine.instrument),
+                   {timeframe: fingerprint_files(paths) for timeframe, paths in zip(TIMEFRAMES, sources)},
+                   dataset.cache_path, len(dataset), engine.get_state())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def load(path):
+        """Checkpoint guardado, o None si no existe o es de otra versión"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        return checkpoint if getattr(checkpoint, "version", None) == CHECKPOINT_VERSION else None
+
+def checkpoint_path(instrument):
+    return os.path.join(INCREMENTAL_CONFIG["checkpoint_directory"], f"{instrument}.pkl")
+
+def resume_dataset(engine, checkpoint, sources):
+    """
+    Dataset extendido con las barras nuevas si los datos actuales son una
+    extensión estricta de los del checkpoint.
+
+    Returns:
+        (PreparedDataset, None) o (None, motivo por el que no se puede continuar)
+    """
+    if checkpoint.instrument != engine.instrument:
+        return None, "otro instrumento"
+    if DATA_CONFIG.get("start_date") is not None or DATA_CONFIG.get("end_date") is not None:
+        return None, "hay un rango de fechas configurado"
+    if checkpoint.strategy != strategy_fingerprint(engine.instrument):
+        return None, "la configuración de la estrategia ha cambiado"
+    if not os.path.exists(os.path.join(checkpoint.dataset_path, "meta.json")):
+        return None, "no se encuentra el dataset del checkpoint"
+
+    new_rows = []
+    for timeframe, paths in zip(TIMEFRAMES, sources):
+        parts = appended_parts(checkpoint.sources[timeframe], paths)
+        if parts is None:
+            return None, f"los datos {timeframe} no son una extensión de los anteriores"
+        frames = [read_appended_csv(path, offset) for path, offset in parts]
+        new_rows.append(merge_price_frames(frames) if frames else None)
+
+    dataset = PreparedDataset.load(checkpoint.dataset_path, mmap_mode='r')
+    if len(dataset) != checkpoint.bars:
+        return None, "el dataset del checkpoint no coincide"
+    last_time = dataset.df_15m.index[-1]
+
+    frames = []
+    for df, rows in zip((dataset.df_15m, dataset.df_4h), new_rows):
+        if rows is None or rows.empty:
+            frames.append((df, None))
+            continue
+        if rows.index[0] <= df.index[-1] or not set(rows.columns) <= set(df.columns):
+            return None, "las barras nuevas no continúan las anteriores"
+        frames.append(extend_indicator_frame(engine, df, rows, INCREMENTAL_CONFIG["warmup_bars"]))
+
+    # Una barra 4H nueva con fecha ya procesada habría cambiado el sesgo de barras pasadas
+    (df_15m, recalculated_15m), (df_4h, recalculated_4h) = frames
+    if recalculated_4h is not None and df_4h.index[len(dataset.df_4h)] <= last_time:
+        return None, "hay barras 4H nuevas anteriores a la última barra 15M procesada"
+
+    features = dataset.features
+    if recalculated_15m is not None:
+        new_features = build_feature_matrix(recalculated_15m)[len(recalculated_15m) - (len(df_15m) - len(dataset)):]
+        features = np.concatenate([features, new_features])
+    return PreparedDataset(df_15m, df_4h, features), None
+
+def run_incremental_backtest(engine=None, path=None):
+    """
+    Ejecuta el backtest continuando el último checkpoint si los CSV solo han
+    crecido (coste proporcional a las barras nuevas); si no, hace el backtest
+    completo. En ambos casos guarda el nuevo checkpoint.
+    """
+    engine = engine or CFDBacktestEngine()
+    path = path or checkpoint_path(engine.instrument)
+    sources = engine.data_sources()
+
+    checkpoint = BacktestCheckpoint.load(path)
+    dataset, reason = resume_dataset(engine, checkpoint, sources) if checkpoint else (None, "no hay checkpoint")
+
+    if dataset is None:
+        engine.events.message(f"🔄 Backtest completo ({reason})")
+        results = engine.run_backtest()
+    else:
+        engine.events.message(f"♻️  Continuando backtest desde la barra {checkpoint.bars} "
+                              f"({len(dataset) - checkpoint.bars} barras nuevas)")
+        # Queda también como cache de dataset de los CSV actuales
+        cache_path = os.path.join(DATA_CONFIG.get("cache_directory", "data/cache/"), dataset_cache_key(sources))
+        if os.path.exists(os.path.join(cache_path, "meta.json")):
+            dataset.cache_path = cache_path
+        else:
+            dataset.save(cache_path)
+        engine.restore_state(checkpoint.state)
+        results = engine.run_backtest(dataset, start_index=max(checkpoint.bars, engine.get_start_index(dataset)))
+
+    BacktestCheckpoint.from_engine(engine, sources).save(path)
+    return results
+
+if __name__ == "__main__":
+    import sys
+    if validate_config():
+        run_incremental_backtest(CFDBacktestEngine(instrument=sys.argv[1] if len(sys.argv) > 1 else None))
@@ -4,12 +4,17 @@ import sys
 import os
 from datetime import datetime
 
-# Importar el motor de backtesting
-from cfd_backtest_engine import run_cfd_backtest
-from config import ACTIVE_INSTRUMENT, CAPITAL_CONFIG, print_current_config
+# El motor (pandas, numpy, ...) se importa al ejecutar el backtest, para que
+# --help y --config arranquen sin cargarlo
+from config import ACTIVE_INSTRUMENT, CAPITAL_CONFIG, print_current_config, validate_config
 
-def main():
-    """Función principal"""
+def main(confirm=True):
+    """
+    Función principal
+
+    Args:
+        confirm: Pedir confirmación antes de ejecutar (False = --yes, sin input())
+    """
     print("="*70)
     print("CFD BACKTESTING SYSTEM")
     print("="*70)
@@ -28,13 +33,15 @@ def main():
         print("CONFIRMACIÓN")
         print("="*50)
         
-        confirm = input("\n¿Deseas ejecutar el backtest con esta configuración? (y/n): ").lower().strip()
+        answer = input("\n¿Deseas ejecutar el backtest con esta configuración? (y/n): ").lower().strip() if confirm else 'y'
         
-        if confirm != 'y':
+        if answer != 'y':
             print("❌ Backtest cancelado por el usuario")
             return
         
         print("\n🚀 Iniciando backtest...")
+        from cfd_backtest_engine import run_cfd_backtest
+        from reports import wait_for_reports
         
         # Ejecutar backtest
         results = run_cfd_backtest()
@@ -43,8 +50,9 @@ def main():
             print("❌ Error: El backtest no pudo completarse")
             return
         
-        # Mostrar resumen final
+        # Mostrar resumen final (los reportes se generan mientras tanto en segundo plano)
         print_final_summary(results)
+        wait_for_reports()
         
     except KeyboardInterrupt:
         print("\n\n⚠️  Backtest interrumpido por el usuario")
@@ -90,6 +98,7 @@ def print_final_summary(results):
     print(f"\n⚖️  MÉTRICAS DE RIESGO:")
     print(f"   Profit Factor: {results['profit_factor']:.2f}")
     print(f"   Máximo Drawdown: {results['max_drawdown']:.1f}%")
+    print(f"   Sharpe: {results.get('sharpe_ratio', 0):.2f} | Sortino: {results.get('sortino_ratio', 0):.2f} | Calmar: {results.get('calmar_ratio', 0):.2f}")
     
     # Evaluación del resultado
     print(f"\n🎯 EVALUACIÓN:")
@@ -136,6 +145,8 @@ USO:
     python main.py              # Ejecuta backtest con configuración actual
     python main.py --help       # Muestra esta ayuda
     python main.py --config     # Muestra solo la configuración actual
+    python main.py --yes        # Ejecuta sin pedir confirmación
+    python batch_runner.py jobs.json   # Jobs desatendidos (ver batch_runner.py)
 
 CONFIGURACIÓN:
     Edita el archivo 'config.py' para cambiar:
@@ -175,6 +186,9 @@ if __name__ == "__main__":
             show_help()
         elif sys.argv[1] in ['--config', '-c']:
             print_current_config()
+            validate_config()
+        elif sys.argv[1] in ['--yes', '-y']:
+            main(confirm=False)
         else:
             print(f"Argumento no reconocido: {sys.argv[1]}")
             print("Usa --help para ver las opciones disponibles")
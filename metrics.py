@@ -0,0 +1,104 @@
+# metrics.py - Curva de equity barra a barra (mark-to-market) y métricas de riesgo
+
+import numpy as np
+from config import *
+
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+def _span_sum(n, starts, ends, values):
+    """
+    Suma por barra de valores constantes en tramos [start, end): diferencias
+    en los extremos + cumsum, sin recorrer las barras en Python.
+    """
+    delta = np.zeros(n + 1)
+    np.add.at(delta, starts, values)
+    np.add.at(delta, ends, -values)
+    return np.cumsum(delta[:n])
+
+def build_equity_curve(close, ledger, initial_capital, spread, open_position=None):
+    """
+    Equity por barra: capital inicial + P&L realizado + P&L no realizado de
+    las posiciones abiertas, valoradas al precio de salida (close -/+ spread/2).
+
+    Args:
+        close: Array de cierres de 15M
+        ledger: TradeLedger con entry_bar/exit_bar de cada trade
+        initial_capital: Capital inicial
+        spread: Spread del instrumento en puntos
+        open_position: Posición que sigue abierta en la última barra
+            (dirección, tamaño, precio de entrada, entry_bar), o None; se
+            valora en [entry_bar, n) como las del ledger
+
+    Returns:
+        np.ndarray de equity con una posición por barra
+    """
+    n = len(close)
+    records = ledger.records
+    entry_bar = records['entry_bar']
+    exit_bar = records['exit_bar']
+    direction = records['type'].astype(float)
+    size = records['position_size']
+    entry_price = records['entry_price']
+    if open_position is not None:
+        open_direction, open_size, open_price, open_bar = open_position
+        entry_bar, exit_bar = np.append(entry_bar, open_bar), np.append(exit_bar, n)
+        direction, size = np.append(direction, open_direction), np.append(size, open_size)
+        entry_price = np.append(entry_price, open_price)
+    if len(entry_bar) == 0:
+        return np.full(n, float(initial_capital))
+
+    # Posición viva en [entry_bar, exit_bar); en exit_bar el P&L ya está realizado
+    units = _span_sum(n, entry_bar, exit_bar, direction * size)
+    basis = _span_sum(n, entry_bar, exit_bar, direction * size * entry_price)
+    gross_units = _span_sum(n, entry_bar, exit_bar, size)
+    unrealized = units * close - basis - gross_units * (spread / 2)
+
+    realized = np.zeros(n)
+    np.add.at(realized, records['exit_bar'], records['profit_loss'])
+
+    return initial_capital + np.cumsum(realized) + unrealized
+
+def drawdown_percent(equity):
+    """Drawdown (%) respecto al máximo previo de la curva"""
+    peak = np.maximum.accumulate(equity)
+    return (peak - equity) / peak * 100
+
+def compute_risk_metrics(equity, index):
+    """
+    Sharpe, Sortino, Calmar y drawdown máximo a partir de la equity por barra.
+    Los ratios se anualizan con el número de barras por año observado en el índice.
+
+    Args:
+        equity: Array de equity por barra
+        index: DatetimeIndex de las barras
+    """
+    metrics = {'sharpe_ratio': 0.0, 'sortino_ratio': 0.0, 'calmar_ratio': 0.0, 'max_drawdown': 0.0}
+    if len(equity) < 2:
+        return metrics
+
+    max_drawdown = float(drawdown_percent(equity).max())
+    metrics['max_drawdown'] = max_drawdown
+
+    years = (index[-1] - index[0]).total_seconds() / SECONDS_PER_YEAR
+    if years <= 0:
+        return metrics
+    periods_per_year = (len(equity) - 1) / years
+
+    returns = np.diff(equity) / equity[:-1]
+    mean_return = returns.mean()
+    std_return = returns.std(ddof=1)
+    downside_deviation = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+
+    if std_return > 0:
+        metrics['sharpe_ratio'] = float(mean_return / std_return * np.sqrt(periods_per_year))
+    if downside_deviation > 0:
+        metrics['sortino_ratio'] = float(mean_return / downside_deviation * np.sqrt(periods_per_year))
+
+    if equity[0] > 0 and equity[-1] > 0:
+        cagr = (equity[-1] / equity[0]) ** (1 / years) - 1
+        if max_drawdown > 0:
+            metrics['calmar_ratio'] = float(cagr * 100 / max_drawdown)
+        elif cagr > 0:
+            metrics['calmar_ratio'] = float('inf')
+
+    return metrics
@@ -0,0 +1,151 @@
+# monte_carlo.py - Monte Carlo vectorizado sobre la secuencia de trades del ledger
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from config import *
+
+METHODS = ("bootstrap", "shuffle")
+
+def resample_profits(profit_loss, paths, method, rng):
+    """
+    Matriz (caminos x trades) de P&L remuestreados
+
+    bootstrap: trades elegidos con reemplazo; shuffle: permutaciones del
+    orden original (mismo resultado final, distinto camino)
+    """
+    n = len(profit_loss)
+    if method == "bootstrap":
+        return profit_loss[rng.integers(0, n, size=(paths, n))]
+    if method == "shuffle":
+        return rng.permuted(np.tile(profit_loss, (paths, 1)), axis=1)
+    raise ValueError(f"Método de Monte Carlo desconocido: {method} (disponibles: {', '.join(METHODS)})")
+
+def path_statistics(pnl, initial_capital):
+    """
+    Estadísticas por camino de una matriz de P&L (una fila por camino)
+
+    Returns:
+        Dict de arrays: capital final, drawdown máximo (%) sobre el máximo
+        previo (incluido el capital inicial), capital mínimo y racha de
+        pérdidas más larga (P&L <= 0, como consecutive_losses del motor)
+    """
+    equity = initial_capital + np.cumsum(pnl, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, initial_capital), axis=1)
+    losses = pnl <= 0
+    count = np.cumsum(losses, axis=1, dtype=np.int32)
+    reset = np.maximum.accumulate(np.where(losses, 0, count), axis=1)
+    return {
+        "final_capital": equity[:, -1],
+        "max_drawdown": ((peak - equity) / peak * 100).max(axis=1),
+        "min_capital": np.minimum(equity.min(axis=1), initial_capital),
+        "losing_streak": (count - reset).max(axis=1)
+    }
+
+def simulate_paths(profit_loss, paths=None, method=None, seed=None, initial_capital=None):
+    """
+    Distribuciones por camino de `paths` secuencias remuestreadas
+
+    Los caminos se calculan por bloques de MONTE_CARLO_CONFIG["chunk_cells"]
+    celdas (caminos x trades) para acotar la memoria.
+    """
+    paths = paths or MONTE_CARLO_CONFIG["paths"]
+    method = method or MONTE_CARLO_CONFIG["method"]
+    seed = MONTE_CARLO_CONFIG["seed"] if seed is None else seed
+    initial_capital = CAPITAL_CONFIG["initial_capital"] if initial_capital is None else initial_capital
+    profit_loss = np.asarray(profit_loss, dtype=float)
+
+    rng = np.random.default_rng(seed)
+    block = max(1, MONTE_CARLO_CONFIG["chunk_cells"] // len(profit_loss))
+    parts = [path_statistics(resample_profits(profit_loss, min(block, paths - start), method, rng), initial_capital)
+             for start in range(0, paths, block)]
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+def _percentiles(values, percentiles):
+    points = np.percentile(values, percentiles)
+    return {"mean": float(values.mean()), **{f"p{p}": float(v) for p, v in zip(percentiles, points)}}
+
+def run_monte_carlo(trades, paths=None, method=None, seed=None):
+    """
+    Monte Carlo de la secuencia de trades de un backtest
+
+    Args:
+        trades: TradeLedger o array de profit_loss en orden de cierre
+        paths, method, seed: Por defecto los de MONTE_CARLO_CONFIG
+
+    Returns:
+        Dict serializable con percentiles de capital final, drawdown máximo y
+        racha de pérdidas, riesgo de ruina (capital por debajo de
+        min_capital_required en algún momento) y probabilidad de alcanzar
+        max_consecutive_losses; o None si no hay trades
+    """
+    profit_loss = trades.column('profit_loss') if hasattr(trades, 'column') else np.asarray(trades, dtype=float)
+    if len(profit_loss) == 0:
+        return None
+    paths = paths or MONTE_CARLO_CONFIG["paths"]
+    method = method or MONTE_CARLO_CONFIG["method"]
+    initial_capital = CAPITAL_CONFIG["initial_capital"]
+    percentiles = MONTE_CARLO_CONFIG["percentiles"]
+
+    distributions = simulate_paths(profit_loss, paths, method, seed, initial_capital)
+    original = path_statistics(profit_loss[np.newaxis, :], initial_capital)
+    streak_limit = RISK_CONFIG["max_consecutive_losses"]
+    return {
+        "paths": paths,
+        "method": method,
+        "trades": len(profit_loss),
+        "final_capital": _percentiles(distributions["final_capital"], percentiles),
+        "max_drawdown": _percentiles(distributions["max_drawdown"], percentiles),
+        "losing_streak": _percentiles(distributions["losing_streak"], percentiles),
+        "probability_of_loss": float(np.mean(distributions["final_capital"] < initial_capital)),
+        "risk_of_ruin": float(np.mean(distributions["min_capital"] < CAPITAL_CONFIG["min_capital_required"])),
+        "streak_limit": streak_limit,
+        "streak_limit_probability": float(np.mean(distributions["losing_streak"] >= streak_limit)),
+        "original": {key: float(values[0]) for key, values in original.items()}
+    }
+
+def format_monte_carlo_report(report):
+    """Líneas de texto del resumen de Monte Carlo"""
+    low, high = f"p{min(MONTE_CARLO_CONFIG['percentiles'])}", f"p{max(MONTE_CARLO_CONFIG['percentiles'])}"
+    original = report["original"]
+    lines = [f"\n🎲 MONTE CARLO ({report['paths']} caminos {report['method']} de {report['trades']} trades)"]
+    for key, label, unit in (("final_capital", "Capital final", "$"), ("max_drawdown", "Drawdown máximo", "%"),
+                             ("losing_streak", "Racha de pérdidas", "")):
+        stats = report[key]
+        value = lambda v: f"${v:,.2f}" if unit == "$" else f"{v:.1f}{unit}"
+        lines.append(f"   {label}: mediana {value(stats['p50'])} [{low} {value(stats[low])} - {high} {value(stats[high])}]"
+                     f" - secuencia real {value(original[key])}")
+    lines.append(f"   Probabilidad de pérdida: {report['probability_of_loss'] * 100:.1f}%")
+    lines.append(f"   Riesgo de ruina (capital < ${CAPITAL_CONFIG['min_capital_required']}): "
+                 f"{report['risk_of_ruin'] * 100:.2f}%")
+    lines.append(f"   Racha >= max_consecutive_losses ({report['streak_limit']}): "
+                 f"{report['streak_limit_probability'] * 100:.1f}%")
+    return lines
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="monte_carlo.py", description="Monte Carlo sobre la secuencia de trades")
+    parser.add_argument("trades", nargs="?", help="CSV de trades (columna profit_loss); sin él se ejecuta el backtest")
+    parser.add_argument("--paths", type=int, help="Número de caminos simulados")
+    parser.add_argument("--method", choices=("bootstrap", "shuffle"), help="Remuestreo de los trades")
+    parser.add_argument("--seed", type=int, help="Semilla del generador")
+    options = parser.parse_args(args)
+    if options.trades:
+        # CSV de trades guardado por los reportes (columna profit_loss)
+        trades = pd.read_csv(options.trades)['profit_loss'].to_numpy(dtype=float)
+    else:
+        from cfd_backtest_engine import CFDBacktestEngine
+        from events import SilentSink
+        trades = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False).run_backtest()['trade_ledger']
+
+    report = run_monte_carlo(trades, options.paths or None, options.method, options.seed)
+    if report is None:
+        print("❌ No hay trades para el Monte Carlo")
+        return 1
+    for line in format_monte_carlo_report(report):
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    # Uso: python monte_carlo.py [trades.csv] [--paths=10000] [--method=bootstrap|shuffle] [--seed=42]
+    sys.exit(main(sys.argv[1:]))
@@ -3,36 +3,75 @@
 import pandas as pd
 import numpy as np
 import itertools
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import os
 
 from cfd_backtest_engine import CFDBacktestEngine
+from dataset import PreparedDataset, load_prepared_dataset, apply_date_range, VOLUME_RATIO, ATR_RATIO
+from threshold_index import ThresholdIndex, pass_count_curves
+from events import create_event_sink, merge_rejection_funnels, format_rejection_funnel, REJECTION_REASONS
+from profiling import summarize_worker_memory, format_worker_memory
+from parameter_stability import analyze_parameter_stability, format_stability_report
+from metrics import build_equity_curve
+from reports import ReportJob, get_report_renderer
 from config import print_current_config, validate_config
 from config import *
 
+# Dataset compartido por cada proceso worker (matriz de features mapeada en memoria)
+_worker_dataset = None
+
+def _init_sweep_worker(dataset_path, config_snapshot):
+    """Inicializa un proceso worker: configuración del proceso padre + dataset compartido"""
+    global _worker_dataset
+    apply_config_overrides(config_snapshot)
+    _worker_dataset = apply_date_range(PreparedDataset.load(dataset_path, mmap_mode='r'))
+
+def _run_sweep_combination(params):
+    """Ejecuta el backtest de una combinación dentro de un proceso worker"""
+    CFDOptimizer._update_config_temporarily(params)
+    engine = CFDBacktestEngine(create_event_sink(LOGGING_CONFIG["optimizer_log_level"]),
+                               trade_frame=False, render_reports=False)
+    return engine.run_backtest(_worker_dataset)
+
 class CFDOptimizer:
     def __init__(self):
         """Inicializa el optimizador"""
         self.results = []
         self.best_result = None
-
-    def run_optimization(self, parameter_ranges=None, optimization_metric="profit_factor"):
+        self.result_cache = {}          # huella de la combinación -> resultados
+        self.reused_runs = 0
+        self.skipped_runs = 0
+        self.rejection_funnel = None    # Embudo de entradas sumado sobre las combinaciones simuladas
+        self.memory_summary = None      # Pico de RSS por worker y memoria por etapa (profiling)
+        self.parameter_axes = {}        # Ejes del grid de la última optimización {parámetro: valores}
+        self.stability = None           # Mapa de estabilidad por combinación (parameter_stability)
+        self.events = create_event_sink()
+
+    def run_optimization(self, parameter_ranges=None, optimization_metric="profit_factor", confirm=True):
         """
         Ejecuta optimización de parámetros
 
         Args:
             parameter_ranges: Dict con rangos de parámetros a optimizar
             optimization_metric: Métrica a optimizar ('profit_factor', 'sharpe_ratio', 'win_rate', 'total_profit')
+            confirm: Pedir confirmación por input() antes de empezar
         """
         print("="*70)
         print("CFD PARAMETER OPTIMIZATION")
         print("="*70)
 
+        if not validate_config():
+            return None
+
         # Usar rangos por defecto si no se especifican
         if parameter_ranges is None:
             parameter_ranges = OPTIMIZATION_CONFIG["parameter_ranges"]
 
         # Generar combinaciones de parámetros
+        self.parameter_axes = self._parameter_values(parameter_ranges)
         param_combinations = self._generate_parameter_combinations(parameter_ranges)
         total_combinations = len(param_combinations)
 
@@ -42,25 +81,72 @@ class CFDOptimizer:
         print(f"Mínimo trades requeridos: {OPTIMIZATION_CONFIG['min_trades_for_valid_result']}")
 
         # Confirmar ejecución
-        confirm = input(f"\n¿Continuar con la optimización? (y/n): ").lower().strip()
-        if confirm != 'y':
+        answer = input(f"\n¿Continuar con la optimización? (y/n): ").lower().strip() if confirm else 'y'
+        if answer != 'y':
             print("❌ Optimización cancelada")
             return None
 
         print("\n🚀 Iniciando optimización...")
         start_time = datetime.now()
 
+        # Cargar datos, indicadores y features una sola vez para todas las combinaciones
+        data_engine = CFDBacktestEngine()
+        dataset = load_prepared_dataset(data_engine)
+        static_mask = data_engine.compute_static_entry_mask(dataset)
+
+        # Cota de entradas posibles por combinación (índice ordenado de umbrales)
+        threshold_index = ThresholdIndex(dataset.features, static_mask)
+        self._print_pass_counts(threshold_index, param_combinations)
+        min_trades = OPTIMIZATION_CONFIG['min_trades_for_valid_result']
+
+        # Huellas de todas las combinaciones factibles (sin simular)
+        fingerprints, max_entries = self._plan_combinations(
+            data_engine, dataset, static_mask, threshold_index, param_combinations, min_trades
+        )
+
+        # En paralelo: lanzar cada huella distinta una sola vez en el pool de workers
+        pending = {}
+        executor = None
+        temporary = None
+        max_workers = OPTIMIZATION_CONFIG.get("max_workers") or os.cpu_count() or 1
+        if max_workers > 1:
+            pending, executor, temporary = self._submit_parallel_runs(dataset, param_combinations, fingerprints,
+                                                                      max_workers)
+
         # Ejecutar optimización
+        simulated = []
         for i, params in enumerate(param_combinations):
             try:
-                print(f"\n[{i+1}/{total_combinations}] Probando: {params}")
-
-                # Actualizar configuración temporal
-                self._update_config_temporarily(params)
-
-                # Ejecutar backtest
-                engine = CFDBacktestEngine()
-                results = engine.run_backtest()
+                self.events.message(f"\n[{i+1}/{total_combinations}] Probando: {params}")
+
+                # Descartar sin simular si ni siquiera hay barras candidatas suficientes
+                fingerprint = fingerprints[i]
+                if fingerprint is None:
+                    self.skipped_runs += 1
+                    self.events.message(f"⏭️  Descartada sin simular: máximo {max_entries[i]} entradas posibles (< {min_trades})")
+                    continue
+
+                # Reutilizar resultados si el conjunto efectivo de entradas ya se simuló
+                if fingerprint in self.result_cache:
+                    self.reused_runs += 1
+                    results = dict(self.result_cache[fingerprint])
+                    # El embudo depende de los umbrales, no solo de las entradas efectivas,
+                    # y los tiempos y la memoria son los de otra ejecución
+                    results['rejections'] = None
+                    results['timings'] = None
+                    self.events.message(f"♻️  Mismo conjunto de entradas que una combinación previa - resultado reutilizado")
+                else:
+                    if fingerprint in pending:
+                        results = pending.pop(fingerprint).result()
+                    else:
+                        # Actualizar configuración temporal y ejecutar backtest
+                        self._update_config_temporarily(params)
+                        engine = CFDBacktestEngine(create_event_sink(LOGGING_CONFIG["optimizer_log_level"]),
+                               trade_frame=False, render_reports=False)
+                        results = engine.run_backtest(dataset)
+                    if results is not None:
+                        self.result_cache[fingerprint] = dict(results)
+                        simulated.append(results)
 
                 # Validar que results no es None y tiene las claves necesarias
                 if results is not None and 'total_trades' in results and 'win_rate' in results:
@@ -74,45 +160,65 @@ class CFDOptimizer:
                         # Verificar que la métrica existe en results
                         if optimization_metric in results:
                             metric_value = results[optimization_metric]
-                            print(f"✅ Válido - Trades: {results['total_trades']}, "
-                                  f"{optimization_metric}: {metric_value:.2f}")
+                            self.events.message(f"✅ Válido - Trades: {results['total_trades']}, "
+                                                f"{optimization_metric}: {metric_value:.2f}")
                         else:
-                            print(f"⚠️ Métrica {optimization_metric} no encontrada en resultados")
+                            self.events.message(f"⚠️ Métrica {optimization_metric} no encontrada en resultados")
                     else:
-                        print(f"❌ Insuficientes trades: {results['total_trades']}")
+                        self.events.message(f"❌ Insuficientes trades: {results['total_trades']}")
                 else:
-                    print(f"❌ Error: Resultados inválidos o None")
+                    self.events.message(f"❌ Error: Resultados inválidos o None")
 
                 # Mostrar progreso
                 elapsed = datetime.now() - start_time
                 avg_time = elapsed / (i + 1)
                 eta = avg_time * (total_combinations - i - 1)
-                print(f"   Progreso: {((i+1)/total_combinations)*100:.1f}% - ETA: {eta}")
+                self.events.message(f"   Progreso: {((i+1)/total_combinations)*100:.1f}% - ETA: {eta}")
 
             except Exception as e:
-                print(f"❌ Error en combinación {i+1}: {e}")
+                self.events.message(f"❌ Error en combinación {i+1}: {e}", level="ERROR")
                 continue
 
+        if executor is not None:
+            executor.shutdown()
+        if temporary is not None:
+            # Copia del dataset que mapeaban los workers (sin cache)
+            temporary.cleanup()
+        self.events.flush()
+
         # Analizar resultados
         total_time = datetime.now() - start_time
         print(f"\n✅ Optimización completada en {total_time}")
         print(f"Combinaciones válidas: {len(self.results)}/{total_combinations}")
+        print(f"Combinaciones reutilizadas (sin simular): {self.reused_runs}/{total_combinations}")
+        print(f"Combinaciones descartadas por insuficientes entradas: {self.skipped_runs}/{total_combinations}")
+
+        if simulated:
+            self.rejection_funnel = merge_rejection_funnels(results['rejections'] for results in simulated)
+            print(f"\n🔎 EMBUDO DE ENTRADAS ({len(simulated)} combinaciones simuladas)")
+            for line in format_rejection_funnel(self.rejection_funnel):
+                print(line)
+
+            self.memory_summary = summarize_worker_memory(results.get('timings') for results in simulated)
+            print(f"\n🧠 MEMORIA")
+            for line in format_worker_memory(self.memory_summary):
+                print(line)
 
         if self.results:
             self._analyze_results(optimization_metric)
             self._save_optimization_results()
+            self._render_top_reports(data_engine, dataset, optimization_metric)
             return self.best_result
         else:
             print("❌ No se obtuvieron resultados válidos")
             return None
 
-    def _generate_parameter_combinations(self, parameter_ranges):
-        """Genera todas las combinaciones de parámetros"""
-        param_names = list(parameter_ranges.keys())
-        param_values = []
+    @staticmethod
+    def _parameter_values(parameter_ranges):
+        """Valores a probar de cada parámetro {parámetro: valores}"""
+        param_values = {}
 
-        for param_name in param_names:
-            range_config = parameter_ranges[param_name]
+        for param_name, range_config in parameter_ranges.items():
             if len(range_config) == 3:  # (min, max, step)
                 values = np.arange(range_config[0], range_config[1] + range_config[2], range_config[2])
                 # Redondear para evitar problemas de float
@@ -120,10 +226,18 @@ class CFDOptimizer:
             else:  # Lista de valores específicos
                 values = range_config
 
-            param_values.append(values)
+            param_values[param_name] = values
+
+        return param_values
+
+    @staticmethod
+    def _generate_parameter_combinations(parameter_ranges):
+        """Genera todas las combinaciones de parámetros"""
+        param_values = CFDOptimizer._parameter_values(parameter_ranges)
+        param_names = list(param_values)
 
         # Generar todas las combinaciones
-        combinations = list(itertools.product(*param_values))
+        combinations = list(itertools.product(*param_values.values()))
 
         # Convertir a lista de diccionarios
         param_combinations = []
@@ -133,7 +247,89 @@ class CFDOptimizer:
 
         return param_combinations
 
-    def _update_config_temporarily(self, params):
+    def _submit_parallel_runs(self, dataset, param_combinations, fingerprints, max_workers):
+        """
+        Envía al pool de procesos una simulación por cada huella distinta
+
+        Returns:
+            (futures por huella, executor, TemporaryDirectory con la copia del
+            dataset o None si los workers mapean la cache; se borra tras el shutdown)
+        """
+        # Los workers mapean el historial completo y aplican el mismo rango de fechas
+        full = dataset.base if dataset.base is not None else dataset
+        dataset_path = full.cache_path
+        temporary = None
+        if dataset_path is None:
+            # Sin cache: volcar el dataset a disco para que los workers lo mapeen
+            temporary = tempfile.TemporaryDirectory(prefix="cfd_dataset_")
+            dataset_path = temporary.name
+            full.save(dataset_path)
+            full.cache_path = None      # La copia temporal no es la cache del dataset
+
+        print(f"⚙️  Ejecutando en paralelo con {max_workers} workers")
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_sweep_worker,
+            initargs=(dataset_path, snapshot_config())
+        )
+        pending = {}
+        for params, fingerprint in zip(param_combinations, fingerprints):
+            if fingerprint is not None and fingerprint not in pending:
+                pending[fingerprint] = executor.submit(_run_sweep_combination, params)
+        return pending, executor, temporary
+
+    def _print_pass_counts(self, threshold_index, param_combinations):
+        """Muestra cuántas barras candidatas pasan cada umbral del grid"""
+        thresholds_by_column = {}
+        for column, param in [(VOLUME_RATIO, 'volume_threshold'), (ATR_RATIO, 'atr_threshold')]:
+            values = sorted({params[param] for params in param_combinations if param in params})
+            if values:
+                thresholds_by_column[column] = values
+        if not thresholds_by_column:
+            return
+
+        curves = pass_count_curves(threshold_index, thresholds_by_column)
+        print(f"\n📉 Barras candidatas que pasan cada umbral:")
+        for feature, curve in curves.groupby('feature', sort=False):
+            counts = ", ".join(f"{row.threshold:g}→{row.bars_passing}" for row in curve.itertuples())
+            print(f"   {feature}: {counts}")
+
+    @staticmethod
+    def _plan_combinations(engine, dataset, static_mask, threshold_index, param_combinations, min_trades):
+        """
+        Huella y cota de entradas de cada combinación, sin simular.
+
+        Returns:
+            (huellas, máximo de entradas); la huella es None si la combinación
+            no puede alcanzar min_trades
+        """
+        fingerprints = []
+        max_entries = []
+        for params in param_combinations:
+            CFDOptimizer._update_config_temporarily(params)
+            max_entries.append(threshold_index.max_entries_for_config())
+            if max_entries[-1] < min_trades:
+                fingerprints.append(None)   # No puede alcanzar el mínimo de trades
+            else:
+                fingerprints.append(CFDOptimizer._combination_fingerprint(engine, dataset, static_mask))
+        return fingerprints, max_entries
+
+    @staticmethod
+    def _combination_fingerprint(engine, dataset, static_mask):
+        """
+        Huella de las entradas efectivas de la combinación actual: hash de la
+        máscara de barras candidatas a entrada más los parámetros que afectan
+        a la gestión de la posición y a las salidas. Dos combinaciones con la
+        misma huella producen exactamente los mismos trades.
+        """
+        entry_mask = engine.compute_entry_candidate_mask(dataset, static_mask)
+        digest = hashlib.sha1(np.packbits(entry_mask).tobytes())
+        digest.update(repr(sorted(RISK_CONFIG.items())).encode())
+        digest.update(repr(sorted(CAPITAL_CONFIG.items())).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _update_config_temporarily(params):
         """Actualiza temporalmente la configuración con los parámetros dados"""
         global FILTERS_CONFIG, RISK_CONFIG
 
@@ -161,7 +357,7 @@ class CFDOptimizer:
         # Verificar que la métrica existe en los resultados
         if optimization_metric not in df_results.columns:
             print(f"❌ Error: Métrica '{optimization_metric}' no encontrada en resultados")
-            available_metrics = [col for col in df_results.columns if col in ['profit_factor', 'win_rate', 'total_profit']]
+            available_metrics = [col for col in df_results.columns if col in ['profit_factor', 'sharpe_ratio', 'win_rate', 'total_profit']]
             print(f"Métricas disponibles: {available_metrics}")
             if available_metrics:
                 optimization_metric = available_metrics[0]
@@ -189,6 +385,7 @@ class CFDOptimizer:
                 print(f"   Win rate: {row.get('win_rate', 0):.1f}%")
                 print(f"   Total profit: ${row.get('total_profit', 0):.2f}")
                 print(f"   Max drawdown: {row.get('max_drawdown', 0):.1f}%")
+                print(f"   Sharpe: {row.get('sharpe_ratio', 0):.2f}")
 
                 # Mostrar parámetros
                 param_str = []
@@ -211,6 +408,7 @@ class CFDOptimizer:
 
             # Análisis de sensibilidad
             self._sensitivity_analysis(df_results)
+            self._stability_analysis(df_results, optimization_metric)
 
         return df_results
 
@@ -267,6 +465,42 @@ class CFDOptimizer:
 
         return
 
+    def _stability_analysis(self, df_results, optimization_metric):
+        """Mapa de estabilidad: media y dispersión de la métrica en la vecindad de cada combinación"""
+        axes = {parameter: values for parameter, values in self.parameter_axes.items()
+                if parameter in df_results.columns}
+        parameters = list(axes)
+        if not parameters:
+            return
+        stability = analyze_parameter_stability(df_results, axes, optimization_metric)
+        self.stability = stability.set_index(df_results['combination_id'])
+        for line in format_stability_report(df_results, stability, parameters, optimization_metric,
+                                            STABILITY_CONFIG["top_n"]):
+            print(line)
+
+    def _render_top_reports(self, engine, dataset, optimization_metric):
+        """
+        Genera los reportes (CSV + gráfica) solo de las REPORT_CONFIG["optimizer_top_n"]
+        mejores combinaciones, a partir de los ledgers ya calculados (sin volver a simular).
+        """
+        top_n = REPORT_CONFIG["optimizer_top_n"]
+        if not top_n or not (REPORT_CONFIG["save_detailed_report"] or REPORT_CONFIG["save_equity_curve"]):
+            return
+        if optimization_metric not in self.results[0]:
+            optimization_metric = "profit_factor"
+
+        ranked = sorted(self.results, key=lambda result: result[optimization_metric], reverse=True)[:top_n]
+        start = engine.get_start_index(dataset)
+        close = dataset.df_15m['close'].to_numpy(dtype=float)
+        renderer = get_report_renderer()
+        print(f"\n📊 Generando reportes de las {len(ranked)} mejores combinaciones...")
+        for result in ranked:
+            equity = build_equity_curve(close, result['trade_ledger'], CAPITAL_CONFIG["initial_capital"],
+                                        engine.instrument_config["spread"], result.get('open_position'))[start:]
+            equity_curve = pd.Series(equity, index=dataset.df_15m.index[start:], name='equity')
+            renderer.submit(ReportJob(result['trade_ledger'], equity_curve, label=f"comb{result['combination_id']}"))
+        renderer.wait()
+
     def _save_optimization_results(self):
         """Guarda los resultados de optimización"""
         # Crear directorio si no existe
@@ -276,7 +510,21 @@ class CFDOptimizer:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{LOGGING_CONFIG['output_directory']}optimization_{ACTIVE_INSTRUMENT}_{timestamp}.csv"
 
-        df_results = pd.DataFrame(self.results)
+        df_results = pd.DataFrame(self.results).drop(
+            columns=['df_trades', 'trade_ledger', 'open_position', 'equity_curve', 'timings', 'rejections', 'rejection_codes'],
+            errors='ignore')
+        # Pico de RSS del worker hasta esta combinación (acumulado, no de la combinación) y
+        # crecimiento del RSS durante la combinación
+        df_results['worker_peak_rss_mb'] = [result['timings']['peak_rss_mb'] if result.get('timings') else None
+                                            for result in self.results]
+        df_results['rss_delta_mb'] = [result['timings'].get('rss_delta_mb') if result.get('timings') else None
+                                      for result in self.results]
+        # Una columna por motivo de descarte (vacía en las combinaciones reutilizadas)
+        for reason in REJECTION_REASONS:
+            df_results[f"rejected_{reason}"] = [result['rejections']['rejected'][reason] if result.get('rejections') else None
+                                                for result in self.results]
+        if self.stability is not None:
+            df_results = df_results.join(self.stability, on='combination_id')
         df_results.to_csv(filename, index=False)
 
         print(f"\n💾 Resultados de optimización guardados en: {filename}")
@@ -0,0 +1,437 @@
+# paper_trading.py - Paper trading en vivo de la estrategia sobre un feed local de barras
+
+import io
+import os
+import csv
+import json
+import time
+import socket
+import bisect
+import numpy as np
+import pandas as pd
+
+from cfd_backtest_engine import CFDBacktestEngine
+from data_catalog import read_price_csv
+from dataset import (FEATURE_COLUMNS, SPREAD_ATR_WINDOW, VOLUME_RATIO, ATR_RATIO, ATR_MULTIPLIER,
+                     RSI, STOP_DISTANCE_LONG, STOP_DISTANCE_SHORT)
+from metrics import build_equity_curve
+from config import *
+
+LOCAL_TIME_FORMAT = '%d.%m.%Y %H:%M:%S.%f GMT%z'
+
+class IncrementalIndicators:
+    """
+    Indicadores de calculate_indicators y fila de features de
+    build_feature_matrix, actualizados barra a barra con coste O(ventana).
+
+    Sigue las mismas fórmulas que ta/pandas: ventanas de máximos y mínimos de
+    Ichimoku, ATR de Wilder (media de los primeros TR y recursión), RSI con
+    medias exponenciales adjust=False y los mismos rellenos de NaN.
+    """
+
+    def __init__(self, keep_rows=False):
+        """
+        Args:
+            keep_rows: Conservar las filas de todas las barras (necesario para
+                buscar por fecha con frame_until); si no, solo las últimas
+        """
+        self.keep_rows = keep_rows
+        self.tenkan_periods = ICHIMOKU_CONFIG["tenkan_periods"]
+        self.kijun_periods = ICHIMOKU_CONFIG["kijun_periods"]
+        self.senkou_periods = ICHIMOKU_CONFIG["senkou_periods"]
+        self.atr_periods = FILTERS_CONFIG["atr_periods"]
+        self.volume_periods = FILTERS_CONFIG["volume_sma_periods"]
+        self.rsi_alpha = 1 / FILTERS_CONFIG["rsi_periods"]
+        self.rsi_periods = FILTERS_CONFIG["rsi_periods"]
+        self.window = max(self.senkou_periods, self.volume_periods, self.atr_periods, SPREAD_ATR_WINDOW) + 1
+
+        self.count = 0
+        self.times = []
+        self.closes = []
+        self.rows = []          # Filas de indicadores (solo se conservan las últimas)
+        self.features = []      # Filas de features (solo se conservan las últimas)
+        self._highs = []
+        self._lows = []
+        self._volumes = []
+        self._atrs = []
+        self._true_ranges = []
+        self._previous_close = None
+        self._ema_up = 0.0
+        self._ema_down = 0.0
+
+    def _trim(self, values):
+        if len(values) > 2 * self.window:
+            del values[:-self.window]
+
+    def _midpoint(self, periods):
+        if self.count < periods:
+            return float('nan')
+        return 0.5 * (max(self._highs[-periods:]) + min(self._lows[-periods:]))
+
+    def update(self, time, open, high, low, close, volume):
+        """Añade una barra cerrada y calcula sus indicadores y features"""
+        volume = 0.0 if volume != volume else max(float(volume), 0.0)
+        previous_close = self._previous_close
+        self.count += 1
+        self.times.append(time)
+        self.closes.append(close)
+        self._highs.append(high)
+        self._lows.append(low)
+        self._volumes.append(volume)
+
+        # Ichimoku
+        tenkan = self._midpoint(self.tenkan_periods)
+        kijun = self._midpoint(self.kijun_periods)
+        span_a = 0.5 * (tenkan + kijun)
+        span_b = self._midpoint(self.senkou_periods)
+
+        # ATR de Wilder: 0 hasta tener atr_periods barras, luego media y recursión
+        if previous_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - previous_close), abs(low - previous_close))
+        atr_previous = self._atrs[-1] if self._atrs else None
+        if self.count < self.atr_periods:
+            self._true_ranges.append(true_range)
+            atr = 0.0
+        elif self.count == self.atr_periods:
+            self._true_ranges.append(true_range)
+            atr = np.asarray(self._true_ranges).sum() / self.atr_periods
+        else:
+            atr = (atr_previous * (self.atr_periods - 1) + true_range) / float(self.atr_periods)
+
+        # Media de volumen (mientras no hay ventana completa se usa el volumen)
+        if self.count >= self.volume_periods:
+            volume_sma = np.asarray(self._volumes[-self.volume_periods:]).sum() / self.volume_periods
+        else:
+            volume_sma = volume
+
+        # RSI con medias exponenciales adjust=False (50 hasta tener rsi_periods barras)
+        diff = close - previous_close if previous_close is not None else 0.0
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else 0.0
+        if previous_close is None:
+            self._ema_up, self._ema_down = up, down
+        else:
+            self._ema_up = (1 - self.rsi_alpha) * self._ema_up + self.rsi_alpha * up
+            self._ema_down = (1 - self.rsi_alpha) * self._ema_down + self.rsi_alpha * down
+        if self.count < self.rsi_periods:
+            rsi = 50.0
+        elif self._ema_down == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + self._ema_up / self._ema_down))
+
+        # Features (mismas protecciones que build_feature_matrix)
+        atr_window = self._atrs[-SPREAD_ATR_WINDOW:]
+        atr_avg = np.asarray(atr_window).sum() / len(atr_window) if atr_window else float('nan')
+        features = np.empty(len(FEATURE_COLUMNS), dtype=np.float32)
+        features[VOLUME_RATIO] = volume / volume_sma if volume_sma > 0 else 1.0
+        atr_reference = atr if atr_previous is None else atr_previous
+        features[ATR_RATIO] = atr / atr_reference if atr_reference > 0 else 1.0
+        features[ATR_MULTIPLIER] = max(atr / atr_avg, 1.0) if atr_avg > 0 else 1.0
+        features[RSI] = rsi
+        stop_long = span_b if span_b < span_a else span_a
+        stop_short = span_b if span_b > span_a else span_a
+        features[STOP_DISTANCE_LONG] = abs(close - stop_long)
+        features[STOP_DISTANCE_SHORT] = abs(close - stop_short)
+
+        row = {'close': close, 'tenkan_sen': tenkan, 'kijun_sen': kijun, 'senkou_span_a': span_a,
+               'senkou_span_b': span_b, 'atr': atr, 'volume_sma': volume_sma, 'rsi': rsi}
+        self.rows.append(row)
+        self.features.append(features)
+        self._atrs.append(atr)
+        self._previous_close = close
+        for values in (self._highs, self._lows, self._volumes, self._atrs, self.features):
+            self._trim(values)
+        if not self.keep_rows:
+            self._trim(self.rows)
+        return row
+
+    def window_frame(self, size=2):
+        """DataFrame con las últimas barras (lo que lee process_bar) y sus features"""
+        rows = self.rows[-size:]
+        frame = pd.DataFrame(rows, index=pd.DatetimeIndex(self.times[-len(rows):]))
+        return frame, np.vstack(self.features[-len(rows):])
+
+    def frame_until(self, time):
+        """DataFrame de una fila con la última barra con fecha <= time (vacío si no hay)"""
+        position = bisect.bisect_right(self.times, time)
+        if position == 0:
+            return pd.DataFrame(columns=['close', 'senkou_span_a', 'senkou_span_b'])
+        offset = position - 1 - (self.count - len(self.rows))
+        if offset < 0:
+            raise IndexError(f"Barra de {time} fuera de la ventana de indicadores")
+        return pd.DataFrame([self.rows[offset]], index=pd.DatetimeIndex([self.times[position - 1]]))
+
+def parse_bar_row(record):
+    """Barra {time, open, high, low, close, volume} de una fila CSV/JSON (mismos formatos que read_price_csv)"""
+    record = {key.strip(): value for key, value in record.items()}
+    if 'timestamp' in record:
+        bar_time = pd.Timestamp(record['timestamp'])
+    elif 'date' in record:
+        bar_time = pd.Timestamp(record['date'])
+    elif 'time' in record:
+        bar_time = pd.Timestamp(record['time'])
+    elif 'Local time' in record:
+        bar_time = pd.to_datetime(record['Local time'], format=LOCAL_TIME_FORMAT)
+    else:
+        raise ValueError(f"Formato de fecha no reconocido: {record}")
+    values = {key.lower(): value for key, value in record.items()}
+    return {
+        'time': bar_time,
+        'open': float(values['open']),
+        'high': float(values['high']),
+        'low': float(values['low']),
+        'close': float(values['close']),
+        'volume': float(values.get('volume') or 'nan')
+    }
+
+class CSVTailSource:
+    """
+    Sigue los CSV de 15M y 4H a medida que se les añaden filas (como `tail -f`).
+    Solo se leen líneas completas; en cada lectura se entregan primero las
+    barras 4H nuevas y después las de 15M.
+    """
+
+    def __init__(self, path_15m=None, path_4h=None, follow=True, from_start=False, poll_interval=None):
+        self.paths = {"4H": path_4h or DATA_CONFIG["csv_file_path_4h"],
+                      "15M": path_15m or DATA_CONFIG["csv_file_path_15m"]}
+        self.follow = follow
+        self.from_start = from_start
+        self.poll_interval = poll_interval or LIVE_CONFIG["poll_interval"]
+        self._history = None
+        self._files = {}
+
+    def _open(self):
+        history = {}
+        for timeframe, path in self.paths.items():
+            f = open(path, 'r', encoding='utf-8', newline='')
+            header = next(csv.reader([f.readline()]))
+            self._files[timeframe] = [f, header, ""]
+            if not self.from_start:
+                # Lo que ya existe es histórico (inicializa los indicadores); se sigue desde el final
+                text = f.read()
+                complete = text[:text.rfind("\n") + 1]
+                self._files[timeframe][2] = text[len(complete):]
+                history[timeframe] = read_price_csv(io.StringIO(",".join(header) + "\n" + complete))
+        self._history = history or None
+
+    def history(self):
+        """(df_15m, df_4h) con las barras previas al inicio del seguimiento, o None"""
+        if not self._files:
+            self._open()
+        return (self._history["15M"], self._history["4H"]) if self._history else None
+
+    def __iter__(self):
+        if not self._files:
+            self._open()
+        try:
+            while True:
+                received = False
+                for timeframe, state in self._files.items():
+                    f, header, pending = state
+                    text = pending + f.read()
+                    end = text.rfind("\n") + 1
+                    state[2] = text[end:]
+                    for record in csv.DictReader(io.StringIO(text[:end]), fieldnames=header):
+                        received = True
+                        yield timeframe, parse_bar_row(record), time.perf_counter()
+                if not received:
+                    if not self.follow:
+                        return
+                    time.sleep(self.poll_interval)
+        finally:
+            self.close()
+
+    def close(self):
+        for f, _, _ in self._files.values():
+            f.close()
+        self._files = {}
+
+class SocketBarSource:
+    """
+    Feed de barras por socket TCP: una línea JSON por barra cerrada, p.ej.
+    {"timeframe": "15M", "time": "2021-01-04 09:15:00", "open": ..., "high": ...,
+     "low": ..., "close": ..., "volume": ...}
+    """
+
+    def __init__(self, host=None, port=None):
+        self.host = host or LIVE_CONFIG["host"]
+        self.port = port or LIVE_CONFIG["port"]
+
+    def history(self):
+        return None
+
+    def __iter__(self):
+        with socket.create_connection((self.host, self.port)) as connection:
+            for line in connection.makefile('r', encoding='utf-8'):
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                timeframe = message.pop("timeframe", "15M").upper()
+                yield timeframe, parse_bar_row(message), time.perf_counter()
+
+class PaperTradingSession:
+    """
+    Ejecuta la lógica de CFDBacktestEngine (entradas, stops, trailing y spread
+    de apply_spread_cost) sobre las barras que entregan a un feed en vivo.
+
+    Cada barra de 15M se evalúa en cuanto llega, sobre una ventana con sus
+    indicadores incrementales; las barras 4H se usan cuando se reciben (en vivo
+    no hay barras 4H futuras, a diferencia del backtest sobre CSV completos).
+    """
+
+    def __init__(self, source, instrument=None, event_sink=None):
+        self.source = source
+        self.engine = CFDBacktestEngine(event_sink, trade_frame=False, render_reports=False, instrument=instrument)
+        self.events = self.engine.events
+        self.indicators_15m = IncrementalIndicators()
+        self.indicators_4h = IncrementalIndicators(keep_rows=True)
+        self.start_index = self.engine.get_start_index()
+        self.latencies = []
+        self.fills = []
+        self._frame_4h = (None, None)
+
+    def warm_up(self, df_15m, df_4h, history_bars=None):
+        """Inicializa los indicadores con barras históricas (sin operar)"""
+        history_bars = history_bars or LIVE_CONFIG["history_bars"]
+        for df, indicators in ((df_4h, self.indicators_4h), (df_15m, self.indicators_15m)):
+            df = df.iloc[-history_bars:]
+            columns = [df[name].to_numpy(dtype=float) for name in ('open', 'high', 'low', 'close', 'volume')]
+            for bar_time, *values in zip(df.index, *columns):
+                indicators.update(bar_time, *values)
+        self.events.message(f"Indicadores inicializados con {self.indicators_15m.count} barras de 15M "
+                            f"y {self.indicators_4h.count} de 4H")
+
+    def _trend_frame(self, bar_time):
+        position = bisect.bisect_right(self.indicators_4h.times, bar_time)
+        if self._frame_4h[0] != position:
+            self._frame_4h = (position, self.indicators_4h.frame_until(bar_time))
+        return self._frame_4h[1]
+
+    def on_bar(self, timeframe, bar, received_at):
+        """Procesa una barra cerrada del feed"""
+        if timeframe == "4H":
+            self.indicators_4h.update(**bar)
+            return
+        if timeframe != "15M":
+            return
+
+        engine = self.engine
+        self.indicators_15m.update(**bar)
+        i = self.indicators_15m.count - 1
+        if i < self.start_index:
+            return
+
+        window, features = self.indicators_15m.window_frame()
+        engine.features = features
+        was_in_position, closed_trades = engine.in_position, len(engine.trades)
+        engine.process_bar(window, self._trend_frame(bar['time']), len(window) - 1, bar_index=i)
+        self.latencies.append(time.perf_counter() - received_at)
+
+        if len(engine.trades) > closed_trades:
+            trade = engine.trades.records[-1]
+            self.fills.append({'time': bar['time'], 'action': 'close', 'side': 'sell' if trade['type'] > 0 else 'buy',
+                               'price': trade['exit_price'], 'size': trade['position_size'],
+                               'profit_loss': trade['profit_loss'], 'capital': engine.capital})
+        if engine.in_position and (not was_in_position or len(engine.trades) > closed_trades):
+            self.fills.append({'time': bar['time'], 'action': 'open',
+                               'side': 'buy' if engine.position_type == 'long' else 'sell',
+                               'price': engine.entry_price, 'size': engine.position_size,
+                               'stop_loss': engine.stop_loss, 'capital': engine.capital})
+
+        report_every = LIVE_CONFIG["latency_report_every"]
+        if report_every and len(self.latencies) % report_every == 0:
+            stats = self.latency_stats()
+            self.events.message(f"⏱️  {len(self.latencies)} barras - latencia media {stats['mean_ms']:.2f} ms, "
+                                f"p99 {stats['p99_ms']:.2f} ms - capital ${engine.capital:.2f}")
+
+    def latency_stats(self):
+        """Latencia (ms) desde que la barra llega hasta que la señal está evaluada"""
+        if not self.latencies:
+            return {'bars': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        latencies = np.asarray(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {'bars': len(latencies), 'mean_ms': float(latencies.mean()), 'p50_ms': float(p50),
+                'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(latencies.max())}
+
+    def run(self):
+        """Consume el feed hasta que termina (o Ctrl+C) y devuelve el resumen de la sesión"""
+        history = self.source.history()
+        if history is not None:
+            self.warm_up(*history)
+        self.events.message(f"📡 Paper trading {self.engine.instrument_config['name']} - esperando barras...")
+        try:
+            for timeframe, bar, received_at in self.source:
+                self.on_bar(timeframe, bar, received_at)
+        except KeyboardInterrupt:
+            self.events.message("\n⚠️  Sesión detenida por el usuario")
+        finally:
+            self.events.flush()
+        return self.summary()
+
+    def summary(self):
+        """Trades, capital, equity mark-to-market, fills y latencia de la sesión"""
+        engine = self.engine
+        profit_loss = engine.trades.column('profit_loss')
+        equity = build_equity_curve(np.asarray(self.indicators_15m.closes, dtype=float), engine.trades,
+                                    CAPITAL_CONFIG["initial_capital"], engine.instrument_config["spread"],
+                                    engine.open_position_span())
+        latency = self.latency_stats()
+        summary = {
+            'total_trades': len(profit_loss),
+            'total_profit': float(profit_loss.sum()),
+            'final_capital': engine.capital,
+            'equity': float(equity[-1]) if len(equity) else engine.capital,
+            'in_position': engine.in_position,
+            'bars_processed': latency['bars'],
+            'latency': latency,
+            'trade_ledger': engine.trades,
+            'fills': self.fills
+        }
+
+        self.events.message(f"\n📊 RESUMEN DE LA SESIÓN")
+        self.events.message(f"{'='*40}")
+        self.events.message(f"Barras evaluadas: {latency['bars']}")
+        self.events.message(f"Trades cerrados: {summary['total_trades']} - P&L ${summary['total_profit']:.2f}")
+        self.events.message(f"Capital: ${engine.capital:.2f} - Equity: ${summary['equity']:.2f}")
+        self.events.message(f"Latencia por barra: media {latency['mean_ms']:.2f} ms, p50 {latency['p50_ms']:.2f} ms, "
+                            f"p95 {latency['p95_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms, máx {latency['max_ms']:.2f} ms")
+        return summary
+
+def save_fills(fills, instrument):
+    """Guarda los fills de la sesión en el directorio de resultados"""
+    os.makedirs(LOGGING_CONFIG["output_directory"], exist_ok=True)
+    filename = f"{LOGGING_CONFIG['output_directory']}paper_fills_{instrument}.csv"
+    pd.DataFrame(fills).to_csv(filename, index=False)
+    return filename
+
+def run_paper_trading(source=None, instrument=None, replay=False):
+    """
+    Sesión de paper trading
+
+    Args:
+        source: Fuente de barras; por defecto según LIVE_CONFIG["source"]
+        replay: Con la fuente de fichero, recorre los CSV desde el principio y
+            termina al llegar al final (útil para comprobar la sesión)
+    """
+    if source is None:
+        if LIVE_CONFIG["source"] == "socket":
+            source = SocketBarSource()
+        else:
+            source = CSVTailSource(follow=not replay, from_start=replay)
+    session = PaperTradingSession(source, instrument)
+    summary = session.run()
+    if summary['fills']:
+        session.events.message(f"💾 Fills guardados en: {save_fills(summary['fills'], session.engine.instrument)}")
+    return summary
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    replay = "--replay" in args
+    if "--socket" in args:
+        LIVE_CONFIG["source"] = "socket"
+    instruments = [arg for arg in args if not arg.startswith("--")]
+    run_paper_trading(instrument=instruments[0] if instruments else None, replay=replay)
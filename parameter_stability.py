@@ -0,0 +1,237 @@
+# parameter_stability.py - Mapa de estabilidad de los resultados del optimizador por vecindad en el grid
+
+import sys
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from config import *
+
+class GridIndex:
+    """
+    Índice de los resultados sobre el grid de parámetros
+
+    Los ejes son los valores probados de cada parámetro (parameter_ranges
+    del optimizador), no los que aparecen en los resultados: una combinación
+    descartada deja un hueco en el grid en lugar de acercar a sus vecinos.
+    Cada parámetro se convierte en una coordenada entera (posición de su
+    valor en el eje, por búsqueda binaria) y cada punto en una clave lineal.
+    Las filas que caen en la misma celda (un grid proyectado sobre parte de
+    los parámetros, --params) comparten celda: row_cell da la celda de cada
+    fila y los vecinos se buscan entre celdas.
+    Con un grid de hasta STABILITY_CONFIG["max_grid_cells"] celdas la fila de
+    una clave se obtiene de un array denso (O(1)); si no, por búsqueda
+    binaria sobre las claves ordenadas.
+    """
+
+    def __init__(self, frame, axes):
+        self.parameters = list(axes)
+        coordinates, values = [], []
+        for parameter in self.parameters:
+            axis = np.unique(np.asarray(axes[parameter], dtype=float))
+            column = frame[parameter].to_numpy(dtype=float)
+            # Valor más cercano del eje (tolera el redondeo de float de los CSV)
+            right = np.minimum(np.searchsorted(axis, column), len(axis) - 1)
+            left = np.maximum(right - 1, 0)
+            position = np.where(np.abs(axis[left] - column) <= np.abs(axis[right] - column), left, right)
+            outside = ~np.isclose(axis[position], column)
+            if outside.any():
+                raise ValueError(f"Valores de {parameter} fuera del grid: {np.unique(column[outside])[:5].tolist()}")
+            values.append(axis)
+            coordinates.append(position.astype(np.int64))
+        self.values = values
+        self.shape = tuple(len(axis) for axis in values)
+        row_keys = (np.ravel_multi_index(coordinates, self.shape) if self.parameters
+                    else np.zeros(len(frame), np.int64))
+        self.keys, self.row_cell = np.unique(row_keys, return_inverse=True)
+        self.row_cell = self.row_cell.reshape(-1)
+        self.coordinates = (np.column_stack(np.unravel_index(self.keys, self.shape)) if self.parameters
+                            else np.empty((len(self.keys), 0), np.int64))
+
+        # Paso de la clave lineal por unidad de cada coordenada (orden C)
+        self.strides = np.array([int(np.prod(self.shape[axis + 1:], dtype=np.int64))
+                                 for axis in range(len(self.shape))], dtype=np.int64)
+        cells = int(np.prod(self.shape, dtype=np.int64))
+        if cells <= STABILITY_CONFIG["max_grid_cells"]:
+            self.dense = np.full(cells, -1, dtype=np.int64)
+            self.dense[self.keys] = np.arange(len(self.keys))
+        else:
+            self.dense = None
+            self.order = np.argsort(self.keys, kind='stable')
+            self.sorted_keys = self.keys[self.order]
+
+    def neighbor_rows(self, offset):
+        """
+        Celda del vecino de cada celda en el desplazamiento `offset`; -1 si cae
+        fuera del grid o no hay resultado
+
+        Returns:
+            (celdas, máscara de vecinos dentro del grid)
+        """
+        inside = np.ones(len(self.keys), dtype=bool)
+        for axis in np.flatnonzero(offset):
+            shifted = self.coordinates[:, axis] + offset[axis]
+            inside &= (shifted >= 0) & (shifted < self.shape[axis])
+        keys = self.keys[inside] + int(np.dot(offset, self.strides))
+        rows = np.full(len(self.keys), -1, dtype=np.int64)
+        if self.dense is not None:
+            rows[inside] = self.dense[keys]
+        else:
+            position = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+            found = self.sorted_keys[position] == keys
+            rows[np.flatnonzero(inside)[found]] = self.order[position[found]]
+        return rows, inside
+
+def neighbor_offsets(dimensions, radius=1, neighborhood="moore"):
+    """
+    Desplazamientos de los vecinos en el grid
+
+    moore: todos los puntos a distancia <= radius en cada eje (incluidas diagonales);
+    axes: solo a lo largo de un eje
+    """
+    if neighborhood == "axes":
+        offsets = [step * np.eye(dimensions, dtype=np.int64)[axis]
+                   for axis in range(dimensions) for step in range(-radius, radius + 1) if step]
+        return np.array(offsets, dtype=np.int64).reshape(-1, dimensions)
+    steps = range(-radius, radius + 1)
+    return np.array([offset for offset in itertools.product(steps, repeat=dimensions) if any(offset)],
+                    dtype=np.int64).reshape(-1, dimensions)
+
+def parameter_axes(parameter_ranges, frame=None, parameters=None):
+    """
+    Ejes del grid {parámetro: valores probados} a partir de parameter_ranges
+    (mismo formato que OPTIMIZATION_CONFIG["parameter_ranges"])
+
+    Args:
+        frame: Si se indica, solo los parámetros con columna en los resultados
+        parameters: Parámetros a incluir; los que no están en parameter_ranges
+            toman como eje los valores de su columna en frame
+    """
+    from optimize import CFDOptimizer
+    values = CFDOptimizer._parameter_values(parameter_ranges)
+    parameters = list(parameter_ranges) if parameters is None else list(parameters)
+    if frame is not None:
+        parameters = [parameter for parameter in parameters if parameter in frame]
+    return {parameter: values[parameter] if parameter in values else np.unique(frame[parameter].to_numpy())
+            for parameter in parameters}
+
+def analyze_parameter_stability(frame, axes, metric="profit_factor"):
+    """
+    Puntúa cada punto del grid por la media y la dispersión de la métrica en su vecindad
+
+    Los vecinos sin resultado (combinaciones descartadas o no válidas) no
+    entran en las estadísticas, pero reducen la cobertura de la vecindad.
+    Un profit factor infinito (sin pérdidas) se recorta al mayor valor finito.
+    Si varias filas caen en la misma celda (grid sobre parte de los
+    parámetros) la celda vale el agregado STABILITY_CONFIG["projection"] de
+    sus filas, y todas ellas reciben las puntuaciones de la celda.
+
+    Args:
+        frame: Resultados del optimizador (una fila por combinación)
+        axes: Ejes del grid {parámetro: valores probados} (parameter_axes)
+        metric: Métrica a evaluar
+
+    Returns:
+        DataFrame con el índice de frame y las columnas cell_value, neighbors,
+        coverage, neighbor_mean, neighbor_std, neighbor_max, stability_score e
+        isolated_spike
+    """
+    values = frame[metric].to_numpy(dtype=float).copy()
+    finite = np.isfinite(values)
+    if finite.any():
+        values[np.isposinf(values)] = values[finite].max()
+    values[np.isneginf(values)] = np.nan
+
+    index = GridIndex(frame, axes)
+    # Valor de cada celda (las filas repetidas en una celda se agregan, no se sobrescriben)
+    values = pd.Series(values).groupby(index.row_cell).agg(STABILITY_CONFIG["projection"]).to_numpy(dtype=float)
+    offsets = neighbor_offsets(len(index.parameters), STABILITY_CONFIG["radius"], STABILITY_CONFIG["neighborhood"])
+    n = len(index.keys)
+    count, possible = np.zeros(n), np.zeros(n)
+    total, squares = np.zeros(n), np.zeros(n)
+    best = np.full(n, -np.inf)
+
+    # Una pasada vectorizada por desplazamiento: todos los puntos a la vez
+    for offset in offsets:
+        rows, inside = index.neighbor_rows(offset)
+        possible += inside
+        neighbor = np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan)
+        present = ~np.isnan(neighbor)
+        count += present
+        neighbor = np.where(present, neighbor, 0.0)
+        total += neighbor
+        squares += neighbor ** 2
+        best = np.where(present, np.maximum(best, neighbor), best)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean ** 2, 0.0))
+        # Puntuación de meseta: media de la vecindad incluido el propio punto, penalizada por su dispersión
+        own = ~np.isnan(values)
+        plateau_count = count + own
+        plateau_mean = (total + np.where(own, values, 0.0)) / plateau_count
+        plateau_std = np.sqrt(np.maximum((squares + np.where(own, values, 0.0) ** 2) / plateau_count
+                                         - plateau_mean ** 2, 0.0))
+        score = plateau_mean - STABILITY_CONFIG["std_penalty"] * plateau_std
+        # Pico aislado: sin vecinos válidos, o por encima del mejor vecino en más
+        # de spike_threshold desviaciones de la vecindad (un máximo local del
+        # ruido apenas supera a su mejor vecino)
+        spike = own & ((count == 0) | (values - best > STABILITY_CONFIG["spike_threshold"] * std))
+
+    cells = index.row_cell
+    return pd.DataFrame({
+        "cell_value": values[cells],
+        "neighbors": count.astype(np.int64)[cells],
+        "coverage": np.where(possible > 0, count / np.maximum(possible, 1), np.nan)[cells],
+        "neighbor_mean": mean[cells],
+        "neighbor_std": std[cells],
+        "neighbor_max": np.where(count > 0, best, np.nan)[cells],
+        "stability_score": score[cells],
+        "isolated_spike": spike[cells]
+    }, index=frame.index)
+
+def format_stability_report(frame, stability, parameters, metric, top_n=5):
+    """Líneas de texto del mapa de estabilidad: mejores mesetas y picos aislados"""
+    lines = [f"\n🗺️  MAPA DE ESTABILIDAD ({metric}, vecindad {STABILITY_CONFIG['neighborhood']} "
+             f"radio {STABILITY_CONFIG['radius']})"]
+    spikes = stability["isolated_spike"]
+    cells = frame[parameters].drop_duplicates()
+    spike_cells = frame.loc[spikes.to_numpy(), parameters].drop_duplicates()
+    lines.append(f"   Picos aislados: {len(spike_cells)}/{len(cells)}")
+    best = frame[metric].idxmax()
+    if spikes.loc[best]:
+        lines.append(f"   ⚠️  El mejor {metric} ({frame.loc[best, metric]:.3f}) es un pico aislado: "
+                     f"media de sus vecinos {stability.loc[best, 'neighbor_mean']:.3f}")
+    ranked = stability[~spikes].sort_values("stability_score", ascending=False)
+    # Una línea por celda del grid (varias filas comparten celda si el grid es una proyección)
+    ranked = ranked[~frame.loc[ranked.index, parameters].duplicated().to_numpy()].head(top_n)
+    for rank, (row, scores) in enumerate(ranked.iterrows(), 1):
+        params = ", ".join(f"{parameter}: {frame.loc[row, parameter]:g}" for parameter in parameters)
+        lines.append(f"   #{rank} {params} - puntuación {scores['stability_score']:.3f} "
+                     f"({metric} {scores['cell_value']:.3f}, vecinos {scores['neighbor_mean']:.3f} "
+                     f"± {scores['neighbor_std']:.3f}, {scores['neighbors']} vecinos)")
+    return lines
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="parameter_stability.py", description="Mapa de estabilidad de parámetros")
+    parser.add_argument("results", help="CSV de resultados de la optimización")
+    parser.add_argument("--metric", default=OPTIMIZATION_CONFIG["optimization_metric"], help="Métrica a analizar")
+    parser.add_argument("--params", help="Parámetros del grid separados por comas")
+    options = parser.parse_args(args)
+    frame = pd.read_csv(options.results)
+    metric = options.metric
+    # Ejes del grid de OPTIMIZATION_CONFIG["parameter_ranges"] (los de la optimización que generó el CSV)
+    axes = parameter_axes(OPTIMIZATION_CONFIG["parameter_ranges"], frame,
+                          options.params.split(",") if options.params else None)
+    parameters = list(axes)
+    stability = analyze_parameter_stability(frame, axes, metric)
+    for line in format_stability_report(frame, stability, parameters, metric, STABILITY_CONFIG["top_n"]):
+        print(line)
+    output = options.results.replace(".csv", "_stability.csv")
+    frame.drop(columns=stability.columns, errors='ignore').join(stability).to_csv(output, index=False)
+    print(f"\n💾 Mapa de estabilidad guardado en: {output}")
+    return 0
+
+if __name__ == "__main__":
+    # Uso: python parameter_stability.py results/optimization_UK100_....csv [--metric=sharpe_ratio] [--params=a,b]
+    sys.exit(main(sys.argv[1:]))
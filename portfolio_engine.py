@@ -0,0 +1,227 @@
+# portfolio_engine.py - Backtest de cartera: varios instrumentos con capital y margen compartidos
+
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from cfd_backtest_engine import CFDBacktestEngine
+from dataset import PreparedDataset, load_prepared_dataset, apply_date_range
+from events import create_event_sink, SilentSink, ENTRY_CODE
+from metrics import build_equity_curve, compute_risk_metrics
+from config import *
+
+def instrument_data_config(instrument):
+    """
+    Rutas de los CSV de un instrumento según PORTFOLIO_CONFIG["data_file_pattern"]
+    (con DATA_CONFIG["use_catalog"] se cargan en su lugar todos los años del catálogo)
+    """
+    pattern = PORTFOLIO_CONFIG["data_file_pattern"]
+    return {
+        "csv_file_path_15m": pattern.format(instrument=instrument, timeframe="15M"),
+        "csv_file_path_4h": pattern.format(instrument=instrument, timeframe="4H")
+    }
+
+def _prepare_instrument(instrument, config_snapshot):
+    """
+    Prepara un instrumento en un proceso worker: dataset (cache binaria) y
+    códigos de descarte por barra (ENTRY_CODE = candidata a entrada).
+
+    Returns:
+        (ruta de la cache del dataset, códigos de compute_entry_rejection_codes)
+    """
+    apply_config_overrides(config_snapshot)
+    apply_config_overrides({"DATA_CONFIG": instrument_data_config(instrument)})
+    engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False, instrument=instrument)
+    dataset = load_prepared_dataset(engine, use_cache=True)
+    return dataset.cache_path, engine.compute_entry_rejection_codes(dataset)
+
+class PortfolioBacktestEngine:
+    """
+    Recorre las barras de todos los instrumentos en orden temporal (merge
+    k-way con heapq de los timestamps de cada instrumento). Cada instrumento
+    conserva sus reglas (horario, spread, stops, margen) y su estado de
+    posición en un CFDBacktestEngine; el capital y el margen son comunes.
+    """
+
+    def __init__(self, instruments=None, event_sink=None, trade_frame=True):
+        self.instruments = list(instruments or PORTFOLIO_CONFIG["instruments"])
+        unknown = [instrument for instrument in self.instruments if instrument not in INSTRUMENTS]
+        if unknown:
+            raise KeyError(f"Instrumentos desconocidos: {unknown}")
+
+        self.events = event_sink if event_sink is not None else create_event_sink()
+        self.trade_frame = trade_frame
+        self.engines = {
+            instrument: CFDBacktestEngine(self.events, trade_frame=False, render_reports=False, instrument=instrument)
+            for instrument in self.instruments
+        }
+        self.capital = CAPITAL_CONFIG["initial_capital"]
+        self.margin_in_use = 0
+        self.max_margin_in_use = 0
+
+    def prepare_datasets(self, max_workers=None):
+        """
+        Carga datos, indicadores y códigos de descarte de cada instrumento en
+        paralelo (un proceso por instrumento).
+
+        Returns:
+            Dict {instrumento: (PreparedDataset, códigos de descarte por barra)}
+        """
+        max_workers = min(max_workers or PORTFOLIO_CONFIG["max_workers"], len(self.instruments))
+        config_snapshot = snapshot_config()
+        self.events.message(f"Preparando {len(self.instruments)} instrumentos con {max_workers} procesos...")
+
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {instrument: executor.submit(_prepare_instrument, instrument, config_snapshot)
+                           for instrument in self.instruments}
+                prepared = {instrument: future.result() for instrument, future in futures.items()}
+        else:
+            previous = {"DATA_CONFIG": dict(DATA_CONFIG)}
+            try:
+                prepared = {instrument: _prepare_instrument(instrument, config_snapshot)
+                            for instrument in self.instruments}
+            finally:
+                apply_config_overrides(previous)
+
+        datasets = {}
+        for instrument, (cache_path, codes) in prepared.items():
+            # La cache guarda el historial completo; los códigos son de la vista del rango de fechas
+            dataset = apply_date_range(PreparedDataset.load(cache_path, mmap_mode='r'))
+            datasets[instrument] = (dataset, codes)
+        return datasets
+
+    def run_backtest(self, datasets=None):
+        """
+        Ejecuta el backtest de cartera
+
+        Args:
+            datasets: Resultado de prepare_datasets(); por defecto se prepara aquí
+        """
+        try:
+            self.events.message("\n" + "="*60)
+            self.events.message("INICIANDO BACKTEST DE CARTERA")
+            self.events.message("="*60)
+            self.events.message(f"Instrumentos: {', '.join(self.instruments)}")
+            self.events.message(f"Capital inicial: ${CAPITAL_CONFIG['initial_capital']}")
+
+            if datasets is None:
+                datasets = self.prepare_datasets()
+            self.datasets = datasets
+
+            engines = [self.engines[instrument] for instrument in self.instruments]
+            frames = []
+            codes = []
+            timelines = []
+            for k, instrument in enumerate(self.instruments):
+                dataset, bar_codes = datasets[instrument]
+                engine = engines[k]
+                engine.attach_dataset(dataset)
+                frames.append((dataset.df_15m, dataset.df_4h))
+                codes.append(bar_codes)
+                start = engine.get_start_index()
+                timestamps = dataset.df_15m.index.asi8[start:]
+                timelines.append(zip(timestamps, itertools.repeat(k), range(start, len(dataset))))
+
+            self.events.message("\nEjecutando backtest...")
+            for _, k, i in heapq.merge(*timelines):
+                engine = engines[k]
+                # Sin posición y sin entrada posible en la barra: solo se cuenta en el embudo
+                if not engine.in_position and codes[k][i] != ENTRY_CODE:
+                    # risk_rules comprueba min_capital_required con el capital común
+                    engine.capital = self.capital
+                    engine.record_skipped_bar(frames[k][0].index[i], i, codes[k][i])
+                    continue
+
+                previous_margin = engine.position_margin
+                engine.capital = self.capital
+                engine.reserved_margin = self.margin_in_use - previous_margin
+                engine.process_bar(frames[k][0], frames[k][1], i)
+                self.capital = engine.capital
+                self.margin_in_use += engine.position_margin - previous_margin
+                self.max_margin_in_use = max(self.max_margin_in_use, self.margin_in_use)
+
+            self.events.message("\n" + "="*60)
+            self.events.message("BACKTEST DE CARTERA COMPLETADO")
+            self.events.message("="*60)
+
+            return self.generate_results()
+
+        finally:
+            self.events.flush()
+
+    def portfolio_equity_curve(self):
+        """Equity por barra de la cartera sobre la unión de los timestamps de todos los instrumentos"""
+        curves = {}
+        for instrument, engine in self.engines.items():
+            df_15m = engine.dataset.df_15m
+            pnl = build_equity_curve(df_15m['close'].to_numpy(dtype=float), engine.trades, 0.0,
+                                     engine.instrument_config["spread"], engine.open_position_span())
+            start = engine.get_start_index()
+            curves[instrument] = pd.Series(pnl[start:], index=df_15m.index[start:])
+        pnl = pd.concat(curves, axis=1).sort_index().ffill().fillna(0.0)
+        return (CAPITAL_CONFIG["initial_capital"] + pnl.sum(axis=1)).rename('equity')
+
+    def generate_results(self):
+        """Métricas de la cartera y desglose por instrumento"""
+        profit_loss = np.concatenate([engine.trades.column('profit_loss') for engine in self.engines.values()])
+        by_instrument = {}
+        for instrument, engine in self.engines.items():
+            instrument_pl = engine.trades.column('profit_loss')
+            by_instrument[instrument] = {
+                'total_trades': len(instrument_pl),
+                'win_rate': float((instrument_pl > 0).mean() * 100) if len(instrument_pl) else 0,
+                'total_profit': float(instrument_pl.sum()),
+                'rejections': engine.rejection_funnel()
+            }
+
+        total_trades = len(profit_loss)
+        gross_profits = profit_loss[profit_loss > 0].sum()
+        gross_losses = abs(profit_loss[profit_loss <= 0].sum())
+        equity_curve = self.portfolio_equity_curve()
+        risk_metrics = compute_risk_metrics(equity_curve.to_numpy(), equity_curve.index)
+
+        results = {
+            'total_trades': total_trades,
+            'win_rate': float((profit_loss > 0).mean() * 100) if total_trades else 0,
+            'total_profit': float(profit_loss.sum()),
+            'profit_factor': gross_profits / gross_losses if gross_losses > 0 else (float('inf') if total_trades else 0),
+            **risk_metrics,
+            'final_capital': self.capital,
+            'max_margin_used': self.max_margin_in_use,
+            'instruments': by_instrument,
+            'trade_ledgers': {instrument: engine.trades for instrument, engine in self.engines.items()},
+            'equity_curve': equity_curve if self.trade_frame else None,
+            'df_trades': None
+        }
+        if self.trade_frame and total_trades:
+            results['df_trades'] = pd.concat(
+                [engine.trades.to_dataframe() for engine in self.engines.values() if len(engine.trades)]
+            ).sort_values('entry_time', kind='stable').reset_index(drop=True)
+
+        self.events.message(f"\n📊 RESULTADOS DE LA CARTERA")
+        self.events.message(f"{'='*40}")
+        for instrument, stats in by_instrument.items():
+            self.events.message(f"{instrument}: {stats['total_trades']} trades, "
+                                f"{stats['win_rate']:.1f}% acierto, ${stats['total_profit']:.2f}")
+        self.events.message(f"\nTotal de trades: {total_trades}")
+        self.events.message(f"Capital final: ${self.capital:.2f}")
+        self.events.message(f"Profit Factor: {results['profit_factor']:.2f}")
+        self.events.message(f"Máximo Drawdown: {results['max_drawdown']:.1f}%")
+        self.events.message(f"Sharpe: {results['sharpe_ratio']:.2f}")
+        self.events.message(f"Margen máximo en uso: ${self.max_margin_in_use:.2f}")
+
+        return results
+
+def run_portfolio_backtest(instruments=None):
+    """Función principal para ejecutar el backtest de cartera"""
+    if not validate_config():
+        return None
+    engine = PortfolioBacktestEngine(instruments)
+    return engine.run_backtest()
+
+if __name__ == "__main__":
+    import sys
+    run_portfolio_backtest(sys.argv[1:] or None)
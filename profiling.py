@@ -0,0 +1,328 @@
+# profiling.py - Tiempos por etapa, contadores de las funciones por barra, perfilador por muestreo y memoria
+
+import os
+import sys
+import time
+import threading
+import contextlib
+import tracemalloc
+from collections import Counter
+from functools import wraps
+from config import *
+
+try:
+    import resource
+except ImportError:         # Windows: sin getrusage
+    resource = None
+
+MB = 1024 * 1024
+
+# Métodos del motor que se ejecutan en cada barra (o en cada barra candidata)
+HOT_PATH_FUNCTIONS = (
+    "process_bar",
+    "execute_trade_entry",
+    "get_4h_trend_bias",
+    "analyze_market_conditions",
+    "check_spread_conditions",
+    "check_risk_management_rules",
+    "check_ichimoku_signal",
+    "manage_open_position"
+)
+
+class StageTimer:
+    """Tiempo de reloj y de CPU de cada etapa"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            timing["wall"] += time.perf_counter() - wall
+            timing["cpu"] += time.process_time() - cpu
+
+class CallProfiler:
+    """
+    Cuenta llamadas y tiempo acumulado de métodos de una instancia. Envuelve
+    los métodos solo en esa instancia: sin perfilador el motor no paga nada.
+    El tiempo es inclusivo (process_bar incluye lo que llama).
+    """
+
+    def __init__(self, target, names=HOT_PATH_FUNCTIONS):
+        self.calls = dict.fromkeys(names, 0)
+        self.seconds = dict.fromkeys(names, 0.0)
+        for name in names:
+            setattr(target, name, self._wrap(name, getattr(target, name)))
+        self.target = target
+        self.names = names
+
+    def _wrap(self, name, method):
+        calls, seconds, clock = self.calls, self.seconds, time.perf_counter
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[name] += clock() - start
+                calls[name] += 1
+        return wrapper
+
+    def remove(self):
+        """Restaura los métodos originales de la instancia"""
+        for name in self.names:
+            self.target.__dict__.pop(name, None)
+
+    def stats(self):
+        return {name: {"calls": self.calls[name], "seconds": self.seconds[name],
+                       "us_per_call": self.seconds[name] / self.calls[name] * 1e6 if self.calls[name] else 0.0}
+                for name in self.names}
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo sin dependencias: un hilo auxiliar toma la pila
+    del hilo perfilado cada `interval` segundos. El coste no depende del
+    número de llamadas, así que se puede usar sobre backtests largos.
+    """
+
+    def __init__(self, interval=None, thread_id=None):
+        self.interval = interval or DEBUG_CONFIG["sampling_interval"]
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self, top_n=None):
+        """Funciones con más muestras: propias (self) y acumuladas (en la pila)"""
+        top_n = top_n or DEBUG_CONFIG["profile_top_n"]
+        total = sum(self.samples.values())
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.samples.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                cumulative[function] += count
+
+        def ranking(counter):
+            return [{"function": function, "samples": count, "percent": count / total * 100}
+                    for function, count in counter.most_common(top_n)]
+
+        return {"samples": total, "interval": self.interval,
+                "top_self": ranking(own) if total else [], "top_cumulative": ranking(cumulative) if total else []}
+
+    def write_collapsed(self, filename):
+        """Pilas en formato colapsado (flamegraph.pl, speedscope)"""
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.items():
+                f.write(f"{';'.join(stack)} {count}\n")
+        return filename
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso desde que arrancó (None si el SO no lo expone)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB, macOS en bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    """Memoria residente actual del proceso (Linux); en otros sistemas, el pico"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+def available_memory_mb():
+    """Memoria física disponible (None si no se puede consultar)"""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MemoryTracker:
+    """
+    Memoria de cada etapa con tracemalloc: pico de memoria Python reservada
+    durante la etapa, lo que queda reservado al terminar, RSS del proceso y las
+    líneas que más memoria han reservado (diferencia entre snapshots). Es caro
+    (tracemalloc ralentiza todas las reservas): solo para diagnóstico.
+    """
+
+    def __init__(self, top_n=None):
+        self.top_n = top_n or DEBUG_CONFIG["memory_top_n"]
+        self.stages = {}
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(DEBUG_CONFIG["memory_traceback_frames"])
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        before = tracemalloc.take_snapshot().filter_traces(self._filters)
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(self._filters)
+            top = [{"location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "size_mb": stat.size_diff / MB, "count": stat.count_diff}
+                   for stat in after.compare_to(before, "lineno")[:self.top_n] if stat.size_diff >= MB // 100]
+            record = {"traced_peak_mb": (peak - start) / MB, "traced_delta_mb": (current - start) / MB,
+                      "rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb(), "top_allocators": top}
+            # Una etapa repetida (p.ej. features) se queda con la ejecución de mayor pico
+            previous = self.stages.get(name)
+            if previous is None or record["traced_peak_mb"] >= previous["traced_peak_mb"]:
+                self.stages[name] = record
+
+    def stop(self):
+        if self._started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+class RunProfiler:
+    """
+    Instrumentación de un backtest según DEBUG_CONFIG: tiempos por etapa, pico
+    de RSS del proceso y crecimiento del RSS durante el backtest (siempre, son
+    unas pocas lecturas de reloj y del sistema), contadores de las funciones por barra
+    (profile_hot_path), perfilador por muestreo (sampling_profiler) y memoria
+    por etapa con tracemalloc (memory_profile).
+    """
+
+    def __init__(self, engine):
+        self.timer = StageTimer()
+        self.start_rss_mb = current_rss_mb()
+        self.calls = CallProfiler(engine) if DEBUG_CONFIG["profile_hot_path"] else None
+        self.sampler = SamplingProfiler().start() if DEBUG_CONFIG["sampling_profiler"] else None
+        self.memory = MemoryTracker() if DEBUG_CONFIG["memory_profile"] else None
+        self.stage = self.timer.stage if self.memory is None else self._stage_with_memory
+
+    @contextlib.contextmanager
+    def _stage_with_memory(self, name):
+        # El cronómetro va dentro: no cuenta el coste de los snapshots
+        with self.memory.stage(name), self.timer.stage(name):
+            yield
+
+    def close(self):
+        """Detiene los perfiladores y restaura los métodos del motor (se puede llamar varias veces)"""
+        if self.calls is not None:
+            self.calls.remove()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.memory is not None:
+            self.memory.stop()
+
+    def finish(self):
+        """Detiene los perfiladores y devuelve el dict 'timings' de los resultados"""
+        self.close()
+        timings = {"stages": self.timer.stages, "pid": os.getpid(), "peak_rss_mb": peak_rss_mb()}
+        # peak_rss_mb es el máximo del proceso desde que arrancó (en un worker, de todos sus
+        # backtests hasta este); rss_delta_mb es lo que ha crecido el RSS en este backtest
+        rss = current_rss_mb()
+        timings["rss_delta_mb"] = rss - self.start_rss_mb if rss is not None and self.start_rss_mb is not None else None
+        if self.memory is not None:
+            timings["memory"] = self.memory.stages
+        if self.calls is not None:
+            timings["calls"] = self.calls.stats()
+        if self.sampler is not None:
+            timings["sampling"] = self.sampler.stats()
+            if DEBUG_CONFIG["profile_output"]:
+                timings["sampling"]["collapsed_file"] = self.sampler.write_collapsed(DEBUG_CONFIG["profile_output"])
+        return timings
+
+def format_timings(timings):
+    """Resumen de una línea de los tiempos por etapa"""
+    return " - ".join(f"{name} {timing['wall']:.2f}s" for name, timing in timings["stages"].items())
+
+def timings_report(timings):
+    """Líneas de texto con los contadores por función, el perfil por muestreo y la memoria (si se midieron)"""
+    lines = []
+    if "memory" in timings:
+        lines.extend(memory_report(timings["memory"]))
+    if "calls" in timings:
+        lines.append(f"{'Función':<30} {'Llamadas':>10} {'Total (s)':>10} {'µs/llamada':>11}")
+        for name, stats in sorted(timings["calls"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"{name:<30} {stats['calls']:>10} {stats['seconds']:>10.3f} {stats['us_per_call']:>11.1f}")
+    if "sampling" in timings:
+        sampling = timings["sampling"]
+        lines.append(f"Perfil por muestreo ({sampling['samples']} muestras cada {sampling['interval'] * 1000:.0f} ms) - tiempo propio:")
+        for entry in sampling["top_self"]:
+            lines.append(f"   {entry['percent']:5.1f}%  {entry['function']}")
+        if sampling.get("collapsed_file"):
+            lines.append(f"Pilas colapsadas en: {sampling['collapsed_file']}")
+    return lines
+
+def memory_report(memory):
+    """Líneas de texto de la memoria por etapa y sus mayores reservas"""
+    lines = [f"{'Etapa':<22} {'Pico (MB)':>10} {'Retenido (MB)':>14} {'RSS (MB)':>10}"]
+    for name, record in memory.items():
+        rss = f"{record['rss_mb']:.1f}" if record["rss_mb"] is not None else "-"
+        lines.append(f"{name:<22} {record['traced_peak_mb']:>10.1f} {record['traced_delta_mb']:>14.1f} {rss:>10}")
+        for allocator in record["top_allocators"][:3]:
+            lines.append(f"   {allocator['size_mb']:8.2f} MB  {allocator['location']}")
+    return lines
+
+def summarize_worker_memory(timings_list):
+    """
+    Resumen de memoria de un conjunto de backtests (p.ej. todas las
+    combinaciones del optimizador): pico de RSS de cada proceso y, si se midió
+    con tracemalloc, el mayor pico de cada etapa.
+    """
+    workers, stages = {}, {}
+    for timings in timings_list:
+        if not timings:
+            continue
+        worker = workers.setdefault(timings["pid"], {"runs": 0, "peak_rss_mb": None})
+        worker["runs"] += 1
+        if timings["peak_rss_mb"] is not None:
+            worker["peak_rss_mb"] = max(worker["peak_rss_mb"] or 0.0, timings["peak_rss_mb"])
+        for name, record in timings.get("memory", {}).items():
+            if name not in stages or record["traced_peak_mb"] > stages[name]["traced_peak_mb"]:
+                stages[name] = record
+
+    peaks = [worker["peak_rss_mb"] for worker in workers.values() if worker["peak_rss_mb"] is not None]
+    return {"workers": workers, "max_worker_rss_mb": max(peaks) if peaks else None,
+            "parent_rss_mb": peak_rss_mb(), "available_mb": available_memory_mb(), "stages": stages}
+
+def format_worker_memory(summary):
+    """Líneas de texto del resumen de memoria, con los workers que caben en la memoria disponible"""
+    lines = []
+    for pid, worker in summary["workers"].items():
+        peak = f"{worker['peak_rss_mb']:.1f} MB" if worker["peak_rss_mb"] is not None else "-"
+        lines.append(f"Proceso {pid}: {worker['runs']} backtests, pico RSS {peak}")
+    if summary["parent_rss_mb"] is not None:
+        lines.append(f"Proceso principal: pico RSS {summary['parent_rss_mb']:.1f} MB")
+    if summary["max_worker_rss_mb"] and summary["available_mb"]:
+        fits = int(summary["available_mb"] // summary["max_worker_rss_mb"])
+        lines.append(f"Memoria disponible {summary['available_mb']:.0f} MB: caben ~{fits} workers "
+                     f"de {summary['max_worker_rss_mb']:.1f} MB")
+    if summary["stages"]:
+        lines.extend(memory_report(summary["stages"]))
+    return lines
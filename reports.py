@@ -0,0 +1,183 @@
+# reports.py - Generación de reportes (CSV de trades y gráfica de equity) en segundo plano
+
+import os
+import atexit
+import datetime
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import *
+from metrics import drawdown_percent
+
+class ReportJob:
+    """
+    Resultado de un backtest listo para renderizar. Solo guarda el ledger y la
+    curva de equity (arrays), así que se envía barato a otro proceso; los
+    DataFrames y las figuras se construyen en el worker.
+    """
+
+    def __init__(self, ledger, equity_curve=None, label=None, instrument=None):
+        self.ledger = ledger
+        self.equity_curve = equity_curve            # pd.Series de equity por barra (opcional)
+        self.label = label                          # Sufijo del nombre de fichero (p.ej. combinación)
+        self.instrument = instrument or ACTIVE_INSTRUMENT
+        self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+def build_trades_frame(ledger, initial_capital):
+    """DataFrame de trades con las columnas de capital y drawdown del reporte"""
+    df_trades = ledger.to_dataframe()
+    df_trades['cumulative_profit'] = np.cumsum(df_trades['profit_loss'].to_numpy())
+    df_trades['capital_curve'] = initial_capital + df_trades['cumulative_profit']
+    df_trades['peak'] = np.maximum.accumulate(df_trades['capital_curve'].to_numpy())
+    df_trades['drawdown'] = (df_trades['peak'] - df_trades['capital_curve']) / df_trades['peak'] * 100
+    return df_trades
+
+def results_summary(results, include_trades=False):
+    """
+    Resultados de un backtest en forma serializable a JSON: las métricas
+    escalares y, opcionalmente, la lista de trades.
+    """
+    summary = {key: value.item() if hasattr(value, 'item') else value
+               for key, value in results.items()
+               if key not in ('trade_ledger', 'df_trades', 'equity_curve', 'rejection_codes')}
+    if include_trades and results.get('trade_ledger') is not None:
+        df_trades = results['trade_ledger'].to_dataframe()
+        for column in ('entry_time', 'exit_time'):
+            df_trades[column] = df_trades[column].map(lambda value: value.isoformat())
+        summary['trades'] = df_trades.to_dict('records')
+    return summary
+
+def report_options():
+    """Opciones de renderizado actuales (se copian para enviarlas al worker)"""
+    return {
+        **REPORT_CONFIG,
+        "output_directory": LOGGING_CONFIG["output_directory"],
+        "file_prefix": LOGGING_CONFIG["file_prefix"],
+        "initial_capital": CAPITAL_CONFIG["initial_capital"]
+    }
+
+def render_report(job, options):
+    """
+    Escribe el CSV de trades y la gráfica de equity de un ReportJob.
+
+    Returns:
+        Lista de ficheros generados
+    """
+    os.makedirs(options["output_directory"], exist_ok=True)
+    suffix = f"_{job.label}" if job.label else ""
+    files = []
+
+    df_trades = build_trades_frame(job.ledger, options["initial_capital"])
+    if options["save_detailed_report"]:
+        filename = f"{options['output_directory']}{options['file_prefix']}_{job.instrument}{suffix}_{job.timestamp}.csv"
+        df_trades.to_csv(filename, index=False)
+        files.append(filename)
+
+    if options["save_equity_curve"] and len(df_trades):
+        filename = f"{options['output_directory']}equity_curve_{job.instrument}{suffix}_{job.timestamp}.png"
+        plot_equity_curve(job, df_trades, filename, options["chart_dpi"])
+        files.append(filename)
+
+    return files
+
+def plot_equity_curve(job, df_trades, filename, dpi=300):
+    """Gráfica de equity y drawdown (por barra si hay curva mark-to-market, si no por trade)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    if job.equity_curve is not None:
+        times = job.equity_curve.index
+        equity = job.equity_curve.to_numpy()
+        drawdown = drawdown_percent(equity)
+    else:
+        times = df_trades['exit_time']
+        equity = df_trades['capital_curve']
+        drawdown = df_trades['drawdown']
+
+    plt.figure(figsize=(15, 10))
+
+    # Equity curve
+    plt.subplot(2, 1, 1)
+    plt.plot(times, equity, 'b-', linewidth=2)
+    plt.title(f'Curva de Equity - {INSTRUMENTS[job.instrument]["name"]}')
+    plt.ylabel('Capital ($)')
+    plt.grid(True, alpha=0.3)
+
+    # Drawdown
+    plt.subplot(2, 1, 2)
+    plt.fill_between(times, drawdown, 0, color='red', alpha=0.3)
+    plt.plot(times, drawdown, 'r-')
+    plt.title('Drawdown')
+    plt.ylabel('Drawdown (%)')
+    plt.xlabel('Fecha')
+    plt.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=dpi, bbox_inches='tight')
+    plt.close()
+
+class ReportRenderer:
+    """
+    Cola de reportes. En modo background los renderiza un pool de procesos y
+    el backtest no espera; wait() recoge los ficheros generados.
+    """
+
+    def __init__(self, background=None, max_workers=None, events=None):
+        self.background = REPORT_CONFIG["background"] if background is None else background
+        self.max_workers = max_workers or REPORT_CONFIG["max_workers"]
+        self.events = events
+        self._executor = None
+        self._pending = []
+
+    def _message(self, text, level="INFO"):
+        if self.events is not None:
+            self.events.message(text, level=level)
+        else:
+            print(text)
+
+    def _report_files(self, files):
+        for filename in files:
+            if filename.endswith('.png'):
+                self._message(f"📈 Gráfica guardada en: {filename}")
+            else:
+                self._message(f"\n💾 Resultados guardados en: {filename}")
+
+    def submit(self, job):
+        """Encola (o renderiza directamente si no hay background) un ReportJob"""
+        options = report_options()
+        if not self.background:
+            self._report_files(render_report(job, options))
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._pending.append(self._executor.submit(render_report, job, options))
+
+    def wait(self):
+        """Espera a los reportes encolados y muestra los ficheros generados"""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                self._report_files(future.result())
+            except Exception as e:
+                self._message(f"❌ Error generando reporte: {e}", level="ERROR")
+
+    def shutdown(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+_renderer = None
+
+def get_report_renderer():
+    """Renderer compartido por todos los motores del proceso"""
+    global _renderer
+    if _renderer is None:
+        _renderer = ReportRenderer()
+        atexit.register(_renderer.shutdown)
+    return _renderer
+
+def wait_for_reports():
+    """Espera a que terminen los reportes en segundo plano del proceso"""
+    if _renderer is not None:
+        _renderer.wait()
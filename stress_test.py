@@ -0,0 +1,152 @@
+# stress_test.py - Backtests sobre historias alternativas (block bootstrap de los datos reales)
+
+import os
+import sys
+import argparse
+import contextlib
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cfd_backtest_engine import CFDBacktestEngine
+from data_validation import timeframe_minutes
+from dataset import PreparedDataset, load_prepared_dataset, apply_date_range
+from events import SilentSink
+from synthetic_data import block_bootstrap_ohlcv, resample_ohlcv
+from config import *
+
+# Métricas de cada camino que se guardan y resumen
+METRICS = ('total_trades', 'win_rate', 'total_profit', 'profit_factor', 'max_drawdown', 'final_capital')
+
+# Serie 15M real compartida por cada proceso worker (mapeada en memoria desde la cache)
+_worker_source = None
+
+def _init_stress_worker(dataset_path, config_snapshot):
+    """Inicializa un proceso worker: configuración del proceso padre + serie real compartida"""
+    global _worker_source
+    apply_config_overrides(config_snapshot)
+    _worker_source = source_frame(apply_date_range(PreparedDataset.load(dataset_path, mmap_mode='r')))
+
+def source_frame(dataset):
+    """Barras OHLCV reales del rango del dataset (sin la barra de contexto de una vista)"""
+    return dataset.df_15m[['open', 'high', 'low', 'close', 'volume']].iloc[dataset.first_bar:]
+
+def _run_stress_worker(seed):
+    return run_stress_path(_worker_source, seed)
+
+def build_synthetic_dataset(engine, source, seed):
+    """
+    PreparedDataset de una historia alternativa: 15M por block bootstrap de
+    la serie real y 4H agregada de ella, con indicadores y features en
+    memoria (sin pasar por CSV ni por la cache)
+    """
+    df_15m = block_bootstrap_ohlcv(source, STRESS_TEST_CONFIG["block_bars"], seed)
+    df_4h = resample_ohlcv(df_15m, f"{timeframe_minutes(TIMEFRAME_CONFIG['trend_timeframe'])}min")
+    dataset = PreparedDataset(engine.calculate_indicators(df_15m), engine.calculate_indicators(df_4h))
+    dataset.features
+    return dataset
+
+def run_stress_path(source, seed):
+    """Backtest completo sobre la historia alternativa de una semilla"""
+    engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False)
+    results = engine.run_backtest(build_synthetic_dataset(engine, source, seed))
+    return {"seed": seed, **{key: float(results[key]) for key in METRICS}}
+
+def _shared_dataset_path(dataset, stack):
+    """
+    Ruta del historial completo en disco para que los workers lo mapeen; sin
+    cache se vuelca a un directorio temporal que se borra al cerrar `stack`
+    """
+    full = dataset.base if dataset.base is not None else dataset
+    if full.cache_path is not None:
+        return full.cache_path
+    directory = stack.enter_context(tempfile.TemporaryDirectory(prefix="cfd_dataset_"))
+    full.save(directory)
+    full.cache_path = None      # La copia temporal no es la cache del dataset
+    return directory
+
+def run_stress_test(paths=None, seed=None, max_workers=None):
+    """
+    Ejecuta el motor sobre `paths` historias alternativas en paralelo
+
+    Returns:
+        (DataFrame con una fila por camino, resultados del backtest real)
+    """
+    paths = paths or STRESS_TEST_CONFIG["paths"]
+    seed = STRESS_TEST_CONFIG["seed"] if seed is None else seed
+    max_workers = max_workers or STRESS_TEST_CONFIG.get("max_workers") or os.cpu_count() or 1
+    seeds = [seed + k for k in range(paths)]
+
+    engine = CFDBacktestEngine(SilentSink(), trade_frame=False, render_reports=False)
+    dataset = load_prepared_dataset(engine)
+    actual = engine.run_backtest(dataset)
+    source = source_frame(dataset)
+
+    print(f"🧪 {paths} historias alternativas de {len(source)} barras (bloques de "
+          f"{STRESS_TEST_CONFIG['block_bars']} barras, {max_workers} workers)")
+    rows = []
+    progress = max(1, paths // 10)
+    if max_workers > 1:
+        # El directorio temporal (si lo hay) se borra después de cerrar el pool
+        with contextlib.ExitStack() as stack, \
+                ProcessPoolExecutor(max_workers=max_workers, initializer=_init_stress_worker,
+                                    initargs=(_shared_dataset_path(dataset, stack), snapshot_config())) as executor:
+            for row in executor.map(_run_stress_worker, seeds, chunksize=max(1, paths // (4 * max_workers))):
+                rows.append(row)
+                if len(rows) % progress == 0:
+                    print(f"   {len(rows)}/{paths} caminos")
+    else:
+        for path_seed in seeds:
+            rows.append(run_stress_path(source, path_seed))
+            if len(rows) % progress == 0:
+                print(f"   {len(rows)}/{paths} caminos")
+
+    return pd.DataFrame(rows, columns=("seed",) + METRICS), actual
+
+def summarize_stress_test(frame, actual):
+    """Percentiles de cada métrica y posición del backtest real en la distribución"""
+    percentiles = STRESS_TEST_CONFIG["percentiles"]
+    summary = {"paths": len(frame), "profitable": float((frame['total_profit'] > 0).mean()), "metrics": {}}
+    for key in METRICS:
+        values = frame[key].replace([np.inf, -np.inf], np.nan).dropna().to_numpy()
+        stats = {f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))} if len(values) else {}
+        stats["actual"] = float(actual[key])
+        stats["actual_rank"] = float((values < actual[key]).mean() * 100) if len(values) else None
+        summary["metrics"][key] = stats
+    return summary
+
+def format_stress_report(summary):
+    """Líneas de texto del resumen del stress test"""
+    low, high = f"p{min(STRESS_TEST_CONFIG['percentiles'])}", f"p{max(STRESS_TEST_CONFIG['percentiles'])}"
+    lines = [f"\n🧪 STRESS TEST ({summary['paths']} historias alternativas)",
+             f"   Caminos rentables: {summary['profitable'] * 100:.1f}%"]
+    for key, stats in summary["metrics"].items():
+        if "p50" not in stats:
+            continue
+        lines.append(f"   {key}: mediana {stats['p50']:.2f} [{low} {stats[low]:.2f} - {high} {stats[high]:.2f}]"
+                     f" - real {stats['actual']:.2f} (percentil {stats['actual_rank']:.0f})")
+    return lines
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="stress_test.py", description="Stress test sobre caminos de mercado sintéticos")
+    parser.add_argument("--paths", type=int, help="Número de caminos sintéticos")
+    parser.add_argument("--seed", type=int, help="Semilla del generador")
+    parser.add_argument("--workers", type=int, help="Procesos en paralelo")
+    options = parser.parse_args(args)
+    frame, actual = run_stress_test(options.paths or None, options.seed, options.workers or None)
+    for line in format_stress_report(summarize_stress_test(frame, actual)):
+        print(line)
+
+    os.makedirs(STRESS_TEST_CONFIG["output_directory"], exist_ok=True)
+    filename = os.path.join(STRESS_TEST_CONFIG["output_directory"],
+                            f"stress_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    frame.to_csv(filename, index=False)
+    print(f"\n💾 Caminos guardados en: {filename}")
+    return 0
+
+if __name__ == "__main__":
+    # Uso: python stress_test.py [--paths=200] [--seed=7] [--workers=4]
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+# synthetic_data.py - Generador de datos OHLCV sintéticos (15M/4H o cualquier resolución)
+
+import os
+import numpy as np
+import pandas as pd
+
+# Formatos de CSV que entiende read_price_csv
+CSV_FORMATS = ("timestamp", "dukascopy")
+
+def generate_ohlcv(years=1, minutes=15, seed=42, start="2015-01-05", initial_price=7000.0,
+                   annual_volatility=0.18):
+    """
+    Serie OHLCV sintética con rasgos de un índice CFD: sesiones de lunes a
+    viernes, volatilidad en clusters (régimen diario AR(1)), colas gruesas
+    (t de Student), picos de actividad en la apertura europea y americana y
+    volumen ligado al tamaño de la barra.
+
+    Args:
+        years: Años de datos (261 días hábiles por año)
+        minutes: Resolución de las barras en minutos
+        seed: Semilla (misma semilla = mismos datos)
+
+    Returns:
+        DataFrame con índice datetime y columnas open, high, low, close, volume
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, periods=int(round(years * 261)))
+    bars_per_day = 1440 // minutes
+    n_days = len(days)
+    times = (days.values[:, None] + (np.arange(bars_per_day) * minutes).astype('timedelta64[m]')).ravel()
+
+    # Perfil intradía de actividad (apertura europea ~08:30 y americana ~15:30)
+    hour = np.arange(bars_per_day) * minutes / 60
+    profile = 0.4 + np.exp(-(hour - 8.5) ** 2 / 2) + 0.8 * np.exp(-(hour - 15.5) ** 2 / 2)
+    profile /= profile.mean()
+
+    # Régimen de volatilidad diario: log-volatilidad AR(1)
+    log_vol = np.empty(n_days)
+    shocks = rng.normal(0, 0.15, n_days)
+    log_vol[0] = 0.0
+    for day in range(1, n_days):
+        log_vol[day] = 0.97 * log_vol[day - 1] + shocks[day]
+    day_vol = np.exp(log_vol - log_vol.mean())
+
+    sigma = annual_volatility / np.sqrt(252 * bars_per_day)
+    scale = (day_vol[:, None] * profile[None, :]).ravel() * sigma
+    # t de Student con 4 grados de libertad, reescalada a varianza 1
+    returns = rng.standard_t(4, size=len(times)) / np.sqrt(2) * scale
+    # Hueco de apertura el lunes
+    returns[::bars_per_day][days.dayofweek == 0] += rng.normal(0, 0.004, np.sum(days.dayofweek == 0))
+
+    close = initial_price * np.exp(np.cumsum(returns))
+    open_ = np.r_[initial_price, close[:-1]]
+    wick = np.abs(rng.normal(0, 0.6, (2, len(times)))) * scale
+    high = np.maximum(open_, close) * np.exp(wick[0])
+    low = np.minimum(open_, close) * np.exp(-wick[1])
+    activity = np.abs(returns) / scale
+    volume = rng.lognormal(7.0, 0.5, len(times)) * np.tile(profile, n_days) * (0.5 + activity)
+
+    return pd.DataFrame({
+        'open': open_, 'high': high, 'low': low, 'close': close, 'volume': np.round(volume, 2)
+    }, index=pd.DatetimeIndex(times, name='datetime'))
+
+def block_bootstrap_ohlcv(df, block_bars=96, seed=42):
+    """
+    Historia alternativa de una serie OHLCV real por block bootstrap
+
+    Reordena bloques de `block_bars` barras consecutivas (con reemplazo) y
+    reconstruye los precios encadenando los retornos de cada barra: hueco de
+    apertura, cuerpo y mechas relativas. El volumen viaja con su barra, así
+    que sigue ligado al tamaño del movimiento y a la hora. Cada bloque se toma
+    de un origen que empieza a la misma hora del día, de modo que el perfil
+    intradía y las sesiones se conservan; los timestamps son los originales.
+
+    Returns:
+        DataFrame con el índice de df y columnas open, high, low, close, volume
+    """
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    block_bars = min(block_bars, n)
+    open_, high, low, close = (df[column].to_numpy(dtype=float) for column in ('open', 'high', 'low', 'close'))
+    previous_close = np.r_[open_[0], close[:-1]]
+    gap = np.log(open_ / previous_close)
+    body = np.log(close / open_)
+    upper = np.log(high / np.maximum(open_, close))
+    lower = np.log(np.minimum(open_, close) / low)
+
+    # Orígenes de bloque agrupados por minuto del día
+    minute = np.asarray(df.index.hour * 60 + df.index.minute)
+    candidates = np.arange(n - block_bars + 1)
+    order = candidates[np.argsort(minute[candidates], kind='stable')]
+    starts = np.arange(0, n, block_bars)
+    low_pos = np.searchsorted(minute[order], minute[starts], side='left')
+    count = np.searchsorted(minute[order], minute[starts], side='right') - low_pos
+    pick = (low_pos + rng.random(len(starts)) * count).astype(np.int64)
+    # Sin origen a esa hora (datos irregulares): cualquier origen
+    origin = np.where(count > 0, order[np.minimum(pick, len(order) - 1)], rng.integers(0, len(candidates), len(starts)))
+    source = (origin[:, None] + np.arange(block_bars)).ravel()[:n]
+
+    log_close = np.log(open_[0]) + np.cumsum(gap[source] + body[source])
+    new_close = np.exp(log_close)
+    new_open = np.exp(log_close - body[source])
+    return pd.DataFrame({
+        'open': new_open,
+        'high': np.maximum(new_open, new_close) * np.exp(upper[source]),
+        'low': np.minimum(new_open, new_close) * np.exp(-lower[source]),
+        'close': new_close,
+        'volume': df['volume'].to_numpy(dtype=float)[source]
+    }, index=df.index.copy())
+
+def resample_ohlcv(df, rule="4h"):
+    """Agrega barras a un timeframe mayor (etiqueta = inicio de la barra, como los CSV de origen)"""
+    resampled = df.resample(rule, label='left', closed='left').agg({
+        'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
+    })
+    return resampled.dropna(subset=['close'])
+
+def write_price_csv(df, path, csv_format="timestamp", decimals=3):
+    """
+    Escribe un DataFrame OHLCV en uno de los formatos de CSV soportados
+
+    Args:
+        csv_format: "timestamp" (timestamp,open,...) o "dukascopy"
+            (Local time,Open,... con fechas 'dd.mm.YYYY HH:MM:SS.000 GMT+0000')
+    """
+    if csv_format not in CSV_FORMATS:
+        raise ValueError(f"Formato de CSV desconocido: {csv_format}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    stamps = np.datetime_as_string(df.index.values, unit='s')
+    if csv_format == "timestamp":
+        out = pd.DataFrame({'timestamp': np.char.replace(stamps, 'T', ' ')})
+        columns = ['open', 'high', 'low', 'close', 'volume']
+    else:
+        # YYYY-MM-DDTHH:MM:SS -> DD.MM.YYYY HH:MM:SS.000 GMT+0000
+        out = pd.DataFrame({'Local time': [f"{s[8:10]}.{s[5:7]}.{s[0:4]} {s[11:19]}.000 GMT+0000" for s in stamps]})
+        columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+    for column, source in zip(columns, ['open', 'high', 'low', 'close', 'volume']):
+        out[column] = df[source].to_numpy()
+    out.to_csv(path, index=False, float_format=f"%.{decimals}f")
+    return path
+
+def write_synthetic_dataset(directory, name, years=1, minutes=15, seed=42, csv_format="timestamp"):
+    """
+    Genera (si no existen ya) los CSV de entrada y de 4H de un dataset sintético
+
+    Returns:
+        (ruta CSV de entrada, ruta CSV 4H)
+    """
+    path_entry = os.path.join(directory, f"{name}_{csv_format}_seed{seed}_entry.csv")
+    path_4h = os.path.join(directory, f"{name}_{csv_format}_seed{seed}_4H.csv")
+    if not (os.path.exists(path_entry) and os.path.exists(path_4h)):
+        df = generate_ohlcv(years=years, minutes=minutes, seed=seed)
+        write_price_csv(df, path_entry, csv_format)
+        write_price_csv(resample_ohlcv(df, "4h"), path_4h, csv_format)
+    return path_entry, path_4h
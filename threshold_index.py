@@ -0,0 +1,148 @@
+# threshold_index.py - Índice ordenado de features para conteos instantáneos por umbral
+
+import numpy as np
+import pandas as pd
+from config import *
+from dataset import FEATURE_COLUMNS, VOLUME_RATIO, ATR_RATIO
+
+# Número de bits a 1 de cada byte (popcount de bitsets empaquetados)
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# Filtros por umbral indexados: columna de features -> (flag de activación, clave del umbral)
+THRESHOLD_FILTERS = {
+    VOLUME_RATIO: ("use_volume_filter", "volume_threshold"),
+    ATR_RATIO: ("use_atr_filter", "atr_threshold")
+}
+
+def popcount(bits):
+    """Número de barras marcadas en un bitset empaquetado con np.packbits"""
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+class ThresholdIndex:
+    """
+    Índice ordenado sobre columnas de la matriz de features.
+
+    Las barras que superan un umbral t (feature > t, como en los filtros del
+    motor) son un sufijo del orden, así que su número sale de una búsqueda
+    binaria y su bitset de un único slice. Las intersecciones entre filtros
+    son AND de bitsets empaquetados.
+    """
+
+    def __init__(self, features, base_mask=None, columns=(VOLUME_RATIO, ATR_RATIO)):
+        """
+        Args:
+            features: Matriz de features (PreparedDataset.features)
+            base_mask: Barras a considerar (p.ej. la máscara estática de entradas);
+                None = todas
+            columns: Columnas a indexar
+        """
+        self.n = len(features)
+        rows = np.arange(self.n) if base_mask is None else np.flatnonzero(base_mask)
+        self.base_bits = np.packbits(self._rows_to_mask(rows))
+
+        self._order = {}
+        self._sorted = {}
+        self._sorted_cast = {}
+        self._bits_cache = {}
+        for column in columns:
+            values = np.asarray(features[rows, column])
+            valid = ~np.isnan(values)       # NaN nunca supera un umbral
+            order = np.argsort(values[valid], kind='stable')
+            self._order[column] = rows[valid][order]
+            self._sorted[column] = values[valid][order]
+
+    def _rows_to_mask(self, rows):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _first_passing(self, column, thresholds):
+        """Posición del primer valor > threshold en el orden de la columna"""
+        sorted_values = self._sorted[column]
+        # Misma promoción de tipos que la comparación feature > umbral del motor
+        dtype = np.result_type(sorted_values, thresholds)
+        if dtype != sorted_values.dtype:
+            key = (column, dtype)
+            if key not in self._sorted_cast:
+                self._sorted_cast[key] = sorted_values.astype(dtype)
+            sorted_values = self._sorted_cast[key]
+        return np.searchsorted(sorted_values, np.asarray(thresholds, dtype=dtype), side='right')
+
+    def count_passing(self, column, threshold):
+        """Número de barras (dentro de la máscara base) con feature > threshold"""
+        return int(len(self._sorted[column]) - self._first_passing(column, threshold))
+
+    def pass_count_curve(self, column, thresholds):
+        """Conteos para una serie de umbrales con una sola búsqueda binaria vectorizada"""
+        thresholds = np.asarray(thresholds, dtype=float)
+        return len(self._sorted[column]) - self._first_passing(column, thresholds)
+
+    def passing_bits(self, column, threshold):
+        """Bitset empaquetado de las barras con feature > threshold"""
+        key = (column, threshold)
+        bits = self._bits_cache.get(key)
+        if bits is None:
+            start = self._first_passing(column, threshold)
+            bits = np.packbits(self._rows_to_mask(self._order[column][start:]))
+            self._bits_cache[key] = bits
+        return bits
+
+    def count_intersection(self, thresholds):
+        """
+        Barras que pasan simultáneamente varios filtros.
+
+        Args:
+            thresholds: Dict {columna: umbral}
+        """
+        bits = self.base_bits
+        for column, threshold in thresholds.items():
+            bits = np.bitwise_and(bits, self.passing_bits(column, threshold))
+        return popcount(bits)
+
+    def max_entries_for_config(self):
+        """
+        Cota superior del número de entradas con los umbrales de FILTERS_CONFIG
+        (barras que superan todos los filtros por umbral activos).
+        """
+        thresholds = {}
+        for column, (flag, threshold_key) in THRESHOLD_FILTERS.items():
+            if column in self._sorted and FILTERS_CONFIG[flag]:
+                thresholds[column] = FILTERS_CONFIG[threshold_key]
+        return self.count_intersection(thresholds)
+
+def pass_count_curves(index, thresholds_by_column):
+    """
+    Tabla de conteos por umbral para cada filtro.
+
+    Args:
+        index: ThresholdIndex
+        thresholds_by_column: Dict {columna: lista de umbrales}
+
+    Returns:
+        DataFrame con columnas feature, threshold, bars_passing
+    """
+    frames = []
+    for column, thresholds in thresholds_by_column.items():
+        frames.append(pd.DataFrame({
+            'feature': FEATURE_COLUMNS[column],
+            'threshold': np.asarray(thresholds, dtype=float),
+            'bars_passing': index.pass_count_curve(column, thresholds)
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def plot_pass_count_curves(curves, filename):
+    """Guarda la gráfica de barras que pasan cada umbral (una curva por filtro)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 5))
+    for feature, curve in curves.groupby('feature'):
+        plt.plot(curve['threshold'], curve['bars_passing'], marker='o', label=feature)
+    plt.title('Barras que superan cada umbral')
+    plt.xlabel('Umbral')
+    plt.ylabel('Barras')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.savefig(filename, dpi=100, bbox_inches='tight')
+    plt.close()
@@ -0,0 +1,101 @@
+# trade_ledger.py - Registro compacto de trades sobre un array estructurado de NumPy
+
+import numpy as np
+import pandas as pd
+from config import *
+
+# Códigos de tipo de posición y de motivo de salida. Un motivo que no está en
+# EXIT_REASONS (p.ej. de un motor derivado) se registra como "Other"
+POSITION_TYPES = {'long': 1, 'short': -1}
+EXIT_REASONS = ("Stop Loss", "Take Profit", "Other")
+EXIT_REASON_CODES = {reason: code for code, reason in enumerate(EXIT_REASONS)}
+OTHER_EXIT_REASON = EXIT_REASON_CODES["Other"]
+
+TRADE_DTYPE = np.dtype([
+    ('entry_time', 'i8'),        # ns desde epoch (UTC)
+    ('exit_time', 'i8'),         # ns desde epoch (UTC)
+    ('type', 'i1'),              # 1 = long, -1 = short
+    ('entry_price', 'f8'),
+    ('exit_price', 'f8'),
+    ('position_size', 'f8'),
+    ('profit_loss', 'f8'),
+    ('risk_multiple', 'f8'),
+    ('exit_reason', 'u1'),       # índice en EXIT_REASONS
+    ('entry_bar', 'i8'),         # índice de la barra de 15M de entrada
+    ('exit_bar', 'i8')           # índice de la barra de 15M de salida
+])
+
+class TradeLedger:
+    """
+    Registro de trades preasignado y ampliable (duplica capacidad al llenarse).
+    Guarda un registro fijo de ~75 bytes por trade en lugar de un dict; el
+    DataFrame solo se construye cuando se pide con to_dataframe().
+    """
+
+    def __init__(self, capacity=256, instrument=None):
+        self._data = np.empty(max(1, capacity), dtype=TRADE_DTYPE)
+        self._size = 0
+        self.instrument = instrument or ACTIVE_INSTRUMENT
+        self.tz = None
+
+    def __len__(self):
+        return self._size
+
+    def append(self, entry_time, exit_time, position_type, entry_price, exit_price,
+               position_size, profit_loss, risk_multiple, exit_reason, entry_bar=-1, exit_bar=-1):
+        """Registra un trade cerrado"""
+        if self._size == len(self._data):
+            grown = np.empty(len(self._data) * 2, dtype=TRADE_DTYPE)
+            grown[:self._size] = self._data
+            self._data = grown
+
+        if self._size == 0:
+            self.tz = getattr(entry_time, 'tz', None)
+
+        self._data[self._size] = (
+            pd.Timestamp(entry_time).value,
+            pd.Timestamp(exit_time).value,
+            POSITION_TYPES[position_type],
+            entry_price,
+            exit_price,
+            position_size,
+            profit_loss,
+            risk_multiple,
+            EXIT_REASON_CODES.get(exit_reason, OTHER_EXIT_REASON),
+            entry_bar,
+            exit_bar
+        )
+        self._size += 1
+
+    @property
+    def records(self):
+        """Vista (sin copia) de los trades registrados"""
+        return self._data[:self._size]
+
+    def column(self, name):
+        """Vista (sin copia) de una columna"""
+        return self._data[name][:self._size]
+
+    def _to_datetime(self, values):
+        times = pd.to_datetime(values, unit='ns', utc=True)
+        return times.tz_convert(self.tz) if self.tz is not None else times.tz_localize(None)
+
+    def to_dataframe(self):
+        """DataFrame con las mismas columnas que el registro clásico de trades"""
+        records = self.records
+        entry_time = self._to_datetime(records['entry_time'])
+        exit_time = self._to_datetime(records['exit_time'])
+
+        return pd.DataFrame({
+            'entry_time': entry_time,
+            'exit_time': exit_time,
+            'type': np.where(records['type'] == POSITION_TYPES['long'], 'long', 'short'),
+            'entry_price': records['entry_price'],
+            'exit_price': records['exit_price'],
+            'position_size': records['position_size'],
+            'profit_loss': records['profit_loss'],
+            'risk_multiple': records['risk_multiple'],
+            'exit_reason': np.asarray(EXIT_REASONS, dtype=object)[records['exit_reason']],
+            'hold_time_hours': (records['exit_time'] - records['entry_time']) / 3.6e12,
+            'instrument': self.instrument
+        })
@@ -2,16 +2,19 @@
 
 import pandas as pd
 import os
-from config import DATA_CONFIG, ACTIVE_INSTRUMENT
+from config import DATA_CONFIG, ACTIVE_INSTRUMENT, VALIDATION_CONFIG, get_active_instrument_config
+from data_catalog import parse_price_frame
+from data_validation import validate_price_frame, format_validation_report
 
-def detect_csv_format(filepath):
-    """Detecta el formato del CSV y muestra información"""
+def detect_csv_format(filepath, timeframe=None):
+    """Detecta el formato del CSV, muestra información y valida la integridad de los datos"""
     try:
-        # Leer solo las primeras filas para análisis
-        df_sample = pd.read_csv(filepath, nrows=5)
+        # Una sola lectura: muestra para el análisis y fichero completo para la validación
+        df = pd.read_csv(filepath)
+        df_sample = df.head(5)
         
         print(f"\n📁 Archivo: {filepath}")
-        print(f"   Filas totales: {len(pd.read_csv(filepath))}")
+        print(f"   Filas totales: {len(df)}")
         print(f"   Columnas: {list(df_sample.columns)}")
         
         # Detectar columna de tiempo
@@ -62,6 +65,17 @@ def detect_csv_format(filepath):
         print(f"   📋 Muestra de datos:")
         print(df_sample.head(2).to_string(index=False))
         
+        # Validación de integridad (huecos, duplicados, orden, OHLC, outliers)
+        if timeframe is not None:
+            min_bars = VALIDATION_CONFIG["min_data_points"] if timeframe == "15M" else None
+            _, report = validate_price_frame(parse_price_frame(df, filepath, sort=False), timeframe,
+                                             get_active_instrument_config(), min_bars=min_bars)
+            if report is not None:
+                for line in format_validation_report(report):
+                    print(f"   {line}")
+                if report["errors"]:
+                    return False
+        
         return True
         
     except Exception as e:
@@ -91,7 +105,7 @@ def validate_data_files():
             all_valid = False
             continue
         
-        file_valid = detect_csv_format(filepath)
+        file_valid = detect_csv_format(filepath, timeframe)
         if not file_valid:
             all_valid = False
     